@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Status queries by sweeping every XML with PascalVocReader versus the
+SQLite annotation catalog.
+
+Usage: python benchmarks/bench_annotation_catalog.py [images] [faces]
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.annotationCatalog import AnnotationCatalog, annotationPath
+from libs.annotationCatalog import STATUS_UNANNOTATED, STATUS_ANNOTATED
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def makeDataset(root, images, faces):
+    random.seed(0)
+    paths = []
+    for i in range(images):
+        path = os.path.join(root, 'img%06d.jpg' % i)
+        paths.append(path)
+        if i % 4 == 0:
+            continue  # unannotated
+        writer = PascalVocWriter(root, os.path.basename(path), (1080, 1920, 3))
+        writer.verified = i % 4 == 1
+        for _ in range(faces):
+            x, y = random.randint(0, 1800), random.randint(0, 1000)
+            writer.addBndBox(x, y, x + 60, y + 60, 'face',
+                             [random.randint(0, 1) for _ in range(13)])
+        writer.save(annotationPath(path))
+    return paths
+
+
+def sweepNextUnverified(paths, current):
+    # What a status query costs without a catalog
+    for path in paths[paths.index(current) + 1:]:
+        xmlPath = annotationPath(path)
+        if not os.path.exists(xmlPath) or not PascalVocReader(xmlPath).verified:
+            return path
+
+
+def main(argv):
+    images = int(argv[1]) if len(argv) > 1 else 4000
+    faces = int(argv[2]) if len(argv) > 2 else 20
+    root = tempfile.mkdtemp()
+    try:
+        paths = makeDataset(root, images, faces)
+        catalog = AnnotationCatalog.forDirectory(root, cacheDir=root)
+        _, serial = timed(lambda: catalog.rebuild(paths, workers=0))
+        _, parallel = timed(lambda: catalog.rebuild(paths))
+        _, refresh = timed(lambda: catalog.refresh(paths))
+        _, sweepAll = timed(lambda: [PascalVocReader(annotationPath(p)).verified for p in paths])
+        current = paths[-8]
+        _, sweepNext = timed(lambda: [sweepNextUnverified(paths, current) for _ in range(10)])
+        unverified = (STATUS_UNANNOTATED, STATUS_ANNOTATED)
+        _, query = timed(lambda: [catalog.nextImage(current, unverified) for _ in range(10)])
+        _, statuses = timed(catalog.statuses)
+        catalog.close()
+
+        print('%d images, %d faces per annotated image' % (images, faces))
+        print('sweep every XML           : %8.1f ms' % (sweepAll * 1e3))
+        print('rebuild, in-process       : %8.1f ms' % (serial * 1e3))
+        print('rebuild, process pool     : %8.1f ms' % (parallel * 1e3))
+        print('refresh, nothing changed  : %8.1f ms' % (refresh * 1e3))
+        print('next unverified, sweep    : %8.3f ms' % (sweepNext / 10 * 1e3))
+        print('next unverified, catalog  : %8.3f ms' % (query / 10 * 1e3))
+        print('all statuses, catalog     : %8.1f ms' % (statuses * 1e3))
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Time bulk conversion of a generated XML set to YOLO and WIDER FACE text
+and back to XML, in-process and on the process pool.
+
+Usage: python benchmarks/bench_annotation_formats.py [xml files] [faces per file]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from libs.annotationFormats import convert, getFormat
+from libs.attributes import ATTRIBUTE_TAGS
+from libs.pascal_voc_io import PascalVocWriter
+
+
+def generate(directory, count, faces):
+    imagePath = os.path.join(directory, 'test.bmp')
+    shutil.copy(os.path.join(dir_name, '..', 'tests', 'test.bmp'), imagePath)
+    voc = os.path.join(directory, 'voc')
+    os.makedirs(voc)
+    for i in range(count):
+        # Links to one image: WIDER FACE carries no image size, so going
+        # back to XML reads it from the image
+        name = '%06d.bmp' % i
+        os.link(imagePath, os.path.join(directory, name))
+        writer = PascalVocWriter('images', name, (512, 512, 3), localImgPath=os.path.join(directory, name))
+        for j in range(faces):
+            x, y = (i * 37 + j * 101) % 450, (i * 53 + j * 67) % 450
+            writer.addBndBox(x, y, x + 40, y + 40, 'face',
+                             [(i + j + k) % 2 for k in range(len(ATTRIBUTE_TAGS))])
+        writer.save(os.path.join(voc, '%06d.xml' % i))
+    return voc
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 10000
+    faces = int(argv[2]) if len(argv) > 2 else 5
+    tmp = tempfile.mkdtemp()
+    try:
+        voc = generate(tmp, count, faces)
+        print('%d XML files, %d faces each, %d CPUs' % (count, faces, os.cpu_count()))
+        for label, workers in (('in-process', 0), ('process pool', None)):
+            out = os.path.join(tmp, label)
+            steps = (('voc -> yolo', getFormat('voc'), voc, getFormat('yolo'), os.path.join(out, 'yolo')),
+                     ('voc -> wider', getFormat('voc'), voc, getFormat('wider'), os.path.join(out, 'gt.txt')),
+                     ('wider -> voc', getFormat('wider', imageRoot=tmp), os.path.join(out, 'gt.txt'),
+                      getFormat('voc'), os.path.join(out, 'voc')))
+            os.makedirs(out)
+            for name, sourceFormat, source, targetFormat, target in steps:
+                start = time.perf_counter()
+                converted, failures = convert(sourceFormat, source, targetFormat, target, workers)
+                elapsed = time.perf_counter() - start
+                print('%14s %-12s %8.2f s  (%d converted, %d skipped)' % (
+                    label, name, elapsed, converted, len(failures)))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Time loading every face of a generated dataset into an AnnotationTable:
+cold (parsing on the process pool), warm (from the mtime-keyed cache) and
+after touching 1% of the XMLs, against reading each XML with
+PascalVocReader into Python lists. Then export the table as .npy columns
+and time opening them memory-mapped and re-importing them as XMLs.
+
+Usage: python benchmarks/bench_annotation_table.py [xml files] [faces per file]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from libs.annotationTable import exportTable, findAnnotations, loadAnnotationTable, loadExport, writeAnnotations
+from libs.attributes import ATTRIBUTE_TAGS
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter
+
+
+def generate(directory, count, faces):
+    for i in range(count):
+        writer = PascalVocWriter('images', '%06d.jpg' % i, (1080, 1920, 3))
+        for j in range(faces):
+            x, y = (i * 37 + j * 101) % 1800, (i * 53 + j * 67) % 1000
+            writer.addBndBox(x, y, x + 40, y + 40, 'face',
+                             [(i + j + k) % 2 for k in range(len(ATTRIBUTE_TAGS))])
+        writer.save(os.path.join(directory, '%06d.xml' % i))
+
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 20000
+    faces = int(argv[2]) if len(argv) > 2 else 3
+    tmp = tempfile.mkdtemp()
+    try:
+        generate(tmp, count, faces)
+        cache = os.path.join(tmp, 'table.npz')
+        paths = findAnnotations(tmp)
+
+        def perFile():
+            return [PascalVocReader(path).getShapes() for path in paths]
+
+        print('%d XML files, %d faces each, %d CPUs' % (count, faces, os.cpu_count()))
+        elapsed, _ = timed(perFile)
+        print('%28s %8.2f s' % ('PascalVocReader per file', elapsed))
+        elapsed, table = timed(lambda: loadAnnotationTable(paths, cache))
+        print('%28s %8.2f s  (%d faces)' % ('table, cold', elapsed, table.faceCount))
+        elapsed, table = timed(lambda: loadAnnotationTable(paths, cache))
+        print('%28s %8.2f s  (%d parsed)' % ('table, cached', elapsed, table.parsedCount))
+        for path in paths[::100]:
+            with open(path, 'a') as f:
+                f.write('\n')
+        elapsed, table = timed(lambda: loadAnnotationTable(paths, cache))
+        print('%28s %8.2f s  (%d parsed)' % ('table, 1% changed', elapsed, table.parsedCount))
+        export = os.path.join(tmp, 'export')
+        elapsed, _ = timed(lambda: exportTable(table, export))
+        print('%28s %8.2f s' % ('export .npy columns', elapsed))
+        elapsed, loaded = timed(lambda: loadExport(export))
+        print('%28s %8.4f s' % ('open export, mmap', elapsed))
+        elapsed, _ = timed(lambda: int(loaded.attributes[:, 0].sum()) + len(loaded.imagePaths[count - 1]))
+        print('%28s %8.4f s' % ('one column + one path', elapsed))
+        elapsed, _ = timed(lambda: writeAnnotations(loaded, os.path.join(tmp, 'reimported')))
+        print('%28s %8.2f s' % ('re-import as XML', elapsed))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Load/save round trip of one image with many faces through the attribute
+codec: PascalVocReader -> Shape -> LabelFile dicts -> PascalVocWriter.
+
+Usage: QT_QPA_PLATFORM=offscreen python benchmarks/bench_attribute_codec.py [faces]
+"""
+import io
+import os
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+try:
+    from PyQt5.QtCore import QPointF
+except ImportError:
+    from PyQt4.QtCore import QPointF
+
+from libs.attributes import ATTRIBUTE_SCHEMA
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter
+from libs.shape import Shape
+
+
+def bestOf(func, number, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def makeXML(path, faces):
+    writer = PascalVocWriter('images', 'crowd.jpg', (4000, 6000, 3))
+    for i in range(faces):
+        x = 10 + (i * 37) % 5800
+        y = 10 + (i * 53) % 3800
+        codes = [(i + j) % len(flags) for j, (_, flags, _) in enumerate(ATTRIBUTE_SCHEMA)]
+        writer.addBndBox(x, y, x + 64, y + 64, 'face', codes)
+    writer.save(path)
+
+
+def read(path):
+    return PascalVocReader(path).getShapes()
+
+
+def toShapes(shapes):
+    result = []
+    for label, points, line_color, fill_color, attributes in shapes:
+        shape = Shape(label=label, attributes=attributes)
+        for x, y in points:
+            shape.addPoint(QPointF(x, y))
+        shape.close()
+        result.append(shape)
+    return result
+
+
+def formatShapes(shapes):
+    return [dict(label=s.label, points=[(p.x(), p.y()) for p in s.points],
+                 attributes=list(s.attributes)) for s in shapes]
+
+
+def write(dicts):
+    writer = PascalVocWriter('images', 'crowd.jpg', (4000, 6000, 3))
+    for d in dicts:
+        (x1, y1), _, (x2, y2), _ = d['points']
+        writer.addBndBox(int(x1), int(y1), int(x2), int(y2), d['label'], d['attributes'])
+    writer.writeXML(io.StringIO())
+
+
+def main(argv):
+    faces = int(argv[1]) if len(argv) > 1 else 500
+    path = os.path.join(tempfile.mkdtemp(), 'crowd.xml')
+    makeXML(path, faces)
+
+    parsed = read(path)
+    shapes = toShapes(parsed)
+    dicts = formatShapes(shapes)
+    number = 50
+    timings = [
+        ('PascalVocReader', bestOf(lambda: read(path), number)),
+        ('Shape build', bestOf(lambda: toShapes(parsed), number)),
+        ('format_shape', bestOf(lambda: formatShapes(shapes), number)),
+        ('PascalVocWriter', bestOf(lambda: write(dicts), number)),
+    ]
+    print('%d faces' % faces)
+    for name, seconds in timings:
+        print('%-16s: %8.2f ms' % (name, seconds * 1e3))
+    print('%-16s: %8.2f ms' % ('round trip', sum(t for _, t in timings) * 1e3))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
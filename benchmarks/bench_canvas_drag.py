@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Cost of dragging a box on a large image: mouse move handling plus the
+paint it triggers, per event. Runs under the offscreen Qt platform.
+
+Usage: python benchmarks/bench_canvas_drag.py [width] [height] [shapes]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import QEvent, QPoint, QPointF, Qt
+from PyQt5.QtGui import QColor, QMouseEvent, QPixmap
+from PyQt5.QtWidgets import QApplication, QScrollArea
+
+from libs.canvas import Canvas
+from libs.shape import Shape
+
+MOVES = 100
+
+
+def box(x, y, size):
+    shape = Shape('face')
+    for px, py in ((x, y), (x + size, y), (x + size, y + size), (x, y + size)):
+        shape.addPoint(QPointF(px, py))
+    shape.close()
+    return shape
+
+
+def mouseEvent(kind, point, button, buttons):
+    return QMouseEvent(kind, QPoint(int(point.x()), int(point.y())), button, buttons, Qt.NoModifier)
+
+
+def dragOnce(app, scroll, canvas, scale):
+    """Drag the first shape 100 steps; return seconds per move, paint included."""
+    canvas.scale = scale
+    canvas.adjustSize()
+    app.processEvents()
+    target = canvas.shapes[0]
+    start = (target[0] + target[2]) / 2
+    first = QPointF(target[0])
+    toWidget = lambda p: (p + canvas.offsetToCenter()) * scale
+    center = toWidget(start)
+    scroll.ensureVisible(int(center.x()), int(center.y()), 400, 400)
+    app.processEvents()
+    canvas.mouseMoveEvent(mouseEvent(QEvent.MouseMove, toWidget(start), Qt.NoButton, Qt.NoButton))
+    canvas.mousePressEvent(mouseEvent(QEvent.MouseButtonPress, toWidget(start), Qt.LeftButton, Qt.LeftButton))
+    app.processEvents()
+    begin = time.perf_counter()
+    for i in range(1, MOVES + 1):
+        point = toWidget(start + QPointF(i * 2, i))
+        canvas.mouseMoveEvent(mouseEvent(QEvent.MouseMove, point, Qt.NoButton, Qt.LeftButton))
+        # Deliver the paint events the move asked for, as the event loop would
+        app.processEvents()
+    elapsed = (time.perf_counter() - begin) / MOVES
+    assert canvas.selectedShape is target and target[0] != first, 'the box did not move'
+    canvas.mouseReleaseEvent(mouseEvent(QEvent.MouseButtonRelease, point, Qt.LeftButton, Qt.NoButton))
+    return elapsed
+
+
+def main(argv):
+    app = QApplication(argv[:1])
+    width = int(argv[1]) if len(argv) > 1 else 6000
+    height = int(argv[2]) if len(argv) > 2 else 4000
+    count = int(argv[3]) if len(argv) > 3 else 300
+    pixmap = QPixmap(width, height)
+    pixmap.fill(QColor(90, 120, 150))
+    random.seed(0)
+    canvas = Canvas()
+    canvas.loadPixmap(pixmap)
+    shapes = [box(width / 2 - 100, height / 2 - 100, 120)]
+    shapes += [box(random.uniform(0, width - 100), random.uniform(0, height - 100), random.uniform(30, 90))
+               for _ in range(count - 1)]
+    canvas.loadShapes(shapes)
+    scroll = QScrollArea()
+    scroll.setWidget(canvas)
+    scroll.setWidgetResizable(True)
+    scroll.resize(1600, 1000)
+    scroll.show()
+    print('%dx%d image, %d shapes, 1600x1000 viewport' % (width, height, count))
+    for scale in (1600.0 / width, 0.5, 1.0):
+        print('zoom %5.2f: %7.2f ms per drag event' % (scale, dragOnce(app, scroll, canvas, scale) * 1e3))
+    scroll.close()
+    app.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
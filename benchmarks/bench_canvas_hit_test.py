@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Canvas hover hit-testing: the old scan over every visible shape versus the
+ShapeIndex grid. Runs under the offscreen Qt platform.
+
+Usage: python benchmarks/bench_canvas_hit_test.py [shapes ...]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import QEvent, QPoint, QPointF, Qt
+from PyQt5.QtGui import QMouseEvent, QPixmap
+from PyQt5.QtWidgets import QApplication
+
+from libs.canvas import Canvas
+from libs.shape import Shape
+
+WIDTH, HEIGHT = 6000, 4000
+MOVES = 2000
+
+
+def makeShapes(count):
+    shapes = []
+    for _ in range(count):
+        x, y = random.uniform(0, WIDTH - 120), random.uniform(0, HEIGHT - 120)
+        size = random.uniform(30, 120)
+        shape = Shape('face')
+        for px, py in ((x, y), (x + size, y), (x + size, y + size), (x, y + size)):
+            shape.addPoint(QPointF(px, py))
+        shape.close()
+        shapes.append(shape)
+    return shapes
+
+
+def linearHit(canvas, pos):
+    # The hover loop before the index: every visible shape, topmost first
+    for shape in reversed([s for s in canvas.shapes if canvas.isVisible(s)]):
+        if shape.nearestVertex(pos, canvas.epsilon) is not None or shape.containsPoint(pos):
+            return shape
+    return None
+
+
+def indexedHit(canvas, pos):
+    for shape in canvas.shapesAt(pos, canvas.epsilon):
+        if shape.nearestVertex(pos, canvas.epsilon) is not None or shape.containsPoint(pos):
+            return shape
+    return None
+
+
+def timed(func, args):
+    start = time.perf_counter()
+    for arg in args:
+        func(arg)
+    return (time.perf_counter() - start) / len(args)
+
+
+def main(argv):
+    app = QApplication(argv[:1])
+    counts = [int(arg) for arg in argv[1:]] or [100, 300, 1000, 3000]
+    canvas = Canvas()
+    canvas.loadPixmap(QPixmap(WIDTH, HEIGHT))
+    canvas.resize(WIDTH, HEIGHT)
+    print('%6s %12s %12s %14s' % ('shapes', 'linear', 'indexed', 'mouseMove'))
+    for count in counts:
+        random.seed(count)
+        canvas.loadShapes(makeShapes(count))
+        positions = [QPointF(random.uniform(0, WIDTH), random.uniform(0, HEIGHT)) for _ in range(MOVES)]
+        assert [linearHit(canvas, pos) for pos in positions[:200]] == \
+            [indexedHit(canvas, pos) for pos in positions[:200]]
+        linear = timed(lambda pos: linearHit(canvas, pos), positions[:max(20, MOVES * 100 // count)])
+        indexed = timed(lambda pos: indexedHit(canvas, pos), positions)
+        events = [QMouseEvent(QEvent.MouseMove, QPoint(int(pos.x()), int(pos.y())),
+                              Qt.NoButton, Qt.NoButton, Qt.NoModifier) for pos in positions]
+        move = timed(canvas.mouseMoveEvent, events)
+        print('%6d %9.1f us %9.1f us %11.1f us' % (count, linear * 1e6, indexed * 1e6, move * 1e6))
+    app.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Full-viewport paints of a very large image: the whole pixmap under a
+scale transform versus the tile pyramid. Runs under the offscreen Qt
+platform.
+
+Usage: python benchmarks/bench_canvas_tiles.py [width] [height]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor, QImage, QLinearGradient, QPainter, QPixmap
+from PyQt5.QtWidgets import QApplication, QScrollArea
+
+from libs.canvas import Canvas
+
+FRAMES = 5
+
+
+def makeImage(width, height):
+    image = QImage(width, height, QImage.Format_RGB32)
+    painter = QPainter(image)
+    gradient = QLinearGradient(0, 0, width, height)
+    gradient.setColorAt(0, QColor(20, 40, 90))
+    gradient.setColorAt(1, QColor(200, 180, 90))
+    painter.fillRect(image.rect(), gradient)
+    painter.setPen(QColor(255, 255, 255))
+    for x in range(0, width, 97):
+        painter.drawLine(x, 0, width - x, height)
+    painter.end()
+    return image
+
+
+def paintTime(app, scroll, canvas, scale):
+    canvas.scale = scale
+    canvas.adjustSize()
+    scroll.ensureVisible(canvas.width() // 2, canvas.height() // 2, 800, 500)
+    app.processEvents()
+    start = time.perf_counter()
+    for _ in range(FRAMES):
+        canvas.repaint()
+    return (time.perf_counter() - start) / FRAMES
+
+
+def main(argv):
+    app = QApplication(argv[:1])
+    width = int(argv[1]) if len(argv) > 1 else 8000
+    height = int(argv[2]) if len(argv) > 2 else 6000
+    image = makeImage(width, height)
+    canvas = Canvas()
+    scroll = QScrollArea()
+    scroll.setWidget(canvas)
+    scroll.setWidgetResizable(True)
+    scroll.resize(1600, 1000)
+    scroll.show()
+    print('%dx%d image (%.0f MP), 1600x1000 viewport' % (width, height, width * height / 1e6))
+    print('%6s %14s %14s %14s %10s' % ('zoom', 'whole pixmap', 'tiles, cold', 'tiles, warm', 'tile MB'))
+    for scale in (1600.0 / width, 0.35, 0.5, 1.0):
+        canvas.loadPixmap(QPixmap.fromImage(image), image)
+        pyramid = canvas.pyramid
+        canvas.pyramid = None
+        whole = paintTime(app, scroll, canvas, scale)
+        canvas.pyramid = pyramid
+        canvas.scale = scale
+        start = time.perf_counter()
+        canvas.repaint()
+        cold = time.perf_counter() - start
+        start = time.perf_counter()
+        pyramid.waitForDone()
+        app.processEvents()
+        built = time.perf_counter() - start
+        warm = paintTime(app, scroll, canvas, scale)
+        print('%6.2f %11.1f ms %11.1f ms %11.1f ms %10.0f   (tiles built in %.0f ms)' % (
+            scale, whole * 1e3, cold * 1e3, warm * 1e3, pyramid.stats()['megabytes'], built * 1e3))
+    scroll.close()
+    app.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Time exporting a generated XML set to COCO JSON with the streaming
+exporter against building the whole COCO dict in memory and dumping it,
+and report the Python heap peak of each (tracemalloc, parent process,
+measured in a second untimed run).
+
+Usage: python benchmarks/bench_coco_export.py [xml files] [faces per file]
+"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from libs.attributes import ATTRIBUTE_TAGS
+from libs.cocoExport import exportCOCO
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter
+
+
+def generate(directory, count, faces):
+    paths = []
+    for i in range(count):
+        writer = PascalVocWriter('images', '%06d.jpg' % i, (1080, 1920, 3))
+        for j in range(faces):
+            x, y = (i * 37 + j * 101) % 1800, (i * 53 + j * 67) % 1000
+            writer.addBndBox(x, y, x + 40, y + 40, 'face',
+                             [(i + j + k) % 2 for k in range(len(ATTRIBUTE_TAGS))])
+        paths.append(os.path.join(directory, '%06d.xml' % i))
+        writer.save(paths[-1])
+    return paths
+
+
+def inMemory(paths, output):
+    coco = {'images': [], 'annotations': [], 'categories': [{'id': 1, 'name': 'face'}]}
+    for number, path in enumerate(paths, 1):
+        reader = PascalVocReader(path)
+        coco['images'].append({'id': number, 'file_name': reader.filename,
+                               'height': reader.imageSize[0], 'width': reader.imageSize[1]})
+        for label, points, _, _, codes in reader.getShapes():
+            (xmin, ymin), _, (xmax, ymax), _ = points
+            coco['annotations'].append({'id': len(coco['annotations']) + 1, 'image_id': number,
+                                        'category_id': 1, 'bbox': [xmin, ymin, xmax - xmin, ymax - ymin],
+                                        'attributes': dict(zip(ATTRIBUTE_TAGS, codes))})
+    with open(output, 'w') as f:
+        json.dump(coco, f)
+
+
+def measured(function):
+    start = time.perf_counter()
+    function()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak / 1e6
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 10000
+    faces = int(argv[2]) if len(argv) > 2 else 5
+    tmp = tempfile.mkdtemp()
+    try:
+        paths = generate(tmp, count, faces)
+        output = os.path.join(tmp, 'coco.json')
+        print('%d XML files, %d faces each, %d CPUs' % (count, faces, os.cpu_count()))
+        elapsed, peak = measured(lambda: inMemory(paths, output))
+        print('%24s %8.2f s %8.1f MB peak' % ('dict + json.dump', elapsed, peak))
+        elapsed, peak = measured(lambda: exportCOCO(paths, output, workers=0))
+        print('%24s %8.2f s %8.1f MB peak' % ('streaming, in-process', elapsed, peak))
+        elapsed, peak = measured(lambda: exportCOCO(paths, output))
+        print('%24s %8.2f s %8.1f MB peak' % ('streaming, process pool', elapsed, peak))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
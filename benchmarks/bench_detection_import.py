@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Time importing a generated CSV detection dump, shuffled across images,
+into fresh XMLs, and show how the bucket size bounds the Python heap peak
+(tracemalloc, measured in a second untimed in-process run).
+
+Usage: python benchmarks/bench_detection_import.py [detections] [per image]
+"""
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from libs.detectionImport import importDetections
+
+
+def generate(directory, count, perImage):
+    imagePath = os.path.join(directory, 'test.bmp')
+    shutil.copy(os.path.join(dir_name, '..', 'tests', 'test.bmp'), imagePath)
+    images = max(1, count // perImage)
+    for i in range(images):
+        os.link(imagePath, os.path.join(directory, '%06d.bmp' % i))
+    rows = ['%06d.bmp,%d,%d,%d,%d,0.9,%d\n' % (i % images, (i * 37) % 480, (i * 53) % 480,
+                                             (i * 37) % 480 + 30, (i * 53) % 480 + 30, i % 2)
+            for i in range(count)]
+    random.Random(0).shuffle(rows)
+    dump = os.path.join(directory, 'detections.csv')
+    with io.open(dump, 'w') as f:
+        f.write(u'image,xmin,ymin,xmax,ymax,score,mask\n')
+        f.writelines(rows)
+    return dump
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 50000
+    perImage = int(argv[2]) if len(argv) > 2 else 5
+    tmp = tempfile.mkdtemp()
+    try:
+        dump = generate(tmp, count, perImage)
+        size = os.path.getsize(dump)
+        print('%d detections, %d per image, %.1f MB dump, %d CPUs' % (count, perImage, size / 1e6, os.cpu_count()))
+        for label, bucketBytes in (('one bucket', size + 1), ('1 MB buckets', 1 << 20)):
+            start = time.perf_counter()
+            result = importDetections(dump, os.path.join(tmp, label), workers=0, bucketBytes=bucketBytes)
+            elapsed = time.perf_counter() - start
+            tracemalloc.start()
+            importDetections(dump, os.path.join(tmp, label + ' traced'), workers=0, bucketBytes=bucketBytes)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('%16s %8.2f s %8.1f MB peak  (%d boxes, %d XMLs)' % (
+                label, elapsed, peak / 1e6, result.boxes, result.images))
+        start = time.perf_counter()
+        result = importDetections(dump, os.path.join(tmp, 'pool'), bucketBytes=1 << 20)
+        print('%16s %8.2f s  (%d boxes, %d XMLs)' % ('process pool', time.perf_counter() - start,
+                                                     result.boxes, result.images))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Time making one face edit durable through the edit journal, comparing
+every face or only the edited one as a drag does, against rewriting the
+image's whole Pascal VOC XML, for a crowded image. Also reports the
+journal's size after the edits and after compaction.
+
+Usage: python benchmarks/bench_edit_journal.py [faces per image] [edits]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import QPointF
+
+from libs.attributes import ATTRIBUTE_TAGS
+from libs.editJournal import EditJournal
+from libs.labelFile import LabelFile
+from libs.shape import Shape
+
+
+def faces(count):
+    shapes = []
+    for i in range(count):
+        x, y = 10 + (i * 37) % 1800, 10 + (i * 53) % 1000
+        shape = Shape(label='face', attributes=[(i + j) % 3 for j in range(len(ATTRIBUTE_TAGS))])
+        for px, py in ((x, y), (x + 40, y), (x + 40, y + 40), (x, y + 40)):
+            shape.addPoint(QPointF(px, py))
+        shape.close()
+        shapes.append(shape)
+    return shapes
+
+
+def snapshot(shapes):
+    return [dict(label=s.label, points=[(p.x(), p.y()) for p in s.points],
+                 attributes=list(s.attributes)) for s in shapes]
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 500
+    edits = int(argv[2]) if len(argv) > 2 else 200
+    tmp = tempfile.mkdtemp()
+    try:
+        imagePath = os.path.join(tmp, 'crowd.png')
+        xmlPath = os.path.join(tmp, 'crowd.xml')
+        shutil.copy(os.path.join(dir_name, '..', 'tests', u'屏幕截图.png'), imagePath)
+        shapes = faces(count)
+        journal = EditJournal(os.path.join(tmp, 'journal'))
+        journal.open(imagePath, xmlPath, shapes, False)
+
+        start = time.perf_counter()
+        for i in range(edits):
+            shapes[i % count].moveBy(QPointF(1, 1))
+            journal.record(shapes, False)
+        journaled = (time.perf_counter() - start) / edits
+        start = time.perf_counter()
+        for i in range(edits):
+            shapes[i % count].moveBy(QPointF(1, 1))
+            journal.record(shapes, False, touched=[shapes[i % count]])
+        dragged = (time.perf_counter() - start) / edits
+        journal.flush()
+        grown = os.path.getsize(journal.path)
+        journal.compact()
+        compacted = os.path.getsize(journal.path)
+
+        labelFile = LabelFile()
+        start = time.perf_counter()
+        for i in range(edits):
+            shapes[i % count].moveBy(QPointF(1, 1))
+            labelFile.savePascalVocFormat(xmlPath, snapshot(shapes), imagePath, None)
+        rewritten = (time.perf_counter() - start) / edits
+        journal.close()
+
+        print('%d faces per image, %d single-face edits' % (count, edits))
+        print('%18s %11.3f ms per edit' % ('journal, all faces', journaled * 1e3))
+        print('%18s %11.3f ms per edit' % ('journal, one face', dragged * 1e3))
+        print('%18s %11.3f ms per edit' % ('XML rewrite', rewritten * 1e3))
+        print('journal: %.1f KB after the edits, %.1f KB compacted' % (grown / 1024.0, compacted / 1024.0))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
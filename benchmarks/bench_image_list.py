@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Navigation lookups on a plain list versus ImageList.
+
+Usage: python benchmarks/bench_image_list.py [entries]
+"""
+import os
+import random
+import sys
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.imageList import ImageList
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def main(argv):
+    entries = int(argv[1]) if len(argv) > 1 else 1000000
+    paths = ['/data/frames/%07d/image_%07d.jpg' % (i // 1000, i) for i in range(entries)]
+    random.seed(0)
+    queries = [random.choice(paths) for _ in range(200)]
+
+    images, build = timed(lambda: ImageList(paths))
+    _, listIndex = timed(lambda: [paths.index(q) for q in queries])
+    _, catalogIndex = timed(lambda: [images.index(q) for q in queries])
+    _, catalogNext = timed(lambda: [images.nextPath(q) for q in queries])
+    _, resort = timed(lambda: images.sort(key=lambda p: p.lower(), reverse=True))
+    _, refilter = timed(lambda: images.filter(lambda p: not p.endswith('7.jpg')))
+
+    print('%d entries, %d lookups' % (entries, len(queries)))
+    print('build ImageList      : %8.1f ms' % (build * 1e3))
+    print('list.index           : %8.3f ms/lookup' % (listIndex / len(queries) * 1e3))
+    print('ImageList.index      : %8.5f ms/lookup' % (catalogIndex / len(queries) * 1e3))
+    print('ImageList.nextPath   : %8.5f ms/lookup' % (catalogNext / len(queries) * 1e3))
+    print('sort + reindex       : %8.1f ms' % (resort * 1e3))
+    print('filter + reindex     : %8.1f ms' % (refilter * 1e3))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
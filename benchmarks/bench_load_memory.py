@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Resident memory of MainWindow.loadFile on a large JPEG and PNG: RSS growth once
+the image is shown and the process peak, with proxy loading off and on.
+Each case runs in a fresh interpreter so peaks do not mix. Linux only,
+runs under the offscreen Qt platform.
+
+Usage: python benchmarks/bench_load_memory.py [width] [height]
+"""
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+
+def rssMB():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / (1024.0 * 1024.0)
+
+
+def peakMB():
+    # VmHWM, unlike ru_maxrss, starts over at exec
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024.0
+
+
+def measure(path, proxy):
+    """Load path into a fresh MainWindow; print baseline, shown and peak MB."""
+    from labelImg import get_main_app
+    app, win = get_main_app()
+    win.defaultSaveDir = os.path.dirname(path)
+    win.proxyLoading.setChecked(proxy)
+    win.resize(1600, 1000)
+    app.processEvents()
+    baseline = rssMB()
+    win.loadFile(path)
+    win.prefetcher.waitForDone()
+    app.processEvents()
+    win.canvas.repaint()
+    if win.canvas.pyramid is not None:
+        win.canvas.pyramid.waitForDone()
+    print('%.0f %.0f %.0f' % (baseline, rssMB(), peakMB()))
+    win.close()
+
+
+def main(argv):
+    if len(argv) > 2 and argv[1] == '--measure':
+        measure(argv[2], argv[3] == 'proxy')
+        return
+    width = int(argv[1]) if len(argv) > 1 else 6000
+    height = int(argv[2]) if len(argv) > 2 else 4000
+    from PyQt5.QtGui import QImage
+    from PyQt5.QtWidgets import QApplication
+    from bench_canvas_tiles import makeImage
+    app = QApplication(argv[:1])
+    tmp = tempfile.mkdtemp()
+    try:
+        image = makeImage(width, height)
+        print('%dx%d image (%.0f MP, %.0f MB decoded)' % (
+            width, height, width * height / 1e6, width * height * 4 / (1024.0 * 1024.0)))
+        print('%12s %8s %14s %14s' % ('file', 'mode', 'RSS growth', 'peak RSS'))
+        # An RGB JPEG and a PNG with alpha, which QPainter cannot draw as decoded
+        paths = [os.path.join(tmp, 'large.jpg'), os.path.join(tmp, 'large.png')]
+        image.save(paths[0])
+        image.convertToFormat(QImage.Format_ARGB32).save(paths[1])
+        for path in paths:
+            for mode in ('full', 'proxy'):
+                child = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--measure', path, mode],
+                                         stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+                out = child.communicate()[0]
+                baseline, shown, peak = [float(x) for x in out.split()[-3:]]
+                print('%12s %8s %11.0f MB %11.0f MB' % (
+                    '%s %.1fMB' % (path[-3:], os.path.getsize(path) / 1e6), mode, shown - baseline, peak))
+    finally:
+        shutil.rmtree(tmp)
+    app.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Compare the streaming PascalVocWriter.save with the former
+ElementTree -> lxml -> prettify round trip.
+
+Usage: python benchmarks/bench_pascal_voc_writer.py [faces per image]
+"""
+import os
+import sys
+import tempfile
+import time
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..', 'libs'))
+from pascal_voc_io import PascalVocWriter
+
+
+def makeWriter(faces):
+    writer = PascalVocWriter('images', 'crowd.jpg', (4000, 6000, 3),
+                             localImgPath='/data/images/crowd.jpg')
+    for i in range(faces):
+        x = 10 + (i * 37) % 5800
+        y = 10 + (i * 53) % 3800
+        writer.addBndBox(x, y, x + 64, y + 64, 'face',
+                         i % 2, i % 4, i % 2, i % 3, 0, 0, i % 3, 0, 0, i % 5, 0, 0, 0)
+    return writer
+
+
+def legacySave(writer, targetFile):
+    root = writer.genXML()
+    writer.appendObjects(root)
+    with open(targetFile, 'wb') as out_file:
+        out_file.write(writer.prettify(root))
+
+
+def bestOf(func, number, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def main(argv):
+    faces = int(argv[1]) if len(argv) > 1 else 20
+    writer = makeWriter(faces)
+    target = os.path.join(tempfile.mkdtemp(), 'crowd.xml')
+
+    legacySave(writer, target)
+    with open(target, 'rb') as f:
+        expected = f.read()
+    writer.save(target)
+    with open(target, 'rb') as f:
+        assert f.read() == expected, 'streaming output differs from prettify()'
+
+    number = max(20, 40000 // (faces + 1))
+    legacy = bestOf(lambda: legacySave(writer, target), number)
+    stream = bestOf(lambda: writer.save(target), number)
+    print('%d faces per file' % faces)
+    print('legacy prettify : %8.1f us/file  %6.2f s/10k files' % (legacy * 1e6, legacy * 1e4))
+    print('streaming save  : %8.1f us/file  %6.2f s/10k files' % (stream * 1e6, stream * 1e4))
+    print('speedup         : %8.2fx' % (legacy / stream))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
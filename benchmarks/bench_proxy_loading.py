@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+First-paint latency of a large JPEG fitted to the window: decoding the
+full image versus a proxy reduced to the viewport. Times the decode, the
+QPixmap conversion and the first Canvas paint. Runs under the offscreen
+Qt platform.
+
+Usage: python benchmarks/bench_proxy_loading.py [width] [height]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QPixmap
+from PyQt5.QtWidgets import QApplication, QScrollArea
+
+from libs.canvas import Canvas
+from libs.imagePrefetcher import decodeImage, decodeProxy
+from bench_canvas_tiles import makeImage
+
+VIEWPORT = QSize(1600, 1000)
+ROUNDS = 3
+
+
+def firstPaint(app, canvas, path, proxy):
+    start = time.perf_counter()
+    if proxy:
+        image, size = decodeProxy(path, VIEWPORT)
+    else:
+        image = decodeImage(path)
+        size = image.size()
+    decoded = time.perf_counter()
+    canvas.loadPixmap(QPixmap.fromImage(image), image, size)
+    canvas.scale = min(VIEWPORT.width() / float(size.width()), VIEWPORT.height() / float(size.height()))
+    canvas.adjustSize()
+    canvas.repaint()
+    painted = time.perf_counter()
+    return decoded - start, painted - decoded, image
+
+
+def main(argv):
+    app = QApplication(argv[:1])
+    width = int(argv[1]) if len(argv) > 1 else 8000
+    height = int(argv[2]) if len(argv) > 2 else 6000
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'large.jpg')
+        makeImage(width, height).save(path, quality=90)
+        canvas = Canvas()
+        scroll = QScrollArea()
+        scroll.setWidget(canvas)
+        scroll.setWidgetResizable(True)
+        scroll.resize(VIEWPORT)
+        scroll.show()
+        app.processEvents()
+        print('%dx%d JPEG (%.1f MB), %dx%d viewport' % (
+            width, height, os.path.getsize(path) / 1e6, VIEWPORT.width(), VIEWPORT.height()))
+        print('%8s %12s %16s %12s %12s' % ('mode', 'decode', 'convert+paint', 'first paint', 'decoded'))
+        for proxy in (False, True):
+            best = None
+            for _ in range(ROUNDS):
+                decode, paint, image = firstPaint(app, canvas, path, proxy)
+                if best is None or decode + paint < sum(best):
+                    best = (decode, paint)
+            print('%8s %9.0f ms %13.0f ms %9.0f ms %12s' % (
+                'proxy' if proxy else 'full', best[0] * 1e3, best[1] * 1e3, sum(best) * 1e3,
+                '%dx%d' % (image.width(), image.height())))
+        scroll.close()
+    finally:
+        shutil.rmtree(tmp)
+    app.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
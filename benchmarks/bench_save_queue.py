@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Time MainWindow.saveFile spends on the GUI thread with the background
+save queue, against waiting for the write as saving used to. Also counts
+the writes left when one XML is saved repeatedly in a burst. Runs under
+the offscreen Qt platform.
+
+Usage: python benchmarks/bench_save_queue.py [faces per image]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import Qt
+
+from labelImg import get_main_app
+from libs.attributes import ATTRIBUTE_TAGS
+
+SAVES = 20
+
+
+def faces(count):
+    shapes = []
+    for i in range(count):
+        x, y = 10 + (i * 37) % 1800, 10 + (i * 53) % 1000
+        shapes.append(('face', [(x, y), (x + 40, y), (x + 40, y + 40), (x, y + 40)], None, None,
+                       [(i + j) % 3 for j in range(len(ATTRIBUTE_TAGS))]))
+    return shapes
+
+
+def main(argv):
+    count = int(argv[1]) if len(argv) > 1 else 200
+    tmp = tempfile.mkdtemp()
+    app, win = get_main_app(argv[:1])
+    try:
+        app.processEvents()
+        imagePath = os.path.join(tmp, 'crowd.png')
+        shutil.copy(os.path.join(dir_name, '..', 'tests', u'屏幕截图.png'), imagePath)
+        win.defaultSaveDir = tmp
+        win.loadFile(imagePath)
+        win.loadLabels(faces(count))
+        writes = []
+        win.saveQueue.saved.connect(lambda target, image: writes.append(target), Qt.DirectConnection)
+
+        results = []
+        for queued in (False, True):
+            del writes[:]
+            start = time.perf_counter()
+            for _ in range(SAVES):
+                win.setDirty()
+                win.saveFile()
+                if not queued:
+                    win.saveQueue.flush()
+            blocked = (time.perf_counter() - start) / SAVES
+            win.saveQueue.flush()
+            results.append((blocked, len(writes)))
+        app.processEvents()
+
+        print('%d faces per image, %d saves of one XML in a burst' % (count, SAVES))
+        print('%22s %14s %8s' % ('', 'GUI thread', 'writes'))
+        print('%22s %11.2f ms %8d' % ('waiting for the write', results[0][0] * 1e3, results[0][1]))
+        print('%22s %11.2f ms %8d' % ('queued', results[1][0] * 1e3, results[1][1]))
+    finally:
+        win.close()
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
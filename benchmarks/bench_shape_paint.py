@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Painting and hit-testing static shapes: paths rebuilt on every call, as
+Shape used to, versus the paths Shape now caches. Runs under the
+offscreen Qt platform.
+
+Usage: python benchmarks/bench_shape_paint.py [shapes] [frames]
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import QPointF
+from PyQt5.QtGui import QImage, QPainter, QPainterPath, QPen
+from PyQt5.QtWidgets import QApplication
+
+from libs.shape import Shape
+
+WIDTH, HEIGHT = 1920, 1080
+
+
+def legacyPaint(shape, painter):
+    # Shape.paint before the path caches
+    color = shape.select_line_color if shape.selected else shape.line_color
+    pen = QPen(color)
+    pen.setWidth(max(1, int(round(2.0 / shape.scale))))
+    painter.setPen(pen)
+    line_path = QPainterPath()
+    vrtx_path = QPainterPath()
+    line_path.moveTo(shape.points[0])
+    for i, p in enumerate(shape.points):
+        line_path.lineTo(p)
+        shape.drawVertex(vrtx_path, i)
+    if shape.isClosed():
+        line_path.lineTo(shape.points[0])
+    painter.drawPath(line_path)
+    painter.drawPath(vrtx_path)
+    painter.fillPath(vrtx_path, shape.vertex_fill_color)
+
+
+def legacyContains(shape, point):
+    path = QPainterPath(shape.points[0])
+    for p in shape.points[1:]:
+        path.lineTo(p)
+    return path.contains(point)
+
+
+def makeShapes(count):
+    random.seed(count)
+    shapes = []
+    for _ in range(count):
+        x, y = random.uniform(0, WIDTH - 80), random.uniform(0, HEIGHT - 80)
+        size = random.uniform(20, 80)
+        shape = Shape('face')
+        for px, py in ((x, y), (x + size, y), (x + size, y + size), (x, y + size)):
+            shape.addPoint(QPointF(px, py))
+        shape.close()
+        shapes.append(shape)
+    return shapes
+
+
+def paintFrames(shapes, paint, frames):
+    image = QImage(WIDTH, HEIGHT, QImage.Format_ARGB32_Premultiplied)
+    start = time.perf_counter()
+    for _ in range(frames):
+        painter = QPainter(image)
+        painter.setRenderHint(QPainter.Antialiasing)
+        for shape in shapes:
+            paint(shape, painter)
+        painter.end()
+    return (time.perf_counter() - start) / frames
+
+
+def geometryOnly(shapes, frames, cached):
+    start = time.perf_counter()
+    for _ in range(frames):
+        for shape in shapes:
+            if cached:
+                shape.linePath()
+                shape.vertexPath()
+            else:
+                line_path = QPainterPath()
+                vrtx_path = QPainterPath()
+                line_path.moveTo(shape.points[0])
+                for i, p in enumerate(shape.points):
+                    line_path.lineTo(p)
+                    shape.drawVertex(vrtx_path, i)
+    return (time.perf_counter() - start) / frames
+
+
+def main(argv):
+    app = QApplication(argv[:1])
+    count = int(argv[1]) if len(argv) > 1 else 1000
+    frames = int(argv[2]) if len(argv) > 2 else 20
+    shapes = makeShapes(count)
+    Shape.scale = 1.0
+    legacy = paintFrames(shapes, legacyPaint, frames)
+    cached = paintFrames(shapes, Shape.paint, frames)
+    legacyPaths = geometryOnly(shapes, frames, False)
+    cachedPaths = geometryOnly(shapes, frames, True)
+    points = [QPointF(random.uniform(0, WIDTH), random.uniform(0, HEIGHT)) for _ in range(20)]
+    start = time.perf_counter()
+    for point in points:
+        [legacyContains(shape, point) for shape in shapes]
+    legacyHit = (time.perf_counter() - start) / len(points)
+    start = time.perf_counter()
+    for point in points:
+        [shape.containsPoint(point) for shape in shapes]
+    cachedHit = (time.perf_counter() - start) / len(points)
+
+    print('%d shapes, %d frames' % (count, frames))
+    print('paint frame, rebuilt paths : %8.2f ms (%5.1f fps)' % (legacy * 1e3, 1 / legacy))
+    print('paint frame, cached paths  : %8.2f ms (%5.1f fps)' % (cached * 1e3, 1 / cached))
+    print('path building, rebuilt     : %8.2f ms/frame' % (legacyPaths * 1e3))
+    print('path building, cached      : %8.2f ms/frame' % (cachedPaths * 1e3))
+    print('containsPoint x all, built : %8.2f ms' % (legacyHit * 1e3))
+    print('containsPoint x all, cached: %8.2f ms' % (cachedHit * 1e3))
+    app.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
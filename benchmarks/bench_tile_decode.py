@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Time to the first tile, and to all tiles of a 1600x1000 viewport, of a
+large JPEG read from the file: a clip rect per tile versus one clip per
+tile row as ImagePyramid reads them, then through the pyramid's worker
+pool as the canvas requests them. Runs under the offscreen Qt platform.
+
+Usage: python benchmarks/bench_tile_decode.py [width] [height]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import QRect, QRectF, QSize
+from PyQt5.QtGui import QImage, QImageReader, QPainter
+from PyQt5.QtWidgets import QApplication
+
+from bench_canvas_tiles import makeImage
+from libs.imagePyramid import ImagePyramid
+
+VIEWPORT = (1600, 1000)
+
+
+def decodeEach(pyramid, keys):
+    """The tiles read one clip rect each; returns (first, all) in seconds."""
+    start = time.perf_counter()
+    first = None
+    for level, tx, ty in keys:
+        reader = QImageReader(pyramid.path)
+        reader.setClipRect(pyramid.tileRect(level, tx, ty).toAlignedRect().intersected(
+            QRect(0, 0, pyramid.size.width(), pyramid.size.height())))
+        reader.setScaledSize(QSize(*pyramid.tileSizeAt(level, tx, ty)))
+        reader.read()
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def decodeRows(path, size, keys):
+    """The tiles built by a fresh pyramid on this thread."""
+    pyramid = ImagePyramid(QImage(), path=path, size=size)
+    start = time.perf_counter()
+    first = None
+    for key in keys:
+        pyramid.renderTile(*key)
+        if first is None:
+            first = time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def decodeQueued(app, path, size, keys, rect, level):
+    """The tiles painted from a fresh pyramid, built by its workers."""
+    pyramid = ImagePyramid(QImage(32, 32, QImage.Format_RGB32), path=path, size=size)
+    ready = []
+    pyramid.tileReady.connect(lambda *key: ready.append((key, time.perf_counter())))
+    target = QImage(VIEWPORT[0], VIEWPORT[1], QImage.Format_ARGB32_Premultiplied)
+    painter = QPainter(target)
+    start = time.perf_counter()
+    pyramid.paint(painter, rect, level)
+    painter.end()
+    wanted = set(keys)
+    while not wanted.issubset(key for key, _ in ready):
+        app.processEvents()
+        time.sleep(0.001)
+    times = [when for key, when in ready if key in wanted]
+    pyramid.cancel()
+    pyramid.waitForDone()
+    return min(times) - start, max(times) - start
+
+
+def main(argv):
+    app = QApplication(argv[:1])
+    width = int(argv[1]) if len(argv) > 1 else 12000
+    height = int(argv[2]) if len(argv) > 2 else 9000
+    tmp = tempfile.mkdtemp()
+    try:
+        path = os.path.join(tmp, 'large.jpg')
+        makeImage(width, height).save(path, quality=90)
+        size = QSize(width, height)
+        probe = ImagePyramid(QImage(), path=path, size=size)
+        print('%dx%d JPEG (%.0f MP), %dx%d viewport' % (width, height, width * height / 1e6,
+                                                       VIEWPORT[0], VIEWPORT[1]))
+        print('%-13s %6s %20s %20s %20s' % ('view', 'tiles', 'clip per tile', 'clip per row',
+                                           'row, worker pool'))
+        fit = min(VIEWPORT[0] / float(width), VIEWPORT[1] / float(height))
+        centre = QRectF((width - VIEWPORT[0]) / 2.0, (height - VIEWPORT[1]) / 2.0, *VIEWPORT)
+        for name, scale, rect in (('fit window', fit, QRectF(0, 0, width, height)),
+                                  ('25% centre', 0.25, QRectF(centre.center().x() - VIEWPORT[0] * 2,
+                                                              centre.center().y() - VIEWPORT[1] * 2,
+                                                              VIEWPORT[0] * 4, VIEWPORT[1] * 4)),
+                                  ('100% centre', 1.0, centre)):
+            level = probe.levelFor(scale)
+            keys = probe.tilesIn(level, rect)
+            cells = [decodeEach(probe, keys), decodeRows(path, size, keys),
+                     decodeQueued(app, path, size, keys, rect, level)]
+            print('%-13s %6d %s' % (name, len(keys), ' '.join(
+                '%7.0f / %7.0f ms' % (first * 1e3, total * 1e3) for first, total in cells)))
+        print('(first tile / all tiles)')
+    finally:
+        shutil.rmtree(tmp)
+    app.quit()
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Time MainWindow.undoEdit / redoEdit for images with more and more faces,
+of single-face edits and of deleting a face from the middle, and measure the undo history left by a long session of single-face edits
+against keeping a Shape.copy() snapshot of the image per edit. Runs under
+the offscreen Qt platform.
+
+Usage: python benchmarks/bench_undo.py [edits]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+
+from PyQt5.QtCore import QPointF
+
+from labelImg import get_main_app
+from libs.attributes import ATTRIBUTE_TAGS
+from libs.editJournal import EditJournal
+
+FACE_COUNTS = (50, 500, 2000)
+
+
+def faces(count):
+    shapes = []
+    for i in range(count):
+        x, y = 10 + (i * 37) % 1800, 10 + (i * 53) % 1000
+        shapes.append(('face', [(x, y), (x + 40, y), (x + 40, y + 40), (x, y + 40)], None, None,
+                       [0] * len(ATTRIBUTE_TAGS)))
+    return shapes
+
+
+def edit(win, i):
+    """One single-face edit, alternating moves and attribute changes."""
+    shape = win.canvas.shapes[(i * 7) % len(win.canvas.shapes)]
+    if i % 2:
+        shape.moveBy(QPointF(1, 1))
+    else:
+        shape.attributes[0] = 1 - shape.attributes[0]
+    win.setDirty([shape])
+    win.undoStack.seal()
+
+
+def deleteAndUndo(win, repeats=100):
+    """Seconds to delete the middle face, undo that, and redo it."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        win.canvas.selectShape(win.canvas.shapes[len(win.canvas.shapes) // 2])
+        win.deleteSelectedShape()
+        win.undoEdit()
+        win.redoEdit()
+        win.undoEdit()
+    return (time.perf_counter() - start) / repeats
+
+
+def main(argv):
+    edits = int(argv[1]) if len(argv) > 1 else 2000
+    tmp = tempfile.mkdtemp()
+    app, win = get_main_app(argv[:1])
+    try:
+        app.processEvents()
+        imagePath = os.path.join(tmp, 'crowd.png')
+        shutil.copy(os.path.join(dir_name, '..', 'tests', u'屏幕截图.png'), imagePath)
+        win.journal = EditJournal(os.path.join(tmp, 'journal'))
+        win.defaultSaveDir = tmp
+
+        print('%d single-face edits' % edits)
+        print('%8s %12s %12s %12s %14s %14s'
+              % ('faces', 'undo', 'redo', 'delete', 'history', 'snapshots'))
+        for count in FACE_COUNTS:
+            win.loadFile(imagePath)
+            win.loadLabels(faces(count))
+            win.journal.open(imagePath, win.defaultAnnotationPath(imagePath), win.canvas.shapes, False)
+
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            for i in range(edits):
+                edit(win, i)
+            history = tracemalloc.get_traced_memory()[0] - before
+            tracemalloc.stop()
+
+            steps = min(edits, len(win.undoStack))
+            start = time.perf_counter()
+            for _ in range(steps):
+                win.undoEdit()
+            undo = (time.perf_counter() - start) / steps
+            start = time.perf_counter()
+            for _ in range(steps):
+                win.redoEdit()
+            redo = (time.perf_counter() - start) / steps
+            deleted = deleteAndUndo(win)
+
+            # What one deep copy of the shapes per step would hold
+            tracemalloc.start()
+            before = tracemalloc.get_traced_memory()[0]
+            snapshot = [shape.copy() for shape in win.canvas.shapes]
+            snapshots = (tracemalloc.get_traced_memory()[0] - before) * steps
+            tracemalloc.stop()
+            del snapshot
+
+            print('%8d %9.3f ms %9.3f ms %9.3f ms %11.1f MB %11.1f MB'
+                  % (count, undo * 1e3, redo * 1e3, deleted * 1e3, history / 1048576.0,
+                     snapshots / 1048576.0))
+            win.setClean()
+    finally:
+        win.close()
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -1,13 +1,15 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import codecs
+import copy
 import os.path
 import re
+import sqlite3
 import sys
 import subprocess
 
 from functools import partial
-from collections import defaultdict
+from collections import OrderedDict, defaultdict, deque
 
 try:
     from PyQt5.QtGui import *
@@ -35,6 +37,23 @@ from libs.zoomWidget import ZoomWidget
 from libs.labelDialog import LabelDialog
 from libs.colorDialog import ColorDialog
 from libs.labelFile import LabelFile, LabelFileError
+from libs.imagePrefetcher import ImagePrefetcher, DEFAULT_CACHE_MB
+from libs.imagePrefetcher import decodeImage, decodeProxy, paintableImage, tiledImageSize
+from libs.imageList import ImageList, iterImagePaths
+from libs.fileListModel import FileListModel, ImageScanner, CatalogRefresher
+from libs.annotationCatalog import AnnotationCatalog, catalogFile
+from libs.annotationCatalog import STATUS_UNANNOTATED, STATUS_ANNOTATED, STATUS_VERIFIED
+from libs.headless import annotationPath
+from libs.saveQueue import SaveQueue
+from libs.editJournal import EditJournal, CHECKPOINT_INTERVAL_MS, FLUSH_INTERVAL_MS, recoverSessions, rewriteSession
+from libs.undoStack import UndoStack
+from libs.faceDetector import DEFAULT_DETECTOR, detectorAvailable, getDetector
+from libs.preAnnotator import PreAnnotator
+try:
+    from libs.framePropagator import FramePropagator
+except ImportError:
+    # Needs NumPy
+    FramePropagator = None
 from libs.toolBar import ToolBar
 from libs.pascal_voc_io import PascalVocReader
 from libs.pascal_voc_io import XML_EXT
@@ -93,7 +112,10 @@ class MainWindow(QMainWindow, WindowMixin):
         self.defaultSaveDir = None
         self.usingPascalVocFormat = True
         # For loading all image under a directory
-        self.mImgList = []
+        self.mImgList = ImageList()
+        self.scanner = None
+        self.catalog = None
+        self.catalogRefresher = None
         self.dirname = None
         self.labelHist = []
         self.lastOpenDir = None
@@ -442,11 +464,30 @@ class MainWindow(QMainWindow, WindowMixin):
         self.dock.setWidget(labelListContainer)
 
         # Tzutalin 20160906 : Add file list and dock to move faster
-        self.fileListWidget = QListWidget()
-        self.fileListWidget.itemDoubleClicked.connect(self.fileitemDoubleClicked)
+        self.fileListModel = FileListModel(self.mImgList, self)
+        self.fileListView = QListView()
+        self.fileListView.setModel(self.fileListModel)
+        # Lay out only the visible rows of large directories
+        self.fileListView.setUniformItemSizes(True)
+        self.fileListView.setLayoutMode(QListView.Batched)
+        self.fileListView.doubleClicked.connect(self.fileitemDoubleClicked)
+        self.scanProgress = QProgressBar()
+        self.scanProgress.setRange(0, 0)
+        self.scanProgress.setTextVisible(False)
+        self.scanCancelButton = QToolButton()
+        self.scanCancelButton.setText(u'Cancel')
+        self.scanCancelButton.clicked.connect(self.cancelScan)
+        scanLayout = QHBoxLayout()
+        scanLayout.setContentsMargins(0, 0, 0, 0)
+        scanLayout.addWidget(self.scanProgress)
+        scanLayout.addWidget(self.scanCancelButton)
+        self.scanStatus = QWidget()
+        self.scanStatus.setLayout(scanLayout)
+        self.scanStatus.hide()
         filelistLayout = QVBoxLayout()
         filelistLayout.setContentsMargins(0, 0, 0, 0)
-        filelistLayout.addWidget(self.fileListWidget)
+        filelistLayout.addWidget(self.fileListView)
+        filelistLayout.addWidget(self.scanStatus)
         fileListContainer = QWidget()
         fileListContainer.setLayout(filelistLayout)
         self.filedock = QDockWidget(u'File List', self)
@@ -470,7 +511,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.canvas.scrollRequest.connect(self.scrollRequest)
 
         self.canvas.newShape.connect(self.newShape)
-        self.canvas.shapeMoved.connect(self.setDirty)
+        self.canvas.shapeMoved.connect(self.shapeMoved)
         self.canvas.selectionChanged.connect(self.shapeSelectionChanged)
         self.canvas.drawingPolygon.connect(self.toggleDrawingSensitive)
 
@@ -505,6 +546,15 @@ class MainWindow(QMainWindow, WindowMixin):
         openPrevImg = action('&Prev Image', self.openPrevImg,
                              'left', 'prev', u'Open Prev')
 
+        nextUnannotated = action('Next &Unannotated Image', self.openNextUnannotated,
+                                 'Ctrl+Right', 'next', u'Open the next image without annotation')
+
+        nextUnverified = action('Next Un&verified Image', self.openNextUnverified,
+                                'Ctrl+Shift+Right', 'next', u'Open the next image not verified yet')
+
+        rebuildCatalog = action('&Rebuild Annotation Catalog', self.rebuildCatalog,
+                                None, 'open', u'Re-read every annotation of the opened directory')
+
         verify = action('&Verify Image', self.verifyImg,
                         'space', 'verify', u'Verify Image')
 
@@ -532,6 +582,10 @@ class MainWindow(QMainWindow, WindowMixin):
         copy = action('&Duplicate\nRectBox', self.copySelectedShape,
                       'Ctrl+D', 'copy', u'Create a duplicate of the selected Box',
                       enabled=False)
+        undo = action('&Undo', self.undoEdit, 'Ctrl+Z', None,
+                      u'Undo the last Box edit', enabled=False)
+        redo = action('&Redo', self.redoEdit, ['Ctrl+Y', 'Ctrl+Shift+Z'], None,
+                      u'Redo the last undone Box edit', enabled=False)
 
         advancedMode = action('&Advanced Mode', self.toggleAdvancedMode,
                               'Ctrl+Shift+A', 'expert', u'Switch to advanced mode',
@@ -610,6 +664,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.actions = struct(save=save, saveAs=saveAs, open=open, close=close,
                               lineColor=color1, fillColor=color2,
                               create=create, delete=delete, edit=edit, copy=copy,
+                              undo=undo, redo=redo,
                               createMode=createMode, editMode=editMode, advancedMode=advancedMode,
                               shapeLineColor=shapeLineColor, shapeFillColor=shapeFillColor,
                               zoom=zoom, zoomIn=zoomIn, zoomOut=zoomOut, zoomOrg=zoomOrg,
@@ -618,7 +673,7 @@ class MainWindow(QMainWindow, WindowMixin):
                               fileMenuActions=(
                                   open, opendir, save, saveAs, close, quit),
                               beginner=(), advanced=(),
-                              editMenu=(edit, copy, delete,
+                              editMenu=(undo, redo, None, edit, copy, delete,
                                         None, color1, color2),
                               beginnerContext=(create, edit, copy, delete),
                               advancedContext=(createMode, editMode, edit, copy,
@@ -646,12 +701,30 @@ class MainWindow(QMainWindow, WindowMixin):
         self.singleClassMode.setCheckable(True)
         self.lastLabel = None
 
+        # Show images reduced to the window size while the full size decodes
+        self.proxyLoading = QAction("Fast Preview Loading", self)
+        self.proxyLoading.setCheckable(True)
+
+        # Propose faces on images without annotations, detected in the background
+        self.autoAnnotate = QAction("Auto-annotate Faces", self)
+        self.autoAnnotate.setCheckable(True)
+        self.autoAnnotate.toggled.connect(self.toggleAutoAnnotate)
+
+        # Carry the faces of a video frame over to the next, unannotated one
+        self.propagateFrames = QAction("Propagate Boxes to Next Frame", self)
+        self.propagateFrames.setCheckable(True)
+        self.propagateFrames.setEnabled(FramePropagator is not None)
+
         addActions(self.menus.file,
-                   (open, opendir, changeSavedir, openAnnotation, self.menus.recentFiles, save, saveAs, close, None, quit))
+                   (open, opendir, changeSavedir, openAnnotation, self.menus.recentFiles, save, saveAs, close, None,
+                    nextUnannotated, nextUnverified, rebuildCatalog, None, quit))
         addActions(self.menus.help, (help,))
         addActions(self.menus.view, (
             self.autoSaving,
             self.singleClassMode,
+            self.proxyLoading,
+            self.autoAnnotate,
+            self.propagateFrames,
             labels, advancedMode, None,
             hideAll, showAll, None,
             zoomIn, zoomOut, zoomOrg, None,
@@ -680,6 +753,9 @@ class MainWindow(QMainWindow, WindowMixin):
 
         # Application state.
         self.image = QImage()
+        # (xml path, LabelFile.fingerprint) of what that XML holds, or will
+        # once the save queue gets to it
+        self.annotationFingerprint = None
         self.filePath = ustr(defaultFilename)
         self.recentFiles = []
         self.maxRecent = 7
@@ -687,58 +763,6 @@ class MainWindow(QMainWindow, WindowMixin):
         self.fillColor = None
         self.zoom_level = 100
         self.fit_window = False
-        # Add Chris
-        self.isfemale = False
-        self.ismale = False
-
-        self.young = False
-        self.middle = False
-        self.old = False
-        self.children = False
-
-        self.nomask = False
-        self.mask = False
-
-        self.closemouth = False
-        self.openmouth = False
-        self.uncertainmouth = False
-
-        self.noeyeglass = False
-        self.eyeglass = False
-
-        self.nosunglass = False
-        self.sunglass = False
-
-        self.openeye = False
-        self.closeeye = False
-        self.uncertaineye = False
-
-        self.norm_emotion = False
-        self.laugh = False
-        self.shock = False
-
-        self.blur = False
-        self.noblur = False
-
-        self.norm_illumination = False
-        self.dim = False
-        self.bright = False
-        self.backlight = False
-        self.yinyang = False
-
-        self.norm_yaw = False
-        self.yaw_30 = False
-        self.yaw_60 = False
-
-        self.norm_roll = False
-        self.roll_20 = False
-        self.roll_45 = False
-
-        self.norm_pitch = False
-        self.pitch_20up = False
-        self.pitch_45up = False
-        self.pitch_20down = False
-        self.pitch_45down = False
 
         # Load predefined classes to the list
         self.loadPredefinedClasses(defaultPrefdefClassFile)
@@ -775,64 +799,61 @@ class MainWindow(QMainWindow, WindowMixin):
         Shape.line_color = self.lineColor
         Shape.fill_color = self.fillColor
 
-        # Add chris
-        Shape.isfemale = self.isfemale
-        Shape.ismale = self.ismale
-
-        Shape.young = self.young
-        Shape.middle = self.middle
-        Shape.old = self.old
-        Shape.children = self.children
-
-        Shape.nomask = self.nomask
-        Shape.mask = self.mask
-
-        Shape.closemouth = self.closemouth
-        Shape.openmouth = self.openmouth
-        Shape.uncertainmouth = self.uncertainmouth
-
-        Shape.noeyeglass = self.noeyeglass
-        Shape.eyeglass = self.eyeglass
-
-        Shape.nosunglass = self.nosunglass
-        Shape.sunglass = self.sunglass
-
-        Shape.openeye = self.openeye
-        Shape.closeeye = self.closeeye
-        Shape.uncertaineye = self.uncertaineye
-
-        Shape.norm_emotion = self.norm_emotion
-        Shape.laugh = self.laugh
-        Shape.shock = self.shock
-
-        Shape.noblur = self.noblur
-        Shape.blur = self.blur
-
-        Shape.norm_illumination = self.norm_illumination
-        Shape.dim = self.dim
-        Shape.bright = self.bright
-        Shape.backlight = self.backlight
-        Shape.yinyang = self.yinyang
-
-        Shape.norm_yaw = self.norm_yaw
-        Shape.yaw_30 = self.yaw_30
-        Shape.yaw_60 = self.yaw_60
-
-        Shape.norm_roll = self.norm_roll
-        Shape.roll_20 = self.roll_20
-        Shape.roll_45 = self.roll_45
-
-        Shape.norm_pitch = self.norm_pitch
-        Shape.pitch_20up = self.pitch_20up
-        Shape.pitch_45up = self.pitch_45up
-        Shape.pitch_20down = self.pitch_20down
-        Shape.pitch_45down = self.pitch_45down
+        # Decode the next/previous images of mImgList in the background
+        self.prefetcher = ImagePrefetcher(settings.get(SETTING_PREFETCH_CACHE_MB, DEFAULT_CACHE_MB),
+                                          parent=self)
+        self.prefetcher.decoded.connect(self.fullImageDecoded)
+
+        # Annotation files are written off the GUI thread
+        self.saveQueue = SaveQueue(self)
+        self.saveQueue.saved.connect(self.annotationSaved)
+        self.saveQueue.failed.connect(self.annotationSaveFailed)
+        self.saveQueue.start()
+
+        # Edits are journaled as they happen, so a crash loses none of them;
+        # saves settle them. Annotation path -> (journaled xml path, journal
+        # seq) of each save in flight, oldest first
+        self.journal = EditJournal()
+        self.journalSaves = defaultdict(deque)
+        self.journalWarned = False
+        # Journaled edits reach the OS this long after the first of them
+        self.journalFlushTimer = QTimer(self)
+        self.journalFlushTimer.setSingleShot(True)
+        self.journalFlushTimer.timeout.connect(self.flushJournal)
+        # Undo steps are the deltas the journal records
+        self.undoStack = UndoStack()
+        self._replayingEdits = False
+        # Recovered XML path -> (journal path, annotation) of each write of
+        # crashed sessions' edits in flight, and journal path -> annotations
+        # to keep in it once they are done
+        self.recoveries = {}
+        self.recoveryKept = defaultdict(list)
+        # Once the window is up, as it may ask first
+        QTimer.singleShot(0, self.recoverJournals)
+        self.journalTimer = QTimer(self)
+        self.journalTimer.timeout.connect(self.checkpointJournal)
+        self.journalTimer.start(CHECKPOINT_INTERVAL_MS)
+
+        # Runs the face detector ahead of the annotator while autoAnnotate is on
+        self.preAnnotator = None
+        self.faceDetector = settings.get(SETTING_FACE_DETECTOR, DEFAULT_DETECTOR)
+        # Tracks the faces of the current frame into the next one ahead of time
+        self.propagator = FramePropagator(self) if FramePropagator is not None else None
+        # (previous frame, frame, faces) still being tracked when the frame opened
+        self.pendingPropagation = None
+        if self.propagator is not None:
+            self.propagator.tracked.connect(self.propagationTracked)
 
         def xbool(x):
             if isinstance(x, QVariant):
                 return x.toBool()
             return bool(x)
 
+        self.proxyLoading.setChecked(xbool(settings.get(SETTING_PROXY_LOADING, True)))
+        self.autoAnnotate.setChecked(xbool(settings.get(SETTING_AUTO_ANNOTATE, False)))
+        self.propagateFrames.setChecked(self.propagator is not None and
+                                        xbool(settings.get(SETTING_PROPAGATE, False)))
+
         if xbool(settings.get(SETTING_ADVANCE_MODE, False)):
             self.actions.advancedMode.setChecked(True)
             self.toggleAdvancedMode()
@@ -887,9 +908,109 @@ class MainWindow(QMainWindow, WindowMixin):
         self.tools.clear()
         addActions(self.tools, self.actions.advanced)
 
-    def setDirty(self):
+    def setDirty(self, touched=None):
+        """Mark the image unsaved and journal the edit; see recordEdits() for touched."""
         self.dirty = True
         self.actions.save.setEnabled(True)
+        self.recordEdits(touched)
+
+    def shapeMoved(self):
+        """A drag or nudge moved one shape: journal that one alone, once per mouse move."""
+        canvas = self.canvas
+        shape = canvas.hShape if canvas.selectedVertex() else canvas.selectedShape
+        self.setDirty([shape] if shape is not None else None)
+
+    def recordEdits(self, touched=None):
+        """
+            Journal what changed on the canvas since the last call, as an undo
+            step. touched, if given, holds the only shapes that can have changed.
+        """
+        changes = self.journal.record(self.canvas.shapes, self.canvas.verified, touched)
+        if changes:
+            if not self.journalFlushTimer.isActive():
+                self.journalFlushTimer.start(FLUSH_INTERVAL_MS)
+            if not self._replayingEdits:
+                self.undoStack.push(changes)
+                self.updateUndoActions()
+
+    def updateUndoActions(self):
+        self.actions.undo.setEnabled(self.undoStack.canUndo())
+        self.actions.redo.setEnabled(self.undoStack.canRedo())
+
+    def undoEdit(self, _value=False):
+        if self.undoStack.canUndo() and self.canvas.current is None:
+            self.replayEdit(self.undoStack.undo(), backwards=True)
+
+    def redoEdit(self, _value=False):
+        if self.undoStack.canRedo() and self.canvas.current is None:
+            self.replayEdit(self.undoStack.redo(), backwards=False)
+
+    def replayEdit(self, step, backwards):
+        """Apply the deltas of an undo step to the canvas, touching only the shapes in it."""
+        self._replayingEdits = True
+        touched = []
+        try:
+            for kind, sid, after, before in (reversed(step) if backwards else step):
+                value = before if backwards else after
+                if kind == 'verified':
+                    self.canvas.verified = value
+                    if self.labelFile is not None:
+                        self.labelFile.verified = value
+                    self.canvas.update()
+                    continue
+                if kind in ('create', 'delete'):
+                    if (kind == 'create') == backwards:
+                        shape = self.journal.shapeOf(sid)
+                        self.dropShape(shape, self.journal.indexOf(self.canvas.shapes, sid))
+                    else:
+                        shape = self.restoreShape(sid, *(after if kind == 'create' else before))
+                    touched.append(shape)
+                    continue
+                shape = self.journal.shapeOf(sid)
+                touched.append(shape)
+                rect = self.canvas.shapeRect(shape)
+                if kind == 'move':
+                    sign = -1 if backwards else 1
+                    shape.moveBy(QPointF(sign * after[0], sign * after[1]))
+                elif kind == 'resize':
+                    shape.points = [QPointF(x, y) for x, y in value]
+                elif kind == 'label':
+                    shape.label = value
+                    self.labelList.blockSignals(True)
+                    self.shapesToItems[shape].setText(value)
+                    self.labelList.blockSignals(False)
+                elif kind == 'attributes':
+                    shape.attributes = list(value)
+                self.canvas.reindexShape(shape)
+                self.canvas.updateRects(rect, self.canvas.shapeRect(shape))
+            # Like setDirty(), comparing only the shapes in the step
+            self.dirty = True
+            self.actions.save.setEnabled(True)
+            self.recordEdits(touched)
+            if self.canvas.selectedShape is not None:
+                # Show the attributes of the selected face as they are now
+                self.labelSelectionChanged()
+        finally:
+            self._replayingEdits = False
+        self.updateUndoActions()
+
+    def restoreShape(self, sid, label, points, attributes):
+        shape = Shape(label=label, attributes=attributes)
+        for x, y in points:
+            shape.addPoint(QPointF(x, y))
+        shape.close()
+        # Back in its place in paint order, found from its id
+        self.canvas.insertShape(self.journal.indexOf(self.canvas.shapes, sid), shape)
+        self.journal.adopt(shape, sid)
+        self.addLabel(shape)
+        return shape
+
+    def dropShape(self, shape, index=None):
+        self.canvas.removeShape(shape, index)
+        self.remLabel(shape)
+        if self.noShapes():
+            for action in self.actions.onShapesPresent:
+                action.setEnabled(False)
 
     def setClean(self):
         self.dirty = False
@@ -957,6 +1078,10 @@ class MainWindow(QMainWindow, WindowMixin):
         self.filePath = None
         self.imageData = None
         self.labelFile = None
+        self.annotationFingerprint = None
+        self.journal.leave()
+        self.undoStack.clear()
+        self.updateUndoActions()
         self.canvas.resetState()
 
     def currentItem(self):
@@ -1037,7 +1162,7 @@ class MainWindow(QMainWindow, WindowMixin):
         text = self.labelDialog.popUp(item.text())
         if text is not None:
             item.setText(text)
-            self.setDirty()
+            self.setDirty([self.itemsToShapes[item]])
 
     def editAge(self, item=None):
         if not self.canvas.editing():
@@ -1046,18 +1171,18 @@ class MainWindow(QMainWindow, WindowMixin):
         text = self.ageDialog.popUp(item.text())
         if text is not None:
             item.setText(text)
-            self.setDirty()
+            self.setDirty([self.itemsToShapes[item]])
 
     # Tzutalin 20160906 : Add file list and dock to move faster
-    def fileitemDoubleClicked(self, item=None):
-        currIndex = self.mImgList.index(ustr(item.text()))
-        if currIndex < len(self.mImgList):
-            filename = self.mImgList[currIndex]
-            if filename:
-                self.loadFile(filename)
+    def fileitemDoubleClicked(self, index=None):
+        filename = self.fileListModel.path(index)
+        if filename:
+            self.loadFile(filename)
 
     # React to canvas signals.
     def shapeSelectionChanged(self, selected=False):
+        # Moves of another selection, or a new drag, are a new undo step
+        self.undoStack.seal()
         if self._noSelectionSlot:
             self._noSelectionSlot = False
         else:
@@ -1095,34 +1220,8 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def loadLabels(self, shapes):
         s = []
-        for label, points, line_color, fill_color, \
-            isfemale, ismale, \
-            young, middle, old, children,\
-            nomask, mask,\
-            closemouth, openmouth, uncertainmouth,\
-            noeyeglass, eyeglass,\
-            nosunglass, sunglass,\
-            openeye, closeeye, uncertaineye, \
-            norm_emotion, laugh, shock, \
-            noblur, blur, \
-            norm_illumination,dim, bright, backlight, yinyang,\
-            norm_yaw, yaw_30, yaw_60,\
-            norm_roll, roll_20, roll_45,\
-            norm_pitch, pitch_20up, pitch_45up, pitch_20down, pitch_45down in shapes:
-            shape = Shape(label=label,
-                          isfemale=isfemale, ismale=ismale,
-                          young=young, middle=middle, old=old, children=children,
-                          nomask=nomask, mask=mask,
-                          closemouth=closemouth, openmouth=openmouth, uncertainmouth=uncertainmouth,
-                          noeyeglass=noeyeglass, eyeglass=eyeglass,
-                          nosunglass=nosunglass, sunglass=sunglass,
-                          openeye=openeye, closeeye=closeeye, uncertaineye=uncertaineye,
-                          norm_emotion=norm_emotion, laugh=laugh, shock=shock,
-                          noblur=noblur, blur=blur,
-                          norm_illumination=norm_illumination, dim=dim, bright=bright, backlight=backlight, yinyang=yinyang,
-                          norm_yaw=norm_yaw, yaw_30=yaw_30, yaw_60=yaw_60,
-                          norm_roll=norm_roll, roll_20=roll_20, roll_45=roll_45,
-                          norm_pitch=norm_pitch, pitch_20up=pitch_20up, pitch_45up=pitch_45up, pitch_20down=pitch_20down, pitch_45down=pitch_45down)
+        for label, points, line_color, fill_color, attributes in shapes:
+            shape = Shape(label=label, attributes=attributes)
             for x, y in points:
                 shape.addPoint(QPointF(x, y))
             shape.close()
@@ -1137,11 +1236,56 @@ class MainWindow(QMainWindow, WindowMixin):
         self.canvas.loadShapes(s)
 
     def saveLabels(self, annotationFilePath):
+        """
+            Queue a snapshot of the shapes to be written to annotationFilePath.
+            The outcome arrives in annotationSaved / annotationSaveFailed.
+        """
         annotationFilePath = ustr(annotationFilePath)
         if self.labelFile is None:
             self.labelFile = LabelFile()
             self.labelFile.verified = self.canvas.verified
+        # The writer sees this copy, not later toggles of the verified flag
+        labelFile = copy.copy(self.labelFile)
 
+        shapes = self.shapeSnapshot()
+        # Changes that skip setDirty, like the verified flag, get journaled too
+        self.recordEdits()
+        journaled = self.journal.current.xmlPath if self.journal.current is not None else None
+        # Can add differrent annotation formats here
+        if self.usingPascalVocFormat is True:
+            fingerprint = (os.path.abspath(annotationFilePath),
+                           LabelFile.fingerprint(shapes, labelFile.verified))
+            if self.annotationFingerprint == fingerprint and (
+                    self.saveQueue.isPending(annotationFilePath) or os.path.isfile(annotationFilePath)):
+                # Same content as on disk (or queued): keep the file and its mtime
+                if journaled is None:
+                    return True
+                saves = self.journalSaves[annotationFilePath]
+                if saves:
+                    # The queued save writes the current edits too
+                    saves[-1] = (journaled, self.journal.seq)
+                else:
+                    self.journal.commit(journaled, self.journal.seq)
+                return True
+            self.annotationFingerprint = fingerprint
+            print ('Img: ' + self.filePath + ' -> Its xml: ' + annotationFilePath)
+            job = partial(labelFile.savePascalVocFormat, annotationFilePath, shapes, self.filePath,
+                          self.imageData, self.lineColor.getRgb(), self.fillColor.getRgb())
+        else:
+            print ('self.labelFile.save')
+            job = partial(labelFile.save, annotationFilePath, shapes, self.filePath, self.imageData,
+                          self.lineColor.getRgb(), self.fillColor.getRgb())
+        replaced = self.saveQueue.submit(annotationFilePath, self.filePath, job)
+        if journaled is not None:
+            saves = self.journalSaves[annotationFilePath]
+            if replaced and saves:
+                # The waiting job was dropped for this one
+                saves.pop()
+            saves.append((journaled, self.journal.seq))
+        return True
+
+    def shapeSnapshot(self):
+        """The canvas shapes as plain data for LabelFile."""
         def format_shape(s):
             return dict(label=s.label,
                         line_color=s.line_color.getRgb()
@@ -1149,37 +1293,43 @@ class MainWindow(QMainWindow, WindowMixin):
                         fill_color=s.fill_color.getRgb()
                         if s.fill_color != self.fillColor else None,
                         points=[(p.x(), p.y()) for p in s.points],
-                       # add chris
-                        isfemale = s.isfemale, ismale = s.ismale,
-                        young = s.young, middle = s.middle, old = s.old, children = s.children,
-                        nomask = s.nomask, mask = s.mask,
-                        closemouth = s.closemouth, openmouth = s.openmouth, uncertainmouth = s.uncertainmouth,
-                        noeyeglass = s.noeyeglass, eyeglass = s.eyeglass,
-                        nosunglass = s.nosunglass, sunglass = s.sunglass,
-                        openeye = s.openeye, closeeye = s.closeeye, uncertaineye = s.uncertaineye,
-                        norm_emotion=s.norm_emotion, laugh=s.laugh, shock=s.shock,
-                        noblur=s.noblur, blur=s.blur,
-                        norm_illumination=s.norm_illumination, dim=s.dim, bright=s.bright, backlight=s.backlight, yinyang=s.yinyang,
-                        norm_yaw=s.norm_yaw, yaw_30=s.yaw_30, yaw_60=s.yaw_60,
-                        norm_roll=s.norm_roll, roll_20=s.roll_20, roll_45=s.roll_45,
-                        norm_pitch=s.norm_pitch, pitch_20up=s.pitch_20up, pitch_45up=s.pitch_45up, pitch_20down=s.pitch_20down, pitch_45down=s.pitch_45down)
-
-        shapes = [format_shape(shape) for shape in self.canvas.shapes]
-        # Can add differrent annotation formats here
-        try:
-            if self.usingPascalVocFormat is True:
-                print ('Img: ' + self.filePath + ' -> Its xml: ' + annotationFilePath)
-                self.labelFile.savePascalVocFormat(annotationFilePath, shapes, self.filePath, self.imageData,
-                                                   self.lineColor.getRgb(), self.fillColor.getRgb())
-            else:
-                print ('self.labelFile.save')
-                self.labelFile.save(annotationFilePath, shapes, self.filePath, self.imageData,
-                                    self.lineColor.getRgb(), self.fillColor.getRgb())
-            return True
-        except LabelFileError as e:
-            self.errorMessage(u'Error saving label data',
-                              u'<b>%s</b>' % e)
-            return False
+                        attributes=list(s.attributes))
+
+        return [format_shape(shape) for shape in self.canvas.shapes]
+
+    # Real slots rather than PyQt proxies, so closeEvent can deliver the
+    # queued results to this window with sendPostedEvents
+    @pyqtSlot(str, str)
+    def annotationSaved(self, annotationFilePath, imagePath):
+        if self.recoveryWritten(annotationFilePath, True):
+            self.updateCatalog(imagePath, annotationFilePath)
+            return
+        saves = self.journalSaves.get(annotationFilePath)
+        if saves:
+            self.journal.commit(*saves.popleft())
+        self.updateCatalog(imagePath, annotationFilePath)
+        self.statusBar().showMessage('Saved to  %s' % annotationFilePath)
+        self.statusBar().show()
+
+    @pyqtSlot(str, str, str)
+    def annotationSaveFailed(self, annotationFilePath, imagePath, message):
+        if self.recoveryWritten(annotationFilePath, False):
+            self.errorMessage(u'Error recovering unsaved edits',
+                              u'<b>%s</b><p>%s' % (message, annotationFilePath))
+            return
+        saves = self.journalSaves.get(annotationFilePath)
+        if saves:
+            # Its edits stay in the journal
+            saves.popleft()
+        if imagePath == self.filePath:
+            self.setDirty()
+        if self.annotationFingerprint is not None and \
+           self.annotationFingerprint[0] == os.path.abspath(annotationFilePath):
+            # Nothing trustworthy is known about the file now
+            self.annotationFingerprint = None
+        self.status('Error saving %s' % annotationFilePath)
+        self.errorMessage(u'Error saving label data',
+                          u'<b>%s</b><p>%s' % (message, annotationFilePath))
 
     def copySelectedShape(self):
         self.addLabel(self.canvas.copySelectedShape())
@@ -1440,7 +1590,7 @@ class MainWindow(QMainWindow, WindowMixin):
         age = item.text()
         if age != shape.age:
             shape.age = item.text()
-            self.setDirty()
+            self.setDirty([shape])
         else:  # User probably changed item visibility
             self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
 
@@ -1468,13 +1618,14 @@ class MainWindow(QMainWindow, WindowMixin):
         text = 'face'
 
         self.prevLabelText = text
-        self.addLabel(self.canvas.setLastLabel(text))
+        shape = self.canvas.setLastLabel(text)
+        self.addLabel(shape)
         if self.beginner():  # Switch to edit mode.
             self.canvas.setEditing(True)
             self.actions.create.setEnabled(True)
         else:
             self.actions.editMode.setEnabled(True)
-        self.setDirty()
+        self.setDirty([shape])
 
     def scrollRequest(self, delta, orientation):
         units = - delta / (8 * 15)
@@ -1568,12 +1719,12 @@ class MainWindow(QMainWindow, WindowMixin):
             filePath = self.settings.get(SETTING_FILENAME)
 
         unicodeFilePath = ustr(filePath)
+        fullSize = None
         # Tzutalin 20160906 : Add file list and dock to move faster
         # Highlight the file item
-        if unicodeFilePath and self.fileListWidget.count() > 0:
-            index = self.mImgList.index(unicodeFilePath)
-            fileWidgetItem = self.fileListWidget.item(index)
-            fileWidgetItem.setSelected(True)
+        if unicodeFilePath in self.mImgList:
+            index = self.fileListModel.index(self.mImgList.index(unicodeFilePath))
+            self.fileListView.setCurrentIndex(index)
 
         if unicodeFilePath and os.path.exists(unicodeFilePath):
             if LabelFile.isLabelFile(unicodeFilePath):
@@ -1589,12 +1740,23 @@ class MainWindow(QMainWindow, WindowMixin):
                 self.imageData = self.labelFile.imageData
                 self.lineColor = QColor(*self.labelFile.lineColor)
                 self.fillColor = QColor(*self.labelFile.fillColor)
+                image = paintableImage(QImage.fromData(self.imageData))
             else:
-                # Load image:
-                # read data first and store for saving into label file.
-                self.imageData = read(unicodeFilePath, None)
+                # Load image: take it from the prefetch cache when the
+                # background decoder got there first. Pascal VOC saving
+                # does not need the raw bytes, so they are never read
+                # whole, and the Canvas draws this same QImage.
                 self.labelFile = None
-            image = QImage.fromData(self.imageData)
+                image = self.prefetcher.get(unicodeFilePath)
+                if image is None and (self.proxyLoading.isChecked() or
+                                      tiledImageSize(unicodeFilePath) is not None):
+                    # Fit-to-window shows a fraction of the pixels anyway:
+                    # decode about that many now, the full size after.
+                    # Images the canvas can tile are never decoded whole.
+                    image, fullSize = decodeProxy(unicodeFilePath, self.viewportSize())
+                elif image is None:
+                    image = decodeImage(unicodeFilePath)
+                    self.prefetcher.put(unicodeFilePath, image)
             if image.isNull():
                 self.errorMessage(u'Error opening file',
                                   u"<p>Make sure <i>%s</i> is a valid image file." % unicodeFilePath)
@@ -1603,7 +1765,7 @@ class MainWindow(QMainWindow, WindowMixin):
             self.status("Loaded %s" % os.path.basename(unicodeFilePath))
             self.image = image
             self.filePath = unicodeFilePath
-            self.canvas.loadPixmap(QPixmap.fromImage(image))
+            self.canvas.loadPixmap(image, size=fullSize, path=unicodeFilePath)
             if self.labelFile:
                 self.loadLabels(self.labelFile.shapes)
             self.setClean()
@@ -1612,6 +1774,13 @@ class MainWindow(QMainWindow, WindowMixin):
             self.paintCanvas()
             self.addRecentFile(self.filePath)
             self.toggleActions(True)
+            # The current image comes first in the prefetch window, which
+            # also brings in the full size of a proxy
+            if unicodeFilePath in self.mImgList:
+                self.prefetcher.prefetch(self.mImgList, self.mImgList.index(unicodeFilePath))
+            elif self.canvas.isProxy() and not self.canvas.isTiled():
+                self.prefetcher.request(unicodeFilePath)
+            self.scheduleProposals()
 
             # Label xml file and show bound box according to its filename
             if self.usingPascalVocFormat is True:
@@ -1625,6 +1794,16 @@ class MainWindow(QMainWindow, WindowMixin):
                     if os.path.isfile(xmlPath):
                         self.loadPascalXMLByFilename(xmlPath)
 
+            if self.preAnnotator is not None and not self.canvas.shapes and not self.isAnnotated(unicodeFilePath):
+                self.showProposals(self.preAnnotator.proposals(unicodeFilePath))
+
+            # Edits from here on are journaled against what was loaded
+            self.journal.open(unicodeFilePath, self.defaultAnnotationPath(unicodeFilePath),
+                              self.canvas.shapes, self.canvas.verified)
+            self.checkJournal()
+            self.pendingPropagation = None
+            self.schedulePropagation()
+
             self.setWindowTitle(__appname__ + ' ' + filePath)
 
             # Default : select last item if there is at least one item
@@ -1645,9 +1824,126 @@ class MainWindow(QMainWindow, WindowMixin):
     def paintCanvas(self):
         assert not self.image.isNull(), "cannot paint null image"
         self.canvas.scale = 0.01 * self.zoomWidget.value()
+        if self.canvas.isProxy() and not self.canvas.isTiled() \
+           and self.canvas.scale * self.canvas.proxyFactor() > 1.01:
+            # Zoomed past the proxy's resolution before the full size arrived
+            self.fullImageDecoded(self.filePath, decodeImage(self.filePath))
         self.canvas.adjustSize()
         self.canvas.update()
 
+    def viewportSize(self):
+        """Device pixels of the area images are fitted to."""
+        ratio = self.devicePixelRatioF() if hasattr(self, 'devicePixelRatioF') else 1.0
+        return self.centralWidget().size() * ratio
+
+    def toggleAutoAnnotate(self, enabled):
+        if not enabled:
+            if self.preAnnotator is not None:
+                self.preAnnotator.shutdown()
+                self.preAnnotator.deleteLater()
+                self.preAnnotator = None
+            return
+        if self.preAnnotator is not None:
+            return
+        if not detectorAvailable(self.faceDetector):
+            self.status(u'Face detector "%s" is not available, is OpenCV installed?' % self.faceDetector)
+            self.autoAnnotate.setChecked(False)
+            return
+        self.preAnnotator = PreAnnotator(getDetector(self.faceDetector), parent=self)
+        self.preAnnotator.proposed.connect(self.facesProposed)
+        self.scheduleProposals()
+
+    def scheduleProposals(self):
+        """Detect faces on the current image and the ones after it, if not annotated yet."""
+        if self.preAnnotator is None or self.filePath is None:
+            return
+        if self.filePath in self.mImgList:
+            self.preAnnotator.schedule(self.mImgList, self.mImgList.index(self.filePath), self.isAnnotated)
+        else:
+            self.preAnnotator.schedule([self.filePath], 0, self.isAnnotated)
+
+    def isAnnotated(self, imagePath):
+        return os.path.isfile(self.defaultAnnotationPath(imagePath))
+
+    def showProposals(self, boxes):
+        """Put detected faces on the empty canvas as unverified shapes."""
+        if not boxes:
+            return
+        label = self.labelHist[0] if self.labelHist else u'face'
+        self.loadLabels([(label, [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)], None, None, None)
+                         for xmin, ymin, xmax, ymax, _ in boxes])
+        self.status(u'%d faces proposed, check them before saving' % len(boxes))
+
+    @pyqtSlot(str, object)
+    def facesProposed(self, path, boxes):
+        """Show proposals that arrive after their image was opened, if it is still untouched."""
+        path = ustr(path)
+        if path != self.filePath or not boxes or self.dirty or self.canvas.shapes \
+           or self.canvas.current is not None or self.isAnnotated(path):
+            return
+        self.showProposals(boxes)
+        # Journal against the proposals, as loadFile() would have
+        self.journal.open(path, self.defaultAnnotationPath(path), self.canvas.shapes, self.canvas.verified)
+
+    def propagationFaces(self):
+        """The faces on the canvas as [(label, box, attributes)] for FramePropagator."""
+        return [(shape.label, LabelFile.convertPoints2BndBox([(p.x(), p.y()) for p in shape.points]),
+                 list(shape.attributes)) for shape in self.canvas.shapes]
+
+    def schedulePropagation(self):
+        """Track the faces of the current frame into the next one, if it is not annotated."""
+        if not self.propagateFrames.isChecked() or self.filePath is None or not self.canvas.shapes:
+            return
+        nextPath = self.mImgList.nextPath(self.filePath)
+        if nextPath and not self.isAnnotated(nextPath):
+            self.propagator.prepare(self.filePath, nextPath, self.propagationFaces())
+
+    def propagateFrom(self, previousPath, faces):
+        """
+            Put faces of the frame previousPath on the current frame, moved to
+            where the tracker finds them, if it has no annotation yet. Proposed
+            faces on the canvas give way to them, lending their boxes. If the
+            tracker is not done yet, this happens when it is, unless the
+            annotator has moved on or edited the frame by then.
+        """
+        self.pendingPropagation = None
+        if not self.propagateFrames.isChecked() or not faces or self.filePath is None \
+           or self.dirty or self.isAnnotated(self.filePath):
+            return
+        proposals = self.propagationFaces()
+        propagated = self.propagator.propagate(previousPath, self.filePath, faces,
+                                               [box for _, box, _ in proposals])
+        if propagated is None:
+            self.pendingPropagation = (previousPath, self.filePath, faces)
+            return
+        if not propagated:
+            return
+        for shape in list(self.canvas.shapes):
+            self.dropShape(shape)
+        self.loadLabels([(label, [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)], None, None, attributes)
+                         for label, (xmin, ymin, xmax, ymax), attributes in propagated])
+        # Unsaved like any edit, and undone in one step
+        self.setDirty()
+        self.status(u'%d faces carried over from %s' % (len(propagated), os.path.basename(previousPath)))
+
+    def propagationTracked(self, previousPath, currentPath):
+        pending = self.pendingPropagation
+        if pending is None or pending[:2] != (previousPath, currentPath) or currentPath != self.filePath:
+            return
+        self.pendingPropagation = None
+        # Not while a box is being drawn
+        if self.canvas.current is None:
+            self.propagateFrom(previousPath, pending[2])
+
+    def fullImageDecoded(self, path, image):
+        """Replace the proxy on the canvas once its full size is decoded."""
+        if path != self.filePath or image.isNull() or not self.canvas.isProxy() \
+           or self.canvas.isTiled() or image.size() != self.canvas.imageSize:
+            return
+        self.image = image
+        self.prefetcher.put(path, image)
+        self.canvas.replacePixmap(image)
+
     def adjustScale(self, initial=False):
         value = self.scalers[self.FIT_WINDOW if initial else self.zoomMode]()
         self.zoomWidget.setValue(int(100 * value))
@@ -1659,19 +1955,24 @@ class MainWindow(QMainWindow, WindowMixin):
         h1 = self.centralWidget().height() - e
         a1 = w1 / h1
         # Calculate a new scale value based on the pixmap's aspect ratio.
-        w2 = self.canvas.pixmap.width() - 0.0
-        h2 = self.canvas.pixmap.height() - 0.0
+        w2 = self.canvas.imageSize.width() - 0.0
+        h2 = self.canvas.imageSize.height() - 0.0
         a2 = w2 / h2
         return w1 / w2 if a2 >= a1 else h1 / h2
 
     def scaleFitWidth(self):
         # The epsilon does not seem to work too well here.
         w = self.centralWidget().width() - 2.0
-        return w / self.canvas.pixmap.width()
+        return w / self.canvas.imageSize.width()
 
     def closeEvent(self, event):
+        # Finish queued saves; a failure marks the window dirty again
+        # before mayContinue() asks about unsaved changes
+        self.saveQueue.flush()
+        QCoreApplication.sendPostedEvents(self, QEvent.MetaCall)
         if not self.mayContinue():
             event.ignore()
+            return
         settings = self.settings
         # If it loads images from dir, don't load it at the begining
         if self.dirname is None:
@@ -1686,6 +1987,11 @@ class MainWindow(QMainWindow, WindowMixin):
         settings[SETTING_FILL_COLOR] = self.fillColor
         settings[SETTING_RECENT_FILES] = self.recentFiles
         settings[SETTING_ADVANCE_MODE] = not self._beginner
+        settings[SETTING_PREFETCH_CACHE_MB] = self.prefetcher.cacheBytes // (1024 * 1024)
+        settings[SETTING_PROXY_LOADING] = self.proxyLoading.isChecked()
+        settings[SETTING_AUTO_ANNOTATE] = self.autoAnnotate.isChecked()
+        settings[SETTING_FACE_DETECTOR] = self.faceDetector
+        settings[SETTING_PROPAGATE] = self.propagateFrames.isChecked()
         if self.defaultSaveDir is not None and len(self.defaultSaveDir) > 1:
             settings[SETTING_SAVE_DIR] = ustr(self.defaultSaveDir)
         else:
@@ -1697,6 +2003,124 @@ class MainWindow(QMainWindow, WindowMixin):
             settings[SETTING_LAST_OPEN_DIR] = ""
 
         settings.save()
+        self.cancelScan()
+        # Cancelled scans may still be listing their last directory
+        for scanner in self.findChildren(ImageScanner):
+            scanner.cancel()
+            scanner.wait()
+        for refresher in self.findChildren(CatalogRefresher):
+            refresher.wait()
+        if self.catalog is not None:
+            self.catalog.close()
+            self.catalog = None
+        # Let queued decodes finish as no-ops, and stop the tile workers,
+        # before the objects they report to are deleted
+        self.prefetcher.clear()
+        self.prefetcher.waitForDone()
+        if self.preAnnotator is not None:
+            self.preAnnotator.shutdown()
+        if self.propagator is not None:
+            self.propagator.clear()
+            self.propagator.waitForDone()
+        self.canvas.waitForPyramids()
+        self.saveQueue.stop()
+        self.journal.close()
+
+    def checkpointJournal(self):
+        """
+            Fold the journal periodically: into the XML when autosaving,
+            else into a snapshot of the unsaved edits.
+        """
+        if self.dirty and self.autoSaving.isChecked() and self.defaultSaveDir is not None:
+            self.saveFile()
+        self.journal.compact()
+        self.checkJournal()
+
+    def flushJournal(self):
+        self.journal.flush()
+        self.checkJournal()
+
+    def checkJournal(self):
+        """Tell once that edits stopped being journaled."""
+        if self.journal.error is not None and not self.journalWarned:
+            self.journalWarned = True
+            self.status(u'Edit journal unavailable, unsaved edits will not survive a crash: %s'
+                        % self.journal.error, delay=0)
+
+    def recoverJournals(self):
+        """
+            Offer to write the edits that crashed sessions never saved to their
+            XML files, through the save queue. Edits of an XML that something
+            else wrote since are left out, and stay in their journal.
+        """
+        writes = OrderedDict()
+        sessions = []
+        for journalPath, annotations in recoverSessions(self.journal.directory):
+            # Edits of images deleted since are dropped
+            annotations = [a for a in annotations if os.path.isfile(a.imagePath)]
+            kept = [a for a in annotations if a.xmlChanged()]
+            for annotation in annotations:
+                if annotation not in kept:
+                    # Sessions come oldest first: a later one's edits win
+                    writes[annotation.xmlPath] = (journalPath, annotation)
+            sessions.append((journalPath, kept))
+        skipped = sum(len(kept) for _, kept in sessions)
+        if writes:
+            msg = u'A session that ended unexpectedly left unsaved edits of %d images.\n' \
+                  u'Write them to their annotation files?' % len(writes)
+            if skipped:
+                msg += u'\n\nEdits of %d more images are left out, as their annotation files ' \
+                       u'changed since. They stay in %s.' % (skipped, self.journal.directory)
+            answer = QMessageBox.question(self, u'Recover unsaved edits', msg,
+                                          QMessageBox.Yes | QMessageBox.Discard | QMessageBox.Cancel,
+                                          QMessageBox.Yes)
+            if answer == QMessageBox.Cancel:
+                # Asked again on the next start
+                return
+            if answer != QMessageBox.Yes:
+                writes.clear()
+        elif skipped:
+            self.status(u'Unsaved edits of %d images left in %s: their annotation files changed since'
+                        % (skipped, self.journal.directory), delay=0)
+        for xmlPath, (journalPath, annotation) in writes.items():
+            labelFile = LabelFile()
+            labelFile.verified = annotation.verified
+            shapes = [dict(label=label, points=[tuple(point) for point in points], attributes=attributes)
+                      for label, points, attributes in annotation.faces()]
+            self.recoveries[xmlPath] = (journalPath, annotation)
+            self.saveQueue.submit(xmlPath, annotation.imagePath,
+                                  partial(labelFile.savePascalVocFormat, xmlPath, shapes,
+                                          annotation.imagePath, None))
+        for journalPath, kept in sessions:
+            self.recoveryKept[journalPath].extend(kept)
+            self.settleJournal(journalPath)
+        if writes:
+            self.status(u'Recovering unsaved edits of %d images' % len(writes))
+            # The image on screen may have been loaded while the question was up
+            if self.filePath and not self.dirty and self.defaultAnnotationPath(self.filePath) in writes:
+                self.loadFile(self.filePath)
+
+    def recoveryWritten(self, xmlPath, ok):
+        """A write of recoverJournals() is done; returns False if xmlPath was not one."""
+        journalPath, annotation = self.recoveries.pop(xmlPath, (None, None))
+        if journalPath is None:
+            return False
+        if not ok:
+            # Its edits stay in the journal
+            self.recoveryKept[journalPath].append(annotation)
+        self.settleJournal(journalPath)
+        return True
+
+    def settleJournal(self, journalPath):
+        """Cut a crashed session's journal down to what is kept, once nothing is being written."""
+        if any(path == journalPath for path, _ in self.recoveries.values()):
+            return
+        try:
+            rewriteSession(journalPath, self.recoveryKept.pop(journalPath, []))
+        except (IOError, OSError):
+            # Offered again on the next start
+            pass
+
     ## User Dialogs ##
 
     def loadRecent(self, filename):
@@ -1704,17 +2128,97 @@ class MainWindow(QMainWindow, WindowMixin):
             self.loadFile(filename)
 
     def scanAllImages(self, folderPath):
-        extensions = ['.jpeg', '.jpg', '.png', '.bmp']
-        images = []
-
-        for root, dirs, files in os.walk(folderPath):
-            for file in files:
-                if file.lower().endswith(tuple(extensions)):
-                    relativePath = os.path.join(root, file)
-                    path = ustr(os.path.abspath(relativePath))
-                    images.append(path)
-        images.sort(key=lambda x: x.lower())
-        return images
+        return [ustr(path) for path in iterImagePaths(folderPath)]
+
+    def importDirImages(self, dirpath):
+        """Scan dirpath in the background, filling the file list as images are found."""
+        self.cancelScan()
+        self.mImgList = ImageList()
+        self.fileListModel.setImageList(self.mImgList)
+        scanner = ImageScanner(dirpath, parent=self)
+        scanner.batchFound.connect(partial(self.imagesFound, scanner))
+        scanner.finished.connect(partial(self.scanFinished, scanner))
+        self.scanner = scanner
+        self.scanStatus.show()
+        self.status(u'Scanning %s ...' % dirpath, 0)
+        scanner.start()
+
+    def imagesFound(self, scanner, paths):
+        if scanner is not self.scanner:
+            # A batch queued before the scan was cancelled or replaced
+            return
+        first = len(self.mImgList) == 0
+        self.fileListModel.appendPaths([ustr(path) for path in paths])
+        self.status(u'Scanning %s: %d images found' % (scanner.folderPath, len(self.mImgList)), 0)
+        if first and self.filePath is None:
+            self.openNextImg()
+
+    def scanFinished(self, scanner):
+        scanner.deleteLater()
+        if scanner is not self.scanner:
+            return
+        self.scanner = None
+        self.scanStatus.hide()
+        self.status(u'Found %d images in %s' % (len(self.mImgList), scanner.folderPath))
+        self.openCatalog()
+
+    def cancelScan(self, _value=False):
+        if self.scanner is None:
+            return
+        self.scanner.cancel()
+        self.status(u'Stopped scanning %s: %d images found' % (self.scanner.folderPath, len(self.mImgList)))
+        self.scanner = None
+        self.scanStatus.hide()
+
+    def catalogPath(self):
+        directory = ustr(self.defaultSaveDir) if self.defaultSaveDir else self.dirname
+        return catalogFile(directory) if directory else None
+
+    def openCatalog(self, rebuild=False):
+        """Open the catalog of the current dataset and refresh it in the background."""
+        path = self.catalogPath()
+        if path is None or len(self.mImgList) == 0 or self.scanner is not None:
+            return
+        if self.catalog is None or self.catalog.path != path:
+            if self.catalog is not None:
+                self.catalog.close()
+            try:
+                self.catalog = AnnotationCatalog(path)
+            except (sqlite3.Error, OSError) as e:
+                self.catalog = None
+                self.status(u'Annotation catalog unavailable: %s' % e)
+                return
+        refresher = CatalogRefresher(path, self.mImgList, self.defaultSaveDir, rebuild, parent=self)
+        refresher.refreshed.connect(partial(self.catalogRefreshed, refresher))
+        refresher.failed.connect(partial(self.catalogFailed, refresher))
+        refresher.finished.connect(refresher.deleteLater)
+        self.catalogRefresher = refresher
+        refresher.start()
+
+    def catalogRefreshed(self, refresher, statuses):
+        if refresher is not self.catalogRefresher:
+            return
+        self.catalogRefresher = None
+        self.fileListModel.setStatuses(statuses)
+        counts = self.catalog.counts()
+        self.status(u'%d of %d images annotated, %d verified' %
+                    (counts.get(STATUS_ANNOTATED, 0) + counts.get(STATUS_VERIFIED, 0),
+                     len(self.mImgList), counts.get(STATUS_VERIFIED, 0)))
+
+    def catalogFailed(self, refresher, message):
+        if refresher is not self.catalogRefresher:
+            return
+        self.catalogRefresher = None
+        self.status(u'Annotation catalog unavailable: %s' % message)
+
+    def rebuildCatalog(self, _value=False):
+        self.openCatalog(rebuild=True)
+
+    def updateCatalog(self, imagePath, annotationFilePath):
+        if self.catalog is None or imagePath not in self.mImgList:
+            return
+        self.catalog.update(imagePath, annotationFilePath)
+        self.fileListModel.setStatus(imagePath, self.catalog.status(imagePath))
 
     def changeSavedir(self, _value=False):
         if self.defaultSaveDir is not None:
@@ -1732,6 +2236,7 @@ class MainWindow(QMainWindow, WindowMixin):
         self.statusBar().showMessage('%s . Annotation will be saved to %s' %
                                      ('Change saved folder', self.defaultSaveDir))
         self.statusBar().show()
+        self.openCatalog()
 
     def openAnnotation(self, _value=False):
         if self.filePath is None:
@@ -1768,12 +2273,8 @@ class MainWindow(QMainWindow, WindowMixin):
 
         self.dirname = dirpath
         self.filePath = None
-        self.fileListWidget.clear()
-        self.mImgList = self.scanAllImages(dirpath)
-        self.openNextImg()
-        for imgPath in self.mImgList:
-            item = QListWidgetItem(imgPath)
-            self.fileListWidget.addItem(item)
+        self.prefetcher.clear()
+        self.importDirImages(dirpath)
 
     def verifyImg(self, _value=False):
         # Proceding next image without dialog if having any label
@@ -1805,11 +2306,9 @@ class MainWindow(QMainWindow, WindowMixin):
         if self.filePath is None:
             return
 
-        currIndex = self.mImgList.index(self.filePath)
-        if currIndex - 1 >= 0:
-            filename = self.mImgList[currIndex - 1]
-            if filename:
-                self.loadFile(filename)
+        filename = self.mImgList.prevPath(self.filePath)
+        if filename:
+            self.loadFile(filename)
 
     def openNextImg(self, _value=False):
         # Proceding next image without dialog if having any label
@@ -1827,12 +2326,36 @@ class MainWindow(QMainWindow, WindowMixin):
         if self.filePath is None:
             filename = self.mImgList[0]
         else:
-            currIndex = self.mImgList.index(self.filePath)
-            if currIndex + 1 < len(self.mImgList):
-                filename = self.mImgList[currIndex + 1]
+            filename = self.mImgList.nextPath(self.filePath)
+
+        if filename:
+            previousPath, faces = self.filePath, self.propagationFaces()
+            if self.loadFile(filename) and previousPath is not None:
+                self.propagateFrom(previousPath, faces)
+
+    def openNextUnannotated(self, _value=False):
+        self.openNextWithStatus((STATUS_UNANNOTATED,))
+
+    def openNextUnverified(self, _value=False):
+        self.openNextWithStatus((STATUS_UNANNOTATED, STATUS_ANNOTATED))
+
+    def openNextWithStatus(self, statuses):
+        if self.autoSaving.isChecked() and self.defaultSaveDir is not None:
+            if self.dirty is True:
+                self.saveFile()
 
+        if not self.mayContinue():
+            return
+
+        if self.catalog is None:
+            self.status(u'Open a directory first')
+            return
+
+        filename = self.catalog.nextImage(self.filePath, statuses)
         if filename:
             self.loadFile(filename)
+        else:
+            self.status(u'No such image left')
 
     def openFile(self, _value=False):
         if not self.mayContinue():
@@ -1846,6 +2369,11 @@ class MainWindow(QMainWindow, WindowMixin):
                 filename = filename[0]
             self.loadFile(filename)
 
+    def defaultAnnotationPath(self, imagePath):
+        """Where saveFile() puts the XML of imagePath."""
+        saveDir = ustr(self.defaultSaveDir) if self.defaultSaveDir is not None else None
+        return annotationPath(imagePath, saveDir)
+
     def saveFile(self, _value=False):
         if self.defaultSaveDir is not None and len(ustr(self.defaultSaveDir)):
             if self.filePath:
@@ -1881,8 +2409,9 @@ class MainWindow(QMainWindow, WindowMixin):
 
     def _saveFile(self, annotationFilePath):
         if annotationFilePath and self.saveLabels(annotationFilePath):
+            # Marked dirty again if the write fails
             self.setClean()
-            self.statusBar().showMessage('Saved to  %s' % annotationFilePath)
+            self.statusBar().showMessage('Saving to  %s' % annotationFilePath)
             self.statusBar().show()
 
     def closeFile(self, _value=False):
@@ -1895,7 +2424,12 @@ class MainWindow(QMainWindow, WindowMixin):
         self.actions.saveAs.setEnabled(False)
 
     def mayContinue(self):
-        return not (self.dirty and not self.discardChangesDialog())
+        if not self.dirty:
+            return True
+        if self.discardChangesDialog():
+            self.journal.discard()
+            return True
+        return False
 
     def discardChangesDialog(self):
         yes, no = QMessageBox.Yes, QMessageBox.No
@@ -1917,7 +2451,8 @@ class MainWindow(QMainWindow, WindowMixin):
             # Change the color for all shape lines:
             Shape.line_color = self.lineColor
             self.canvas.update()
-            self.setDirty()
+            # Colors are not journaled
+            self.setDirty([])
 
     def chooseColor2(self):
         color = self.colorDialog.getColor(self.fillColor, u'Choose fill color',
@@ -1926,11 +2461,12 @@ class MainWindow(QMainWindow, WindowMixin):
             self.fillColor = color
             Shape.fill_color = self.fillColor
             self.canvas.update()
-            self.setDirty()
+            self.setDirty([])
 
     def deleteSelectedShape(self):
-        self.remLabel(self.canvas.deleteSelected())
-        self.setDirty()
+        shape = self.canvas.deleteSelected()
+        self.remLabel(shape)
+        self.setDirty([shape] if shape is not None else [])
         if self.noShapes():
             for action in self.actions.onShapesPresent:
                 action.setEnabled(False)
@@ -1941,7 +2477,7 @@ class MainWindow(QMainWindow, WindowMixin):
         if color:
             self.canvas.selectedShape.line_color = color
             self.canvas.update()
-            self.setDirty()
+            self.setDirty([])
 
     def chshapeFillColor(self):
         color = self.colorDialog.getColor(self.fillColor, u'Choose fill color',
@@ -1949,16 +2485,16 @@ class MainWindow(QMainWindow, WindowMixin):
         if color:
             self.canvas.selectedShape.fill_color = color
             self.canvas.update()
-            self.setDirty()
+            self.setDirty([])
 
     def copyShape(self):
         self.canvas.endMove(copy=True)
         self.addLabel(self.canvas.selectedShape)
-        self.setDirty()
+        self.setDirty([self.canvas.selectedShape])
 
     def moveShape(self):
         self.canvas.endMove(copy=False)
-        self.setDirty()
+        self.setDirty([self.canvas.selectedShape])
 
     def loadPredefinedClasses(self, predefClassesFile):
         if os.path.exists(predefClassesFile) is True:
@@ -1973,6 +2509,8 @@ class MainWindow(QMainWindow, WindowMixin):
     def loadPascalXMLByFilename(self, xmlPath):
         if self.filePath is None:
             return
+        # Coming back to an image whose save is still queued
+        self.saveQueue.flush(xmlPath)
         if os.path.isfile(xmlPath) is False:
             return
 
@@ -1980,6 +2518,8 @@ class MainWindow(QMainWindow, WindowMixin):
         shapes = tVocParseReader.getShapes()
         self.loadLabels(shapes)
         self.canvas.verified = tVocParseReader.verified
+        self.annotationFingerprint = (os.path.abspath(xmlPath),
+                                      LabelFile.fingerprint(self.shapeSnapshot(), tVocParseReader.verified))
 
 
     #button state:
@@ -1995,7 +2535,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if isfemale != shape.isfemale:
                 shape.isfemale = isfemale
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2012,7 +2552,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if ismale != shape.ismale:
                 shape.ismale = ismale
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2029,7 +2569,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if young != shape.young:
                 shape.young = young
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2046,7 +2586,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if middle != shape.middle:
                 shape.middle = middle
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2063,7 +2603,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if old != shape.old:
                 shape.old = old
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2080,7 +2620,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if children != shape.children:
                 shape.children = children
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2097,7 +2637,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if nomask != shape.nomask:
                 shape.nomask = nomask
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2114,7 +2654,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if mask != shape.mask:
                 shape.mask = mask
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
             if shape.mask:
@@ -2134,7 +2674,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if noeyeglass != shape.noeyeglass:
                 shape.noeyeglass = noeyeglass
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2151,7 +2691,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if eyeglass != shape.eyeglass:
                 shape.eyeglass = eyeglass
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2168,7 +2708,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if nosunglass != shape.nosunglass:
                 shape.nosunglass = nosunglass
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2185,7 +2725,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if sunglass != shape.sunglass:
                 shape.sunglass = sunglass
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
             if shape.sunglass:
@@ -2205,7 +2745,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if closemouth != shape.closemouth:
                 shape.closemouth = closemouth
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2222,7 +2762,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if openmouth != shape.openmouth:
                 shape.openmouth = openmouth
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2239,7 +2779,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if uncertainmouth != shape.uncertainmouth:
                 shape.uncertainmouth = uncertainmouth
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
             if shape.uncertainmouth:
@@ -2259,7 +2799,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if closeeye != shape.closeeye:
                 shape.closeeye = closeeye
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2276,7 +2816,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if openeye != shape.openeye:
                 shape.openeye = openeye
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2293,7 +2833,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if uncertaineye != shape.uncertaineye:
                 shape.uncertaineye = uncertaineye
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
             if shape.uncertaineye:
@@ -2313,7 +2853,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if noblur != shape.noblur:
                 shape.noblur = noblur
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2330,7 +2870,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if blur != shape.blur:
                 shape.blur = blur
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2347,7 +2887,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if norm_emotion != shape.norm_emotion:
                 shape.norm_emotion = norm_emotion
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2364,7 +2904,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if laugh != shape.laugh:
                 shape.laugh = laugh
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2381,7 +2921,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if shock != shape.shock:
                 shape.shock = shock
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2398,7 +2938,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if norm_illumination != shape.norm_illumination:
                 shape.norm_illumination = norm_illumination
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2415,7 +2955,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if dim != shape.dim:
                 shape.dim = dim
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2432,7 +2972,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if bright != shape.bright:
                 shape.bright = bright
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2449,7 +2989,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if backlight != shape.backlight:
                 shape.backlight = backlight
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2466,7 +3006,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if yinyang != shape.yinyang:
                 shape.yinyang = yinyang
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2483,7 +3023,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if norm_yaw != shape.norm_yaw:
                 shape.norm_yaw = norm_yaw
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2500,7 +3040,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if yaw_30 != shape.yaw_30:
                 shape.yaw_30 = yaw_30
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2517,7 +3057,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if yaw_60 != shape.yaw_60:
                 shape.yaw_60 = yaw_60
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2534,7 +3074,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if norm_roll != shape.norm_roll:
                 shape.norm_roll = norm_roll
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2551,7 +3091,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if roll_20 != shape.roll_20:
                 shape.roll_20 = roll_20
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2568,7 +3108,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if roll_45 != shape.roll_45:
                 shape.roll_45 = roll_45
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2585,7 +3125,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if norm_pitch != shape.norm_pitch:
                 shape.norm_pitch = norm_pitch
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2602,7 +3142,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if pitch_20up != shape.pitch_20up:
                 shape.pitch_20up = pitch_20up
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2619,7 +3159,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if pitch_45up != shape.pitch_45up:
                 shape.pitch_45up = pitch_45up
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2636,7 +3176,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if pitch_20down != shape.pitch_20down:
                 shape.pitch_20down = pitch_20down
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2653,7 +3193,7 @@ class MainWindow(QMainWindow, WindowMixin):
             shape = self.itemsToShapes[item]
             if pitch_45down != shape.pitch_45down:
                 shape.pitch_45down = pitch_45down
-                self.setDirty()
+                self.setDirty([shape])
             else:  # User probably changed item visibility
                 self.canvas.setShapeVisible(shape, item.checkState() == Qt.Checked)
         except:
@@ -2677,7 +3217,8 @@ def get_main_app(argv=[]):
     Standard boilerplate Qt application code.
     Do everything but app.exec_() -- so that we can test the application in one thread
     """
-    app = QApplication(argv)
+    # Qt allows one application per process, e.g. for tests that open several windows
+    app = QApplication.instance() or QApplication(argv)
     app.setApplicationName(__appname__)
     app.setWindowIcon(newIcon("app"))
     # Tzutalin 201705+: Accept extra agruments to change predefined class file
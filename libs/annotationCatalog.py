@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Per-dataset SQLite catalog of annotation status.
+
+One row per image records whether its XML exists, the XML's mtime and
+size, the verified flag, the box count and the image size, and every box
+is stored with one column per attribute of ATTRIBUTE_SCHEMA. Status
+questions ("next unverified image", file list colors) become indexed
+queries instead of re-reading every XML with PascalVocReader.
+"""
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+
+from libs.attributes import ATTRIBUTE_TAGS
+from libs.headless import annotationPath
+from libs.pascal_voc_io import PascalVocReader
+from libs.userDirectory import userDirectory
+from libs.workerPool import spawnPool
+
+
+STATUS_UNANNOTATED = 0
+STATUS_ANNOTATED = 1
+STATUS_VERIFIED = 2
+
+# Below this many changed XMLs, parsing in-process beats starting workers
+PARALLEL_THRESHOLD = 256
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    sort_key TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    xml_path TEXT,
+    xml_mtime REAL,
+    xml_size INTEGER,
+    verified INTEGER NOT NULL DEFAULT 0,
+    boxes INTEGER NOT NULL DEFAULT 0,
+    height INTEGER,
+    width INTEGER,
+    depth INTEGER
+);
+CREATE INDEX IF NOT EXISTS images_sort_key ON images (sort_key);
+CREATE TABLE IF NOT EXISTS faces (
+    path TEXT NOT NULL,
+    box INTEGER NOT NULL,
+    label TEXT,
+    xmin INTEGER, ymin INTEGER, xmax INTEGER, ymax INTEGER,
+    %s
+);
+CREATE INDEX IF NOT EXISTS faces_path ON faces (path);
+''' % ',\n    '.join('%s INTEGER' % tag for tag in ATTRIBUTE_TAGS)
+
+_INSERT_FACE = 'INSERT INTO faces VALUES (%s)' % ', '.join('?' * (7 + len(ATTRIBUTE_TAGS)))
+
+
+def cacheDirectory():
+    """The per-user directory catalogs are kept in, so datasets stay untouched."""
+    return userDirectory('catalogs')
+
+
+def catalogFile(directory, cacheDir=None):
+    """The catalog file of the dataset at directory, named after a hash of its path."""
+    key = hashlib.sha1(os.path.abspath(directory).encode('utf-8')).hexdigest()
+    return os.path.join(cacheDir or cacheDirectory(), key + '.sqlite')
+
+
+def readAnnotation(xmlPath):
+    """
+        Return (verified, imageSize, faces) of an XML, where each face is
+        (label, xmin, ymin, xmax, ymax, codes). Runs in worker processes.
+    """
+    reader = PascalVocReader(xmlPath)
+    faces = []
+    for label, points, _, _, codes in reader.getShapes():
+        (xmin, ymin), _, (xmax, ymax), _ = points
+        faces.append((label, xmin, ymin, xmax, ymax, list(codes)))
+    return reader.verified, reader.imageSize, faces
+
+
+def parseAnnotations(xmlPaths, workers=None):
+    """readAnnotation() over xmlPaths, on a process pool for large batches."""
+    if workers is None:
+        workers = multiprocessing.cpu_count() if len(xmlPaths) >= PARALLEL_THRESHOLD else 0
+    if workers <= 1 or len(xmlPaths) < 2:
+        return [readAnnotation(path) for path in xmlPaths]
+    # XML parsing holds the GIL, so threads would not help. The caller
+    # may be the GUI: see spawnPool()
+    chunksize = max(1, len(xmlPaths) // (workers * 4))
+    with spawnPool(workers) as pool:
+        return list(pool.map(readAnnotation, xmlPaths, chunksize=chunksize))
+
+
+class AnnotationCatalog(object):
+    """
+    SQLite catalog stored at `path`. Each thread needs its own instance.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.dirname(path):
+            # OSError if the cache directory cannot be created
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        # Let a background refresh write while the GUI reads
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.executescript(_SCHEMA)
+
+    @classmethod
+    def forDirectory(cls, directory, cacheDir=None):
+        return cls(catalogFile(directory, cacheDir))
+
+    def close(self):
+        self.db.close()
+
+    def update(self, imagePath, xmlPath):
+        """Re-catalog imagePath after its XML was saved (or removed)."""
+        with self.db:
+            self._write(imagePath, xmlPath, self._stat(xmlPath))
+
+    def refresh(self, imagePaths, saveDir=None, workers=None, prune=True):
+        """
+            Bring the catalog in line with imagePaths, re-reading only the XMLs
+            whose mtime or size changed. With prune, rows of images no longer
+            listed are dropped. Returns the number of XMLs parsed.
+        """
+        imagePaths = list(imagePaths)
+        known = dict((path, (mtime, size)) for path, mtime, size in
+                     self.db.execute('SELECT path, xml_mtime, xml_size FROM images'))
+        stale = []
+        for imagePath in imagePaths:
+            xmlPath = annotationPath(imagePath, saveDir)
+            stat = self._stat(xmlPath)
+            key = (stat.st_mtime, stat.st_size) if stat is not None else (None, None)
+            if known.get(imagePath) != key:
+                stale.append((imagePath, xmlPath, stat))
+        parsed = parseAnnotations([xmlPath for _, xmlPath, stat in stale if stat is not None], workers)
+        parsedCount = len(parsed)
+        parsed.reverse()
+        with self.db:
+            for imagePath, xmlPath, stat in stale:
+                self._write(imagePath, xmlPath, stat, parsed.pop() if stat is not None else None)
+            if prune:
+                listed = set(imagePaths)
+                gone = [(path,) for path in known if path not in listed]
+                self.db.executemany('DELETE FROM images WHERE path = ?', gone)
+                self.db.executemany('DELETE FROM faces WHERE path = ?', gone)
+        return parsedCount
+
+    def rebuild(self, imagePaths, saveDir=None, workers=None):
+        """Forget everything and re-read every XML."""
+        with self.db:
+            self.db.execute('DELETE FROM images')
+            self.db.execute('DELETE FROM faces')
+        return self.refresh(imagePaths, saveDir, workers)
+
+    def status(self, imagePath):
+        row = self.db.execute('SELECT status FROM images WHERE path = ?', (imagePath,)).fetchone()
+        return row[0] if row is not None else STATUS_UNANNOTATED
+
+    def statuses(self):
+        """Return {image path: status} for the whole catalog."""
+        return dict(self.db.execute('SELECT path, status FROM images'))
+
+    def info(self, imagePath):
+        """Return the catalog row of imagePath as a dict, or None."""
+        cursor = self.db.execute('SELECT * FROM images WHERE path = ?', (imagePath,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip((column[0] for column in cursor.description), row))
+
+    def faces(self, imagePath):
+        """Return [(label, xmin, ymin, xmax, ymax, codes)] of imagePath in box order."""
+        rows = self.db.execute('SELECT * FROM faces WHERE path = ? ORDER BY box', (imagePath,))
+        return [(row[2], row[3], row[4], row[5], row[6], list(row[7:])) for row in rows]
+
+    def nextImage(self, imagePath, statuses):
+        """
+            Return the first image after imagePath, in file list order, whose
+            status is one of statuses, wrapping around. None if there is none.
+        """
+        marks = ', '.join('?' * len(statuses))
+        query = ('SELECT path FROM images WHERE status IN (%s) AND sort_key %s ? '
+                 'ORDER BY sort_key LIMIT 1') % (marks, '%s')
+        key = (imagePath or '').lower()
+        for comparison in ('>', '<='):
+            row = self.db.execute(query % comparison, tuple(statuses) + (key,)).fetchone()
+            if row is not None and row[0] != imagePath:
+                return row[0]
+        return None
+
+    def counts(self):
+        """Return {status: number of images}."""
+        return dict(self.db.execute('SELECT status, COUNT(*) FROM images GROUP BY status'))
+
+    @staticmethod
+    def _stat(path):
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
+
+    def _write(self, imagePath, xmlPath, stat, annotation=None):
+        self.db.execute('DELETE FROM faces WHERE path = ?', (imagePath,))
+        if stat is None:
+            self.db.execute('INSERT OR REPLACE INTO images (path, sort_key, status) VALUES (?, ?, ?)',
+                            (imagePath, imagePath.lower(), STATUS_UNANNOTATED))
+            return
+        if annotation is None:
+            annotation = readAnnotation(xmlPath)
+        verified, imageSize, faces = annotation
+        height, width, depth = imageSize or (None, None, None)
+        self.db.execute('INSERT OR REPLACE INTO images VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        (imagePath, imagePath.lower(),
+                         STATUS_VERIFIED if verified else STATUS_ANNOTATED,
+                         xmlPath, stat.st_mtime, stat.st_size, int(verified), len(faces),
+                         height, width, depth))
+        self.db.executemany(_INSERT_FACE, [(imagePath, box, label, xmin, ymin, xmax, ymax) + tuple(codes)
+                                           for box, (label, xmin, ymin, xmax, ymax, codes) in enumerate(faces)])
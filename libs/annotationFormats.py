@@ -0,0 +1,400 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Registry of annotation file formats for bulk conversion without Qt.
+
+Every format reads and writes headless Annotations as streams: read()
+yields them one at a time and writer() takes them one at a time. Formats
+with one file per image (perImage) also convert single files, which is
+what lets convert() spread the work over a process pool.
+
+    python -m libs.annotationFormats wider wider_face_train_bbx_gt.txt voc labels/ \\
+        --image-root WIDER_train/images
+"""
+import argparse
+import io
+import multiprocessing
+import os
+import sys
+from collections import deque
+
+from libs.annotationCatalog import PARALLEL_THRESHOLD
+from libs.attributes import ATTRIBUTE_COUNT, ATTRIBUTE_TAGS, defaultAttributes, normalizeAttributes
+from libs.headless import Annotation, annotationPath, findAnnotations, loadAnnotation, saveAnnotation
+from libs.imageProbe import imageShape
+from libs.pascal_voc_io import XML_EXT
+from libs.workerPool import spawnPool
+
+# Annotations per pool task
+CHUNK_SIZE = 256
+# Chunks handed to the pool ahead of the results read back, per worker
+PREFETCH = 2
+IMAGE_EXTS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+FORMATS = {}
+
+_TAG_INDEX = dict((tag, index) for index, tag in enumerate(ATTRIBUTE_TAGS))
+
+
+def registerFormat(formatClass):
+    """Class decorator adding an AnnotationFormat subclass to FORMATS under its name."""
+    FORMATS[formatClass.name] = formatClass
+    return formatClass
+
+
+def getFormat(name, **options):
+    """An instance of the format registered as name; ValueError if there is none."""
+    try:
+        formatClass = FORMATS[name]
+    except KeyError:
+        raise ValueError('Unknown annotation format %r, expected one of %s' % (name, ', '.join(sorted(FORMATS))))
+    return formatClass(**options)
+
+
+class AnnotationFormat(object):
+    """
+    Base of the formats. A perImage format implements files(), readFile()
+    and writeFile(); the others read() a source file and write() through
+    writer(). Instances are pickled to the workers of convert().
+    """
+    name = None
+    perImage = True
+    suffix = None
+
+    def files(self, directory):
+        """The annotation files under directory, in name order."""
+        return findAnnotations(directory, isAnnotation=self.isAnnotationFile)
+
+    def isAnnotationFile(self, name):
+        return name.lower().endswith(self.suffix)
+
+    def readFile(self, path):
+        raise NotImplementedError
+
+    def prepare(self, directory):
+        """Set up directory to receive writeFile() calls, in the parent process."""
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def writeFile(self, annotation, directory):
+        raise NotImplementedError
+
+    def read(self, source):
+        """Yield the Annotations of source, a directory for perImage formats."""
+        for path in self.files(source):
+            yield self.readFile(path)
+
+    def writer(self, target):
+        """A context manager whose write(annotation) adds to target."""
+        self.prepare(target)
+        return _DirectoryWriter(self, target)
+
+
+class _DirectoryWriter(object):
+
+    def __init__(self, annotationFormat, directory):
+        self.format = annotationFormat
+        self.directory = directory
+
+    def write(self, annotation):
+        return self.format.writeFile(annotation, self.directory)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+@registerFormat
+class PascalVocFormat(AnnotationFormat):
+    """The XMLs MainWindow saves, one per image."""
+    name = 'voc'
+    suffix = XML_EXT
+
+    def readFile(self, path):
+        return loadAnnotation(path)
+
+    def writeFile(self, annotation, directory):
+        return saveAnnotation(annotation, annotationPath(annotation.imagePath, directory))
+
+
+@registerFormat
+class YoloFormat(AnnotationFormat):
+    """
+    One .txt per image with a "class cx cy w h" line per face, box
+    normalized to the image size, followed by the ATTRIBUTE_TAGS codes.
+    Class names come from classes.txt in the same directory, or from
+    classes when there is none. Images are looked up next to the .txt
+    file, or in imageRoot.
+    """
+    name = 'yolo'
+    suffix = '.txt'
+    CLASSES_FILE = 'classes.txt'
+
+    def __init__(self, classes=('face',), imageRoot=None):
+        self.classes = list(classes)
+        self.imageRoot = imageRoot
+        self._classes = {}
+
+    def isAnnotationFile(self, name):
+        return name.lower().endswith(self.suffix) and name != self.CLASSES_FILE
+
+    def classesFor(self, directory):
+        classes = self._classes.get(directory)
+        if classes is None:
+            path = os.path.join(directory, self.CLASSES_FILE)
+            if os.path.isfile(path):
+                with io.open(path, encoding='utf-8') as f:
+                    classes = [line.strip() for line in f if line.strip()]
+            else:
+                classes = self.classes
+            self._classes[directory] = classes
+        return classes
+
+    def imagePathFor(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        directory = self.imageRoot or os.path.dirname(path)
+        for ext in IMAGE_EXTS:
+            for candidate in (stem + ext, stem + ext.upper()):
+                imagePath = os.path.join(directory, candidate)
+                if os.path.isfile(imagePath):
+                    return imagePath
+        raise ValueError('No image found for %s' % path)
+
+    def readFile(self, path):
+        imagePath = self.imagePathFor(path)
+        size = imageShape(imagePath)
+        if size is None:
+            raise ValueError('Cannot read the size of %s' % imagePath)
+        height, width = size[0], size[1]
+        classes = self.classesFor(os.path.dirname(path))
+        annotation = Annotation(imagePath, size=size)
+        with io.open(path, encoding='utf-8') as f:
+            for line in f:
+                fields = line.split()
+                if not fields:
+                    continue
+                cx, cy, w, h = (float(field) for field in fields[1:5])
+                annotation.addFace(classes[int(fields[0])],
+                                   int(round((cx - w / 2) * width)), int(round((cy - h / 2) * height)),
+                                   int(round((cx + w / 2) * width)), int(round((cy + h / 2) * height)),
+                                   [int(field) for field in fields[5:5 + ATTRIBUTE_COUNT]])
+        return annotation
+
+    def prepare(self, directory):
+        AnnotationFormat.prepare(self, directory)
+        path = os.path.join(directory, self.CLASSES_FILE)
+        if not os.path.isfile(path):
+            with io.open(path, 'w', encoding='utf-8') as f:
+                f.write(u''.join(name + u'\n' for name in self.classes))
+        # Workers get a copy of this instance, with the classes in place
+        self._classes.pop(directory, None)
+        self.classesFor(directory)
+
+    def writeFile(self, annotation, directory):
+        size = annotation.size or imageShape(annotation.imagePath)
+        if size is None:
+            raise ValueError('Cannot read the size of %s' % annotation.imagePath)
+        height, width = float(size[0]), float(size[1])
+        classes = self.classesFor(directory)
+        lines = []
+        for face in annotation.faces:
+            if face.label not in classes:
+                raise ValueError('Label %r of %s is not in %s' % (face.label, annotation.imagePath,
+                                                                 os.path.join(directory, self.CLASSES_FILE)))
+            box = ((face.xmin + face.xmax) / 2.0 / width, (face.ymin + face.ymax) / 2.0 / height,
+                   (face.xmax - face.xmin) / width, (face.ymax - face.ymin) / height)
+            lines.append('%d %.6f %.6f %.6f %.6f %s\n' % ((classes.index(face.label),) + box + (
+                ' '.join(str(code) for code in face.attributes),)))
+        path = os.path.join(directory, os.path.splitext(os.path.basename(annotation.imagePath))[0] + self.suffix)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(u''.join(lines))
+        return path
+
+
+@registerFormat
+class WiderFaceFormat(AnnotationFormat):
+    """
+    The WIDER FACE ground truth file: per image its path relative to
+    imageRoot, the face count and a "x y w h blur expression illumination
+    invalid occlusion pose" line per face. Its flags are coarser than the
+    attributes: reading maps heavy blur to blurriness and leaves the rest
+    at their defaults, writing derives each flag from the attributes.
+    """
+    name = 'wider'
+    perImage = False
+
+    def __init__(self, imageRoot=None, label='face'):
+        self.imageRoot = imageRoot
+        self.label = label
+
+    def read(self, source):
+        imageRoot = self.imageRoot or os.path.dirname(os.path.abspath(source))
+        with io.open(source, encoding='utf-8') as f:
+            lines = (line.strip() for line in f)
+            for name in lines:
+                if not name:
+                    continue
+                annotation = Annotation(os.path.join(imageRoot, name))
+                count = int(next(lines))
+                # Images without faces still have one all-zero line
+                for fields in [next(lines).split() for _ in range(max(count, 1))][:count]:
+                    x, y, w, h, blur = (int(field) for field in fields[:5])
+                    attributes = defaultAttributes()
+                    attributes[_TAG_INDEX['blurriness']] = 1 if blur == 2 else 0
+                    annotation.addFace(self.label, x, y, x + w, y + h, attributes)
+                yield annotation
+
+    def writer(self, target):
+        return _WiderFaceWriter(target, self.imageRoot)
+
+
+class _WiderFaceWriter(object):
+
+    def __init__(self, path, imageRoot):
+        self.imageRoot = imageRoot
+        self.tmpPath = path + '.tmp'
+        self.path = path
+        self.file = io.open(self.tmpPath, 'w', encoding='utf-8')
+
+    def write(self, annotation):
+        name = annotation.imagePath
+        if self.imageRoot:
+            name = os.path.relpath(name, self.imageRoot)
+        lines = [name.replace(os.sep, '/'), str(len(annotation.faces))]
+        for face in annotation.faces:
+            codes = normalizeAttributes(face.attributes)
+            pose = codes[_TAG_INDEX['yaw']] or codes[_TAG_INDEX['roll']] or codes[_TAG_INDEX['pitch']]
+            lines.append('%d %d %d %d %d %d %d 0 %d %d ' % (
+                face.xmin, face.ymin, face.xmax - face.xmin, face.ymax - face.ymin,
+                2 if codes[_TAG_INDEX['blurriness']] else 0, 1 if codes[_TAG_INDEX['emotion']] else 0,
+                1 if codes[_TAG_INDEX['illumination']] else 0, 1 if codes[_TAG_INDEX['mask']] else 0,
+                1 if pose else 0))
+        if not annotation.faces:
+            lines.append('0 0 0 0 0 0 0 0 0 0 ')
+        self.file.write(u'\n'.join(lines) + u'\n')
+
+    def close(self, failed=False):
+        self.file.close()
+        if failed:
+            os.remove(self.tmpPath)
+        else:
+            os.replace(self.tmpPath, self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, *exc):
+        self.close(excType is not None)
+
+
+def convertChunk(sourceFormat, items, targetFormat, target):
+    """
+        Read items (paths for a perImage source, else Annotations) and, for a
+        perImage target, write them to target. Returns (annotations left
+        for the caller to write, count written, [(item, error message)]).
+        Runs in worker processes.
+    """
+    annotations, written, failures = [], 0, []
+    for item in items:
+        try:
+            annotation = sourceFormat.readFile(item) if sourceFormat.perImage else item
+            if targetFormat.perImage:
+                targetFormat.writeFile(annotation, target)
+                written += 1
+            else:
+                annotations.append(annotation)
+        except (IOError, OSError, ValueError, IndexError) as e:
+            failures.append((getattr(item, 'imagePath', item), str(e)))
+    return annotations, written, failures
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def convert(sourceFormat, source, targetFormat, target, workers=None, chunkSize=CHUNK_SIZE):
+    """
+        Convert every annotation of source into target, in source order.
+        Chunks run on a process pool, bounded to PREFETCH chunks per worker
+        in flight. Files that cannot be converted are skipped. Returns
+        (converted count, [(path, error message)]).
+    """
+    if sourceFormat.perImage:
+        items = sourceFormat.files(source)
+        parallel = len(items) >= PARALLEL_THRESHOLD
+    else:
+        # A single-file source is not counted up front
+        items = sourceFormat.read(source)
+        parallel = True
+    if workers is None:
+        workers = multiprocessing.cpu_count() if parallel else 0
+    converted, failures = 0, []
+    with targetFormat.writer(target) as output:
+        for annotations, written, chunkFailures in _convertChunks(sourceFormat, items, targetFormat, target,
+                                                                  workers, chunkSize):
+            converted += written
+            failures.extend(chunkFailures)
+            for annotation in annotations:
+                output.write(annotation)
+                converted += 1
+    return converted, failures
+
+
+def _convertChunks(sourceFormat, items, targetFormat, target, workers, chunkSize):
+    """convertChunk() over items in chunks, results in order."""
+    chunks = _chunks(items, chunkSize)
+    if workers <= 1:
+        for chunk in chunks:
+            yield convertChunk(sourceFormat, chunk, targetFormat, target)
+        return
+    with spawnPool(workers) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(convertChunk, sourceFormat, chunk, targetFormat, target))
+            if len(pending) >= workers * PREFETCH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Convert face annotations between formats.')
+    parser.add_argument('sourceFormat', choices=sorted(FORMATS))
+    parser.add_argument('source', help='directory of per-image files, or the file of a single-file format')
+    parser.add_argument('targetFormat', choices=sorted(FORMATS))
+    parser.add_argument('target', help='directory for per-image files, or the file of a single-file format')
+    parser.add_argument('--image-root', help='where the images are (WIDER FACE, YOLO)')
+    parser.add_argument('--classes', default='face', help='comma-separated YOLO class names without classes.txt')
+    parser.add_argument('--workers', type=int, help='processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+
+    def formatFor(name):
+        options = {}
+        if name in ('wider', 'yolo'):
+            options['imageRoot'] = args.image_root
+        if name == 'yolo':
+            options['classes'] = args.classes.split(',')
+        return getFormat(name, **options)
+
+    converted, failures = convert(formatFor(args.sourceFormat), args.source, formatFor(args.targetFormat),
+                                  args.target, args.workers)
+    for path, message in failures:
+        print('skipped %s: %s' % (path, message))
+    print('%d annotations converted, %d skipped' % (converted, len(failures)))
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Every face box of a dataset in one columnar table, for training and
+analysis jobs. Requires NumPy; nothing in the GUI imports this module.
+
+loadAnnotationTable() parses the XMLs in chunks on a process pool and
+keeps the result in an .npz cache keyed by each XML's path, mtime and
+size, so a re-run only parses the files that changed.
+
+exportTable() writes a table as a directory of .npy files that training
+loaders can np.load(mmap_mode='r') without parsing anything, and
+writeAnnotations() turns a table, e.g. loadExport()ed, back into per-image
+XMLs.
+"""
+import io
+import itertools
+import json
+import multiprocessing
+import os
+import tempfile
+
+import numpy as np
+
+from libs.annotationCatalog import PARALLEL_THRESHOLD
+from libs.attributes import ATTRIBUTE_COUNT, ATTRIBUTE_TAGS
+from libs.headless import annotatedImagePath, annotationPath, findAnnotations
+from libs.imageProbe import imageShape
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter
+from libs.workerPool import spawnPool
+
+CACHE_VERSION = 1
+EXPORT_VERSION = 1
+EXPORT_META = 'meta.json'
+# XMLs per pool task: large enough that each result is a few big arrays
+CHUNK_SIZE = 512
+
+
+def _packStrings(strings):
+    """A list of str as one uint8 array, NUL separated (paths cannot hold NUL)."""
+    return np.frombuffer(u'\0'.join(strings).encode('utf-8'), dtype=np.uint8)
+
+
+def _unpackStrings(packed, count):
+    if count == 0:
+        return []
+    return packed.tobytes().decode('utf-8').split(u'\0')
+
+
+class StringTable(object):
+    """
+    Read-only sequence of str kept as one UTF-8 byte array and the int64
+    offsets of each string in it, so it can be memory-mapped and items
+    are decoded only when read.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def fromStrings(cls, strings):
+        encoded = [string.encode('utf-8') for string in strings]
+        offsets = np.zeros(len(encoded) + 1, np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b''.join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.data[self.offsets[i]:self.offsets[i + 1]].tobytes().decode('utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class AnnotationTable(object):
+    """
+    Columns per image: xmlPaths, imagePaths, verified, imageSizes
+    ([height, width, depth], -1 when the XML has no <size>) and the XML's
+    mtimes and sizes. Columns per face: boxes (xmin, ymin, xmax, ymax),
+    attributes (a code per ATTRIBUTE_TAGS entry) and labels, indexes into
+    labelNames. The faces of image i are rows offsets[i]:offsets[i + 1].
+    """
+
+    def __init__(self, xmlPaths, imagePaths, verified, imageSizes, mtimes, sizes,
+                 offsets, boxes, attributes, labels, labelNames):
+        self.xmlPaths = xmlPaths
+        self.imagePaths = imagePaths
+        self.verified = verified
+        self.imageSizes = imageSizes
+        self.mtimes = mtimes
+        self.sizes = sizes
+        self.offsets = offsets
+        self.boxes = boxes
+        self.attributes = attributes
+        self.labels = labels
+        self.labelNames = labelNames
+        # Number of XMLs parsed to build the table, the rest came from the cache
+        self.parsedCount = 0
+        self._index = None
+
+    @classmethod
+    def empty(cls):
+        return cls([], [], np.zeros(0, bool), np.zeros((0, 3), np.int32), np.zeros(0, np.float64),
+                   np.zeros(0, np.int64), np.zeros(1, np.int64), np.zeros((0, 4), np.int32),
+                   np.zeros((0, ATTRIBUTE_COUNT), np.uint8), np.zeros(0, np.int32), [])
+
+    def __len__(self):
+        return len(self.xmlPaths)
+
+    @property
+    def faceCount(self):
+        return len(self.boxes)
+
+    def faceImages(self):
+        """The image index of every face."""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.offsets))
+
+    def index(self, imagePath):
+        """The row of imagePath; KeyError if it is not in the table."""
+        if self._index is None:
+            self._index = dict((path, i) for i, path in enumerate(self.imagePaths))
+        return self._index[imagePath]
+
+    def faces(self, i):
+        """Row slice of image i's faces."""
+        return slice(int(self.offsets[i]), int(self.offsets[i + 1]))
+
+    def take(self, rows):
+        """A table of the images at rows, in that order."""
+        rows = np.asarray(rows, dtype=np.int64)
+        starts = self.offsets[rows]
+        counts = self.offsets[rows + 1] - starts
+        offsets = np.zeros(len(rows) + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        faces = np.repeat(starts - offsets[:-1], counts) + np.arange(offsets[-1], dtype=np.int64)
+        return AnnotationTable([self.xmlPaths[i] for i in rows], [self.imagePaths[i] for i in rows],
+                               self.verified[rows], self.imageSizes[rows], self.mtimes[rows],
+                               self.sizes[rows], offsets, self.boxes[faces], self.attributes[faces],
+                               self.labels[faces], self.labelNames)
+
+    @classmethod
+    def concatenate(cls, tables):
+        tables = [table for table in tables if len(table)]
+        if not tables:
+            return cls.empty()
+        if len(tables) == 1:
+            return tables[0]
+        labelNames, labelCodes, labels = [], {}, []
+        for table in tables:
+            remap = np.array([labelCodes.setdefault(name, len(labelCodes)) for name in table.labelNames],
+                             dtype=np.int32)
+            labels.append(remap[table.labels] if len(remap) else table.labels)
+        labelNames = sorted(labelCodes, key=labelCodes.get)
+        counts = np.concatenate([np.diff(table.offsets) for table in tables])
+        offsets = np.zeros(len(counts) + 1, np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(list(itertools.chain.from_iterable(table.xmlPaths for table in tables)),
+                   list(itertools.chain.from_iterable(table.imagePaths for table in tables)),
+                   np.concatenate([table.verified for table in tables]),
+                   np.concatenate([table.imageSizes for table in tables]),
+                   np.concatenate([table.mtimes for table in tables]),
+                   np.concatenate([table.sizes for table in tables]),
+                   offsets,
+                   np.concatenate([table.boxes for table in tables]),
+                   np.concatenate([table.attributes for table in tables]),
+                   np.concatenate(labels), labelNames)
+
+    def save(self, path):
+        """Write the table to an .npz file, atomically."""
+        directory, name = os.path.split(os.path.abspath(path))
+        fd, tmpPath = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, version=np.array(CACHE_VERSION), count=np.array(len(self)),
+                         labelCount=np.array(len(self.labelNames)),
+                         xmlPaths=_packStrings(self.xmlPaths), imagePaths=_packStrings(self.imagePaths),
+                         labelNames=_packStrings(self.labelNames), verified=self.verified,
+                         imageSizes=self.imageSizes, mtimes=self.mtimes, sizes=self.sizes,
+                         offsets=self.offsets, boxes=self.boxes, attributes=self.attributes,
+                         labels=self.labels)
+            os.replace(tmpPath, path)
+        except BaseException:
+            try:
+                os.remove(tmpPath)
+            except OSError:
+                pass
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Read a table written by save(); None if it is unreadable or from another version."""
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != CACHE_VERSION:
+                    return None
+                count = int(data['count'])
+                return cls(_unpackStrings(data['xmlPaths'], count),
+                           _unpackStrings(data['imagePaths'], count),
+                           data['verified'], data['imageSizes'], data['mtimes'], data['sizes'],
+                           data['offsets'], data['boxes'], data['attributes'], data['labels'],
+                           _unpackStrings(data['labelNames'], int(data['labelCount'])))
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+
+
+def parseChunk(xmlPaths):
+    """Parse XMLs into an AnnotationTable without mtimes; runs in worker processes."""
+    imagePaths, verified, imageSizes, counts = [], [], [], []
+    boxes, attributes, labels, labelCodes = [], [], [], {}
+    for xmlPath in xmlPaths:
+        reader = PascalVocReader(xmlPath)
+        imagePath = annotatedImagePath(reader, xmlPath)
+        imagePaths.append(imagePath)
+        verified.append(reader.verified)
+        imageSizes.append(reader.imageSize or (-1, -1, -1))
+        shapes = reader.getShapes()
+        counts.append(len(shapes))
+        for label, points, _, _, codes in shapes:
+            (xmin, ymin), _, (xmax, ymax), _ = points
+            boxes.append((xmin, ymin, xmax, ymax))
+            attributes.append(codes)
+            labels.append(labelCodes.setdefault(label, len(labelCodes)))
+    offsets = np.zeros(len(counts) + 1, np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    count = len(xmlPaths)
+    return AnnotationTable(list(xmlPaths), imagePaths, np.array(verified, bool),
+                           np.array(imageSizes, np.int32).reshape(count, 3),
+                           np.zeros(count, np.float64), np.zeros(count, np.int64), offsets,
+                           np.array(boxes, np.int32).reshape(len(boxes), 4),
+                           np.array(attributes, np.uint8).reshape(len(attributes), ATTRIBUTE_COUNT),
+                           np.array(labels, np.int32), sorted(labelCodes, key=labelCodes.get))
+
+
+def parseTable(xmlPaths, workers=None, chunkSize=CHUNK_SIZE):
+    """parseChunk() over xmlPaths, chunks on a process pool for large batches, in order."""
+    xmlPaths = list(xmlPaths)
+    if workers is None:
+        workers = multiprocessing.cpu_count() if len(xmlPaths) >= PARALLEL_THRESHOLD else 0
+    chunks = [xmlPaths[i:i + chunkSize] for i in range(0, len(xmlPaths), chunkSize)]
+    if workers <= 1 or len(chunks) < 2:
+        return AnnotationTable.concatenate([parseChunk(chunk) for chunk in chunks])
+    with spawnPool(workers) as pool:
+        return AnnotationTable.concatenate(list(pool.map(parseChunk, chunks)))
+
+
+def loadAnnotationTable(xmlPaths, cachePath=None, workers=None, chunkSize=CHUNK_SIZE):
+    """
+        Return the AnnotationTable of xmlPaths (a list, or a directory to
+        search), in that order. Missing files are left out. With cachePath,
+        only XMLs whose path, mtime or size are not in the cache are parsed,
+        and the cache is rewritten when anything changed.
+    """
+    if not isinstance(xmlPaths, (list, tuple)):
+        xmlPaths = findAnnotations(xmlPaths)
+    cached = AnnotationTable.load(cachePath) if cachePath and os.path.isfile(cachePath) else None
+    if cached is None:
+        cached = AnnotationTable.empty()
+    cachedRows = dict((path, i) for i, path in enumerate(cached.xmlPaths))
+
+    kept, stale, staleKeys, order = [], [], [], []
+    for xmlPath in xmlPaths:
+        try:
+            stat = os.stat(xmlPath)
+        except OSError:
+            continue
+        row = cachedRows.get(xmlPath)
+        if row is not None and cached.mtimes[row] == stat.st_mtime and cached.sizes[row] == stat.st_size:
+            order.append(len(kept))
+            kept.append(row)
+        else:
+            order.append(-1 - len(stale))
+            stale.append(xmlPath)
+            staleKeys.append((stat.st_mtime, stat.st_size))
+
+    parsed = parseTable(stale, workers, chunkSize) if stale else AnnotationTable.empty()
+    if stale:
+        parsed.mtimes = np.array([mtime for mtime, _ in staleKeys], np.float64)
+        parsed.sizes = np.array([size for _, size in staleKeys], np.int64)
+    # Kept rows come first in the combined table, parsed ones after them
+    order = np.array(order, np.int64)
+    order[order < 0] = len(kept) - 1 - order[order < 0]
+    table = AnnotationTable.concatenate([cached.take(kept), parsed]).take(order)
+    table.parsedCount = len(stale)
+
+    if cachePath and (stale or len(kept) != len(cached)):
+        table.save(cachePath)
+    return table
+
+
+def exportTable(table, directory):
+    """
+        Write table to directory as .npy columns: boxes (int32, faces x 4),
+        attributes (uint8, faces x ATTRIBUTE_TAGS), labels (int32), offsets
+        (int64, images + 1), verified (bool), image_sizes (int32, images x
+        3) and string tables of image paths, XML paths and label names.
+        meta.json goes last, so a directory without one is incomplete.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    meta = os.path.join(directory, EXPORT_META)
+    if os.path.exists(meta):
+        os.remove(meta)
+    columns = dict(boxes=table.boxes.astype(np.int32), attributes=table.attributes.astype(np.uint8),
+                   labels=table.labels.astype(np.int32), offsets=table.offsets.astype(np.int64),
+                   verified=table.verified.astype(bool), image_sizes=table.imageSizes.astype(np.int32))
+    for name, strings in (('image_paths', table.imagePaths), ('xml_paths', table.xmlPaths),
+                          ('label_names', table.labelNames)):
+        strings = StringTable.fromStrings(strings)
+        columns[name] = strings.data
+        columns[name + '_offsets'] = strings.offsets
+    for name, column in columns.items():
+        np.save(os.path.join(directory, name + '.npy'), column)
+    with io.open(meta, 'w', encoding='utf-8') as f:
+        f.write(json.dumps({'version': EXPORT_VERSION, 'attributes': list(ATTRIBUTE_TAGS),
+                            'images': len(table), 'faces': table.faceCount}))
+
+
+def loadExport(directory, mmap=True):
+    """
+        Open a directory written by exportTable() as an AnnotationTable whose
+        columns are memory-mapped (or read, without mmap) and whose path
+        columns are StringTables.
+    """
+    with io.open(os.path.join(directory, EXPORT_META), encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta['version'] != EXPORT_VERSION or meta['attributes'] != list(ATTRIBUTE_TAGS):
+        raise ValueError('%s was exported with another format or attribute schema' % directory)
+
+    def column(name):
+        return np.load(os.path.join(directory, name + '.npy'), mmap_mode='r' if mmap else None)
+
+    def strings(name):
+        return StringTable(column(name), column(name + '_offsets'))
+
+    count = meta['images']
+    return AnnotationTable(strings('xml_paths'), strings('image_paths'), column('verified'),
+                           column('image_sizes'), np.zeros(count, np.float64), np.zeros(count, np.int64),
+                           column('offsets'), column('boxes'), column('attributes'), column('labels'),
+                           list(strings('label_names')))
+
+
+def writeChunk(table, saveDir=None):
+    """
+        Write one Pascal VOC XML per image of table, next to the image or in
+        saveDir; runs in worker processes. Returns the image paths skipped
+        because their size is neither in the table nor readable from disk.
+    """
+    skipped = []
+    for i, imagePath in enumerate(table.imagePaths):
+        size = table.imageSizes[i].tolist()
+        if min(size) < 0:
+            size = imageShape(imagePath)
+            if size is None:
+                skipped.append(imagePath)
+                continue
+        writer = PascalVocWriter(os.path.basename(os.path.dirname(imagePath)), os.path.basename(imagePath),
+                                 size, localImgPath=imagePath)
+        writer.verified = bool(table.verified[i])
+        faces = table.faces(i)
+        for (xmin, ymin, xmax, ymax), codes, label in zip(table.boxes[faces].tolist(),
+                                                           table.attributes[faces].tolist(),
+                                                           table.labels[faces].tolist()):
+            writer.addBndBox(xmin, ymin, xmax, ymax, table.labelNames[label], codes)
+        writer.save(annotationPath(imagePath, saveDir))
+    return skipped
+
+
+def writeAnnotations(table, saveDir=None, workers=None, chunkSize=CHUNK_SIZE):
+    """writeChunk() over table, in chunks on a process pool for large tables."""
+    if saveDir and not os.path.isdir(saveDir):
+        os.makedirs(saveDir)
+    if workers is None:
+        workers = multiprocessing.cpu_count() if len(table) >= PARALLEL_THRESHOLD else 0
+    chunks = [table.take(np.arange(start, min(start + chunkSize, len(table))))
+              for start in range(0, len(table), chunkSize)]
+    if workers <= 1 or len(chunks) < 2:
+        return list(itertools.chain.from_iterable(writeChunk(chunk, saveDir) for chunk in chunks))
+    with spawnPool(workers) as pool:
+        return list(itertools.chain.from_iterable(pool.map(writeChunk, chunks, [saveDir] * len(chunks))))
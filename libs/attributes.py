@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Face attribute schema and codec.
+
+Every face carries one small integer code per attribute, stored in a list
+ordered like ATTRIBUTE_SCHEMA. The code is what goes to the XML <tag>, and
+the one-hot flag names (isfemale, ismale, ...) are the values it indexes.
+"""
+
+# (xml tag, flag names in code order, code used for out-of-range xml values)
+ATTRIBUTE_SCHEMA = (
+    ('gender', ('isfemale', 'ismale'), 1),
+    ('age', ('young', 'middle', 'old', 'children'), 3),
+    ('mask', ('nomask', 'mask'), 1),
+    ('mouth', ('closemouth', 'openmouth', 'uncertainmouth'), 2),
+    ('eyeglass', ('noeyeglass', 'eyeglass'), 1),
+    ('sunglass', ('nosunglass', 'sunglass'), 0),
+    ('eye', ('openeye', 'closeeye', 'uncertaineye'), 2),
+    ('emotion', ('norm_emotion', 'laugh', 'shock'), 0),
+    ('blurriness', ('noblur', 'blur'), 1),
+    ('illumination', ('norm_illumination', 'dim', 'bright', 'backlight', 'yinyang'), 0),
+    ('yaw', ('norm_yaw', 'yaw_30', 'yaw_60'), 0),
+    ('roll', ('norm_roll', 'roll_20', 'roll_45'), 0),
+    ('pitch', ('norm_pitch', 'pitch_20up', 'pitch_45up', 'pitch_20down', 'pitch_45down'), 0),
+)
+
+ATTRIBUTE_TAGS = tuple(tag for tag, _, _ in ATTRIBUTE_SCHEMA)
+ATTRIBUTE_COUNT = len(ATTRIBUTE_SCHEMA)
+DEFAULT_ATTRIBUTES = (0,) * ATTRIBUTE_COUNT
+
+# flag name -> (attribute index, code)
+FLAG_INDEX = dict((flag, (index, code))
+                  for index, (_, flags, _) in enumerate(ATTRIBUTE_SCHEMA)
+                  for code, flag in enumerate(flags))
+
+# xml text -> code, one table per attribute
+_TEXT_TO_CODE = tuple(dict((str(code), code) for code in range(len(flags)))
+                      for _, flags, _ in ATTRIBUTE_SCHEMA)
+_FALLBACKS = tuple(fallback for _, _, fallback in ATTRIBUTE_SCHEMA)
+_TAG_INDEX = dict((tag, index) for index, tag in enumerate(ATTRIBUTE_TAGS))
+
+
+def defaultAttributes():
+    return list(DEFAULT_ATTRIBUTES)
+
+
+def parseAttributes(object_iter):
+    """
+        Return the attribute codes of an <object> element in one pass over its children.
+        Missing tags decode to 0, out-of-range values to the schema fallback.
+    """
+    codes = defaultAttributes()
+    for child in object_iter:
+        index = _TAG_INDEX.get(child.tag)
+        if index is None:
+            continue
+        text = (child.text or '').strip()
+        code = _TEXT_TO_CODE[index].get(text)
+        if code is None:
+            # Tolerate '01', '+1' and friends before falling back
+            code = _TEXT_TO_CODE[index].get(str(int(text)), _FALLBACKS[index])
+        codes[index] = code
+    return codes
+
+
+def normalizeAttributes(codes):
+    """
+        Clamp a code sequence to the schema, padding missing attributes with 0
+    """
+    codes = list(codes or ())[:ATTRIBUTE_COUNT]
+    codes.extend(DEFAULT_ATTRIBUTES[len(codes):])
+    for i, (code, table, fallback) in enumerate(zip(codes, _TEXT_TO_CODE, _FALLBACKS)):
+        if not 0 <= code < len(table):
+            codes[i] = fallback
+    return codes
+
+
+def flagProperty(index, code):
+    """
+        One-hot view of attribute `index`: reads True when it holds `code`.
+        Clearing the flag that is currently set falls back to code 0.
+    """
+    def getter(self):
+        return self.attributes[index] == code
+
+    def setter(self, value):
+        if value:
+            self.attributes[index] = code
+        elif self.attributes[index] == code:
+            self.attributes[index] = 0
+
+    return property(getter, setter)
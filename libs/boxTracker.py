@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Carry face boxes from one video frame to the next. Requires NumPy.
+
+Frames are 2-D uint8 grayscale arrays, usually downscaled, and boxes are
+(xmin, ymin, xmax, ymax) in frame pixels. trackBoxes() finds each box's
+patch again by normalized cross-correlation around its old position;
+matchBoxes() pairs boxes by IoU, e.g. tracked ones with detector
+proposals.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided
+
+# Templates are reduced until their longer side is at most this many pixels
+MAX_TEMPLATE = 32
+# Search radius as a fraction of the (reduced) template's longer side
+SEARCH_RATIO = 0.5
+# A match must correlate at least this well to move the box
+MIN_CORRELATION = 0.5
+MIN_TEMPLATE = 4
+
+
+def iouMatrix(a, b):
+    """IoU of every box in a (n x 4) with every box in b (m x 4), as n x m."""
+    a = np.asarray(a, np.float64).reshape(-1, 4)
+    b = np.asarray(b, np.float64).reshape(-1, 4)
+    width = np.minimum(a[:, None, 2], b[None, :, 2]) - np.maximum(a[:, None, 0], b[None, :, 0])
+    height = np.minimum(a[:, None, 3], b[None, :, 3]) - np.maximum(a[:, None, 1], b[None, :, 1])
+    overlap = np.clip(width, 0, None) * np.clip(height, 0, None)
+    areaA = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    areaB = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    union = areaA[:, None] + areaB[None, :] - overlap
+    return np.where(union > 0, overlap / np.where(union > 0, union, 1), 0.0)
+
+
+def matchBoxes(a, b, threshold=0.5):
+    """
+        Pair boxes of a with boxes of b, best IoU first, each box at most
+        once and only at threshold or above. Returns {index in a: index in b}.
+    """
+    ious = iouMatrix(a, b)
+    pairs = {}
+    if ious.size == 0:
+        return pairs
+    taken = np.zeros(ious.shape[1], bool)
+    for flat in np.argsort(-ious, axis=None):
+        i, j = divmod(int(flat), ious.shape[1])
+        if ious[i, j] < threshold:
+            break
+        if i in pairs or taken[j]:
+            continue
+        pairs[i] = j
+        taken[j] = True
+    return pairs
+
+
+def _windowViews(array, shape):
+    """Every shape-sized window of a 2-D array, as sliding_window_view() of NumPy >= 1.20 gives."""
+    rows, cols = array.shape[0] - shape[0] + 1, array.shape[1] - shape[1] + 1
+    return as_strided(array, (rows, cols) + tuple(shape), array.strides * 2, writeable=False)
+
+
+try:
+    from numpy.lib.stride_tricks import sliding_window_view
+except ImportError:
+    # NumPy < 1.20
+    sliding_window_view = _windowViews
+
+
+def _correlate(template, window):
+    """Normalized cross-correlation of template at every position of window."""
+    views = sliding_window_view(window, template.shape)
+    template = template - template.mean()
+    templateNorm = np.sqrt((template * template).sum())
+    # sum((view - mean) * template) == sum(view * template), template sums to 0
+    products = np.einsum('ijkl,kl->ij', views, template)
+    count = template.size
+    sums = views.sum(axis=(2, 3))
+    variances = (views * views).sum(axis=(2, 3)) - sums * sums / count
+    return products / (np.sqrt(np.clip(variances, 0, None)) * templateNorm + 1e-6)
+
+
+def _reduce(image, step):
+    """image averaged over step x step blocks, as float32."""
+    if step == 1:
+        return image.astype(np.float32)
+    height, width = image.shape[0] // step * step, image.shape[1] // step * step
+    blocks = image[:height, :width].reshape(height // step, step, width // step, step)
+    return blocks.mean(axis=(1, 3), dtype=np.float32)
+
+
+def _bestOffset(template, current, top, left, bottom, right, step):
+    """Best (score, y, x) of template in current[top:bottom, left:right], reduced by step."""
+    window = _reduce(current[top:bottom, left:right], step)
+    if window.shape[0] < template.shape[0] or window.shape[1] < template.shape[1]:
+        return -1.0, top, left
+    scores = _correlate(template, window)
+    row, column = np.unravel_index(int(np.argmax(scores)), scores.shape)
+    return float(scores[row, column]), top + row * step, left + column * step
+
+
+def trackBox(previous, current, box):
+    """
+        Where box of previous is in current, and how well it matched
+        (-1..1). The search runs on a reduction where the template is at
+        most MAX_TEMPLATE wide, then at full resolution around the best
+        match. A box that does not match well enough stays where it was.
+    """
+    height, width = previous.shape
+    xmin, ymin, xmax, ymax = (int(round(value)) for value in box)
+    xmin, ymin = max(0, xmin), max(0, ymin)
+    xmax, ymax = min(width, xmax), min(height, ymax)
+    if xmax - xmin < MIN_TEMPLATE or ymax - ymin < MIN_TEMPLATE:
+        return tuple(box), 0.0
+    patch = previous[ymin:ymax, xmin:xmax]
+    if patch.std() < 1e-3:
+        # Nothing to lock on to, e.g. a flat patch
+        return tuple(box), 0.0
+    step = max(1, -(-max(xmax - xmin, ymax - ymin) // MAX_TEMPLATE))
+    template = _reduce(patch, step)
+    radius = max(2, int(SEARCH_RATIO * max(template.shape))) * step
+    # Whole steps from the box, so the box's own position is a candidate
+    top = ymin - min(radius, ymin) // step * step
+    left = xmin - min(radius, xmin) // step * step
+    score, y, x = _bestOffset(template, current, top, left, ymin + template.shape[0] * step + radius,
+                              xmin + template.shape[1] * step + radius, step)
+    if step > 1 and score >= MIN_CORRELATION:
+        # The reduction only finds the match to within a step
+        top, left = max(0, y - step), max(0, x - step)
+        score, y, x = _bestOffset(patch.astype(np.float32), current, top, left,
+                                  y + patch.shape[0] + step, x + patch.shape[1] + step, 1)
+    if score < MIN_CORRELATION:
+        return tuple(box), score
+    dx, dy = int(x - xmin), int(y - ymin)
+    return (box[0] + dx, box[1] + dy, box[2] + dx, box[3] + dy), score
+
+
+def trackBoxes(previous, current, boxes):
+    """trackBox() for every box; returns (boxes, scores)."""
+    tracked = [trackBox(previous, current, box) for box in boxes]
+    return [box for box, _ in tracked], [score for _, score in tracked]
+
+
+def propagateBoxes(boxes, previous, previousScale, current, currentScale):
+    """
+        Track full-resolution boxes from the frame previous, reduced by
+        previousScale (x, y), to current, reduced by currentScale, and
+        return them at full resolution, clipped to the image.
+    """
+    (px, py), (cx, cy) = previousScale, currentScale
+    reduced = [(xmin * px, ymin * py, xmax * px, ymax * py) for xmin, ymin, xmax, ymax in boxes]
+    tracked, _ = trackBoxes(previous, current, reduced)
+    width, height = current.shape[1] / cx, current.shape[0] / cy
+    propagated = []
+    for xmin, ymin, xmax, ymax in tracked:
+        xmin, xmax = min(max(0, xmin / cx), width), min(max(0, xmax / cx), width)
+        ymin, ymax = min(max(0, ymin / cy), height), min(max(0, ymax / cy), height)
+        propagated.append(tuple(int(round(value)) for value in (xmin, ymin, xmax, ymax)))
+    return propagated
@@ -11,6 +11,9 @@ except ImportError:
 
 from libs.shape import Shape
 from libs.lib import distance
+from libs.spatialIndex import ShapeIndex
+from libs.imagePrefetcher import TILED_MIN_PIXELS, tiledImageSize
+from libs.imagePyramid import ImagePyramid
 
 CURSOR_DEFAULT = Qt.ArrowCursor
 CURSOR_POINT = Qt.PointingHandCursor
@@ -18,6 +21,9 @@ CURSOR_DRAW = Qt.CrossCursor
 CURSOR_MOVE = Qt.ClosedHandCursor
 CURSOR_GRAB = Qt.OpenHandCursor
 
+# Widget pixels around a dirty shape covering its pen and vertex markers
+DIRTY_MARGIN = 2 * Shape.point_size + 4
+
 # class Canvas(QGLWidget):
 
 
@@ -38,6 +44,8 @@ class Canvas(QWidget):
         # Initialise local state.
         self.mode = self.EDIT
         self.shapes = []
+        # Grid over the bounds of self.shapes for hover and click hit-testing
+        self.shapeIndex = ShapeIndex()
         self.current = None
         self.selectedShape = None  # save the selected shape here
         self.selectedShapeCopy = None
@@ -47,6 +55,12 @@ class Canvas(QWidget):
         self.offsets = QPointF(), QPointF()
         self.scale = 1.0
         self.pixmap = QPixmap()
+        # Size of the image in the pixel space of the shapes
+        self.imageSize = QSize()
+        # Tiles of reduced copies of large images, drawn when zoomed out
+        self.pyramid = None
+        # Cancelled pyramids whose workers may still be building a tile
+        self.droppedPyramids = []
         self.visible = {}
         self._hideBackround = False
         self.hideBackround = False
@@ -59,8 +73,23 @@ class Canvas(QWidget):
         # Set widget options.
         self.setMouseTracking(True)
         self.setFocusPolicy(Qt.WheelFocus)
+        self.setAutoFillBackground(True)
         self.verified = False
 
+    @property
+    def verified(self):
+        return self._verified
+
+    @verified.setter
+    def verified(self, value):
+        self._verified = value
+        pal = self.palette()
+        if value:
+            pal.setColor(self.backgroundRole(), QColor(184, 239, 38, 128))
+        else:
+            pal.setColor(self.backgroundRole(), QColor(232, 232, 232, 255))
+        self.setPalette(pal)
+
     def enterEvent(self, ev):
         self.overrideCursor(self._cursor)
 
@@ -85,7 +114,7 @@ class Canvas(QWidget):
             self.unHighlight()
             self.deSelectShape()
         self.prevPoint = QPointF()
-        self.repaint()
+        self.update()
 
     def unHighlight(self):
         if self.hShape:
@@ -95,12 +124,73 @@ class Canvas(QWidget):
     def selectedVertex(self):
         return self.hVertex is not None
 
+    def shapeBounds(self, shape):
+        xs = [p.x() for p in shape.points]
+        ys = [p.y() for p in shape.points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def indexShape(self, shape):
+        if shape.points:
+            self.shapeIndex.insert(shape, self.shapeBounds(shape))
+        else:
+            self.shapeIndex.remove(shape)
+
+    def reindexShape(self, shape):
+        """Refresh the index after shape was moved, if it is one of self.shapes."""
+        if shape in self.shapeIndex:
+            self.indexShape(shape)
+
+    def reindexShapes(self):
+        self.shapeIndex.rebuild((shape, self.shapeBounds(shape))
+                                for shape in self.shapes if shape.points)
+
+    def shapeRect(self, shape):
+        """Image-space bounds of shape, or None if there is nothing to draw."""
+        if shape is None or not shape.points:
+            return None
+        return shape.boundingRect()
+
+    def drawingRects(self):
+        """Image-space rects of the box being drawn and the crosshair."""
+        rects = [self.shapeRect(self.current)]
+        if self.current is not None and len(self.line) == 2:
+            rects.append(QRectF(self.line[0], self.line[1]).normalized())
+        if self.drawing() and not self.prevPoint.isNull() and self.pixmap:
+            rects.append(QRectF(self.prevPoint.x(), 0, 0, self.imageSize.height()))
+            rects.append(QRectF(0, self.prevPoint.y(), self.imageSize.width(), 0))
+        return rects
+
+    def updateRects(self, *rects):
+        """Schedule a repaint of image-space rects; Qt merges them into one paint event."""
+        s = self.scale
+        offset = self.offsetToCenter()
+        for rect in rects:
+            if rect is None:
+                continue
+            widgetRect = QRectF((rect.left() + offset.x()) * s, (rect.top() + offset.y()) * s,
+                                rect.width() * s, rect.height() * s)
+            self.update(widgetRect.toAlignedRect().adjusted(
+                -DIRTY_MARGIN, -DIRTY_MARGIN, DIRTY_MARGIN, DIRTY_MARGIN))
+
+    def imageRect(self, widgetRect):
+        """Convert a widget rect to image coordinates."""
+        s = self.scale
+        offset = self.offsetToCenter()
+        return QRectF(widgetRect.x() / s - offset.x(), widgetRect.y() / s - offset.y(),
+                      widgetRect.width() / s, widgetRect.height() / s)
+
+    def shapesAt(self, point, radius=0.0):
+        """Visible shapes that may be within radius of point, topmost first."""
+        return [shape for shape in self.shapeIndex.query(point.x(), point.y(), radius)
+                if self.isVisible(shape)]
+
     def mouseMoveEvent(self, ev):
         """Update line with last point and current coordinates."""
         pos = self.transformPos(ev.pos())
 
         # Polygon drawing.
         if self.drawing():
+            dirty = self.drawingRects()
             self.overrideCursor(CURSOR_DRAW)
             if self.current:
                 color = self.lineColor
@@ -141,7 +231,7 @@ class Canvas(QWidget):
             else:
                 self.prevPoint = pos
                 self.squarepoint = pos
-            self.repaint()
+            self.updateRects(*(dirty + self.drawingRects()))
             return
 
         # Polygon copy moving.
@@ -149,24 +239,27 @@ class Canvas(QWidget):
 
             if self.selectedShapeCopy and self.prevPoint:
                 self.overrideCursor(CURSOR_MOVE)
+                before = self.shapeRect(self.selectedShapeCopy)
                 self.boundedMoveShape(self.selectedShapeCopy, pos)
-                self.repaint()
+                self.updateRects(before, self.shapeRect(self.selectedShapeCopy))
             elif self.selectedShape:
                 self.selectedShapeCopy = self.selectedShape.copy()
-                self.repaint()
+                self.updateRects(self.shapeRect(self.selectedShapeCopy))
             return
 
         # Polygon/Vertex moving.
         if Qt.LeftButton & ev.buttons():
             if self.selectedVertex():
+                before = self.shapeRect(self.hShape)
                 self.boundedMoveVertex(pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateRects(before, self.shapeRect(self.hShape))
             elif self.selectedShape and self.prevPoint:
                 self.overrideCursor(CURSOR_MOVE)
+                before = self.shapeRect(self.selectedShape)
                 self.boundedMoveShape(self.selectedShape, pos)
                 self.shapeMoved.emit()
-                self.repaint()
+                self.updateRects(before, self.shapeRect(self.selectedShape))
             return
 
         # Just hovering over the canvas, 2 posibilities:
@@ -174,7 +267,8 @@ class Canvas(QWidget):
         # - Highlight vertex
         # Update shape/vertex fill and tooltip value accordingly.
         self.setToolTip("Image")
-        for shape in reversed([s for s in self.shapes if self.isVisible(s)]):
+        highlighted = self.hShape, self.hVertex
+        for shape in self.shapesAt(pos, self.epsilon):
             # Look for a nearby vertex to highlight. If that fails,
             # check if we happen to be inside a shape.
             index = shape.nearestVertex(pos, self.epsilon)
@@ -186,7 +280,6 @@ class Canvas(QWidget):
                 self.overrideCursor(CURSOR_POINT)
                 self.setToolTip("Click & drag to move point")
                 self.setStatusTip(self.toolTip())
-                self.update()
                 break
             elif shape.containsPoint(pos):
                 if self.selectedVertex():
@@ -196,14 +289,14 @@ class Canvas(QWidget):
                     "Click & drag to move shape '%s'" % shape.label)
                 self.setStatusTip(self.toolTip())
                 self.overrideCursor(CURSOR_GRAB)
-                self.update()
                 break
         else:  # Nothing found, clear highlights, reset state.
             if self.hShape:
                 self.hShape.highlightClear()
-                self.update()
             self.hVertex, self.hShape = None, None
             self.overrideCursor(CURSOR_DEFAULT)
+        if (self.hShape, self.hVertex) != highlighted:
+            self.updateRects(self.shapeRect(highlighted[0]), self.shapeRect(self.hShape))
 
     def mousePressEvent(self, ev):
         pos = self.transformPos(ev.pos())
@@ -214,11 +307,11 @@ class Canvas(QWidget):
             else:
                 self.selectShapePoint(pos)
                 self.prevPoint = pos
-                self.repaint()
+                self.update()
         elif ev.button() == Qt.RightButton and self.editing():
             self.selectShapePoint(pos)
             self.prevPoint = pos
-            self.repaint()
+            self.update()
 
     def mouseReleaseEvent(self, ev):
         if ev.button() == Qt.RightButton:
@@ -228,7 +321,7 @@ class Canvas(QWidget):
                and self.selectedShapeCopy:
                 # Cancel the move by deleting the shadow copy.
                 self.selectedShapeCopy = None
-                self.repaint()
+                self.update()
         elif ev.button() == Qt.LeftButton and self.selectedShape:
             if self.selectedVertex():
                 self.overrideCursor(CURSOR_POINT)
@@ -246,11 +339,13 @@ class Canvas(QWidget):
         #del shape.line_color
         if copy:
             self.shapes.append(shape)
+            self.indexShape(shape)
             self.selectedShape.selected = False
             self.selectedShape = shape
-            self.repaint()
+            self.update()
         else:
             self.selectedShape.points = [p for p in shape.points]
+            self.reindexShape(self.selectedShape)
         self.selectedShapeCopy = None
 
     def hideBackroundShapes(self, value):
@@ -259,7 +354,7 @@ class Canvas(QWidget):
             # Only hide other shapes if there is a current selection.
             # Otherwise the user will not be able to select a shape.
             self.setHiding(True)
-            self.repaint()
+            self.update()
 
     def handleDrawing(self, pos):
         if self.current and self.current.reachMaxPoints() is False:
@@ -310,8 +405,8 @@ class Canvas(QWidget):
             shape.highlightVertex(index, shape.MOVE_VERTEX)
             self.selectShape(shape)
             return
-        for shape in reversed(self.shapes):
-            if self.isVisible(shape) and shape.containsPoint(point):
+        for shape in self.shapesAt(point):
+            if shape.containsPoint(point):
                 self.selectShape(shape)
                 self.calculateOffsets(shape, point)
                 return
@@ -369,6 +464,7 @@ class Canvas(QWidget):
             rshift = QPointF(0, shiftPos.y())
         shape.moveVertexBy(rindex, rshift)
         shape.moveVertexBy(lindex, lshift)
+        self.reindexShape(shape)
 
     def boundedMoveShape(self, shape, pos):
         if self.outOfPixmap(pos):
@@ -378,8 +474,8 @@ class Canvas(QWidget):
             pos -= QPointF(min(0, o1.x()), min(0, o1.y()))
         o2 = pos + self.offsets[1]
         if self.outOfPixmap(o2):
-            pos += QPointF(min(0, self.pixmap.width() - o2.x()),
-                           min(0, self.pixmap.height() - o2.y()))
+            pos += QPointF(min(0, self.imageSize.width() - o2.x()),
+                           min(0, self.imageSize.height() - o2.y()))
         # The next line tracks the new position of the cursor
         # relative to the shape, but also results in making it
         # a bit "shaky" when nearing the border and allows it to
@@ -388,6 +484,7 @@ class Canvas(QWidget):
         dp = pos - self.prevPoint
         if dp:
             shape.moveBy(dp)
+            self.reindexShape(shape)
             self.prevPoint = pos
             return True
         return False
@@ -404,15 +501,39 @@ class Canvas(QWidget):
         if self.selectedShape:
             shape = self.selectedShape
             self.shapes.remove(self.selectedShape)
+            self.shapeIndex.remove(shape)
             self.selectedShape = None
             self.update()
             return shape
 
+    def insertShape(self, index, shape):
+        """Put shape at index in paint order, or on top if index is None."""
+        if index is None:
+            self.shapes.append(shape)
+        else:
+            self.shapes.insert(index, shape)
+        self.indexShape(shape)
+        self.updateRects(self.shapeRect(shape))
+
+    def removeShape(self, shape, index=None):
+        """Take shape off the canvas; index, if known, spares searching for it."""
+        if shape is self.selectedShape:
+            self.deSelectShape()
+        if shape is self.hShape:
+            self.hShape, self.hVertex = None, None
+        if index is None:
+            self.shapes.remove(shape)
+        else:
+            del self.shapes[index]
+        self.shapeIndex.remove(shape)
+        self.updateRects(self.shapeRect(shape))
+
     def copySelectedShape(self):
         if self.selectedShape:
             shape = self.selectedShape.copy()
             self.deSelectShape()
             self.shapes.append(shape)
+            self.indexShape(shape)
             shape.selected = True
             self.selectedShape = shape
             self.boundedShiftShape(shape)
@@ -434,17 +555,40 @@ class Canvas(QWidget):
 
         p = self._painter
         p.begin(self)
+        # Only the exposed region is repainted; moves invalidate just the
+        # old and new bounds of what changed.
+        p.setClipRegion(event.region())
         p.setRenderHint(QPainter.Antialiasing)
-        p.setRenderHint(QPainter.HighQualityAntialiasing)
         p.setRenderHint(QPainter.SmoothPixmapTransform)
 
         p.scale(self.scale, self.scale)
         p.translate(self.offsetToCenter())
 
-        p.drawPixmap(0, 0, self.pixmap)
+        exposed = self.imageRect(event.rect())
+        # A little extra source keeps smooth scaling seamless at the edges
+        source = exposed.adjusted(-2, -2, 2, 2).toAlignedRect().intersected(QRect(QPoint(), self.imageSize))
+        level = self.pyramid.levelFor(self.scale) if self.pyramid is not None else 0
+        if self.isTiled():
+            # The preview serves until it is zoomed past
+            tiles = self.scale * self.proxyFactor() > 1.0
+        else:
+            tiles = level > 0
+        if source.isEmpty():
+            pass
+        elif tiles:
+            self.pyramid.paint(p, QRectF(source), level)
+        else:
+            draw = p.drawImage if isinstance(self.pixmap, QImage) else p.drawPixmap
+            draw(QRectF(source), self.pixmap, self.pixmapRect(source))
         Shape.scale = self.scale
+        margin = DIRTY_MARGIN / self.scale
         for shape in self.shapes:
             if (shape.selected or not self._hideBackround) and self.isVisible(shape):
+                # Padded by the pen and vertex markers, which also keeps a
+                # zero-width box from having an empty rect that intersects nothing
+                if shape.points and not exposed.intersects(
+                        shape.boundingRect().adjusted(-margin, -margin, margin, margin)):
+                    continue
                 shape.fill = shape.selected or shape == self.hShape
                 shape.paint(p)
         if self.current:
@@ -467,18 +611,8 @@ class Canvas(QWidget):
 
         if self.drawing() and not self.prevPoint.isNull() and not self.outOfPixmap(self.prevPoint):
             p.setPen(QColor(0, 0, 0))
-            p.drawLine(self.prevPoint.x(), 0, self.prevPoint.x(), self.pixmap.height())
-            p.drawLine(0, self.prevPoint.y(), self.pixmap.width(), self.prevPoint.y())
-
-        self.setAutoFillBackground(True)
-        if self.verified:
-            pal = self.palette()
-            pal.setColor(self.backgroundRole(), QColor(184, 239, 38, 128))
-            self.setPalette(pal)
-        else:
-            pal = self.palette()
-            pal.setColor(self.backgroundRole(), QColor(232, 232, 232, 255))
-            self.setPalette(pal)
+            p.drawLine(self.prevPoint.x(), 0, self.prevPoint.x(), self.imageSize.height())
+            p.drawLine(0, self.prevPoint.y(), self.imageSize.width(), self.prevPoint.y())
 
         p.end()
 
@@ -489,14 +623,14 @@ class Canvas(QWidget):
     def offsetToCenter(self):
         s = self.scale
         area = super(Canvas, self).size()
-        w, h = self.pixmap.width() * s, self.pixmap.height() * s
+        w, h = self.imageSize.width() * s, self.imageSize.height() * s
         aw, ah = area.width(), area.height()
         x = (aw - w) / (2 * s) if aw > w else 0
         y = (ah - h) / (2 * s) if ah > h else 0
         return QPointF(x, y)
 
     def outOfPixmap(self, p):
-        w, h = self.pixmap.width(), self.pixmap.height()
+        w, h = self.imageSize.width(), self.imageSize.height()
         return not (0 <= p.x() <= w and 0 <= p.y() <= h)
 
     def finalise(self):
@@ -509,6 +643,7 @@ class Canvas(QWidget):
 
         self.current.close()
         self.shapes.append(self.current)
+        self.indexShape(self.current)
         self.current = None
         self.setHiding(False)
         self.newShape.emit()
@@ -524,7 +659,7 @@ class Canvas(QWidget):
         # Cycle through each image edge in clockwise fashion,
         # and find the one intersecting the current line segment.
         # http://paulbourke.net/geometry/lineline2d/
-        size = self.pixmap.size()
+        size = self.imageSize
         points = [(0, 0),
                   (size.width(), 0),
                   (size.width(), size.height()),
@@ -575,7 +710,7 @@ class Canvas(QWidget):
 
     def minimumSizeHint(self):
         if self.pixmap:
-            return self.scale * self.pixmap.size()
+            return self.scale * self.imageSize
         return super(Canvas, self).minimumSizeHint()
 
     def wheelEvent(self, ev):
@@ -619,33 +754,14 @@ class Canvas(QWidget):
             self.moveOnePixel('Down')
 
     def moveOnePixel(self, direction):
-        # print(self.selectedShape.points)
-        if direction == 'Left' and not self.moveOutOfBound(QPointF(-1.0, 0)):
-            # print("move Left one pixel")
-            self.selectedShape.points[0] += QPointF(-1.0, 0)
-            self.selectedShape.points[1] += QPointF(-1.0, 0)
-            self.selectedShape.points[2] += QPointF(-1.0, 0)
-            self.selectedShape.points[3] += QPointF(-1.0, 0)
-        elif direction == 'Right' and not self.moveOutOfBound(QPointF(1.0, 0)):
-            # print("move Right one pixel")
-            self.selectedShape.points[0] += QPointF(1.0, 0)
-            self.selectedShape.points[1] += QPointF(1.0, 0)
-            self.selectedShape.points[2] += QPointF(1.0, 0)
-            self.selectedShape.points[3] += QPointF(1.0, 0)
-        elif direction == 'Up' and not self.moveOutOfBound(QPointF(0, -1.0)):
-            # print("move Up one pixel")
-            self.selectedShape.points[0] += QPointF(0, -1.0)
-            self.selectedShape.points[1] += QPointF(0, -1.0)
-            self.selectedShape.points[2] += QPointF(0, -1.0)
-            self.selectedShape.points[3] += QPointF(0, -1.0)
-        elif direction == 'Down' and not self.moveOutOfBound(QPointF(0, 1.0)):
-            # print("move Down one pixel")
-            self.selectedShape.points[0] += QPointF(0, 1.0)
-            self.selectedShape.points[1] += QPointF(0, 1.0)
-            self.selectedShape.points[2] += QPointF(0, 1.0)
-            self.selectedShape.points[3] += QPointF(0, 1.0)
+        step = {'Left': QPointF(-1.0, 0), 'Right': QPointF(1.0, 0),
+                'Up': QPointF(0, -1.0), 'Down': QPointF(0, 1.0)}[direction]
+        if not self.moveOutOfBound(step):
+            before = self.shapeRect(self.selectedShape)
+            self.selectedShape.moveBy(step)
+            self.reindexShape(self.selectedShape)
+            self.updateRects(before, self.shapeRect(self.selectedShape))
         self.shapeMoved.emit()
-        self.repaint()
 
     def moveOutOfBound(self, step):
         points = [p1+p2 for p1, p2 in zip(self.selectedShape.points, [step]*4)]
@@ -659,6 +775,7 @@ class Canvas(QWidget):
     def undoLastLine(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.shapeIndex.remove(self.current)
         self.current.setOpen()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -666,6 +783,7 @@ class Canvas(QWidget):
     def resetAllLines(self):
         assert self.shapes
         self.current = self.shapes.pop()
+        self.shapeIndex.remove(self.current)
         self.current.setOpen()
         self.line.points = [self.current[-1], self.current[0]]
         self.drawingPolygon.emit(True)
@@ -673,19 +791,99 @@ class Canvas(QWidget):
         self.drawingPolygon.emit(False)
         self.update()
 
-    def loadPixmap(self, pixmap):
-        self.pixmap = pixmap
+    def loadPixmap(self, pixmap, image=None, size=None, path=None):
+        """
+            Show pixmap, a QPixmap or a QImage. Passing the window's QImage
+            keeps a single copy of the pixels; image, the QImage of a QPixmap
+            if the caller has one, saves a conversion for large images. size
+            is the original image size when pixmap is a reduced proxy: shapes
+            stay in original pixel space and the proxy is stretched over it.
+            A proxy of a path tiledImageSize() accepts stays the preview for
+            good, and zooming in draws tiles decoded from the file.
+        """
+        self.setPixmap(pixmap, image, size, path)
         self.shapes = []
-        self.repaint()
+        self.shapeIndex.clear()
+        self.update()
+
+    def replacePixmap(self, pixmap, image=None):
+        """Swap a proxy for the full resolution pixmap, keeping the shapes."""
+        self.setPixmap(pixmap, image)
+        self.update()
+
+    def setPixmap(self, pixmap, image=None, size=None, path=None):
+        self.pixmap = pixmap
+        self.imageSize = QSize(size) if size is not None else pixmap.size()
+        self.dropPyramid()
+        if not pixmap:
+            return
+        if self.isProxy():
+            if path is None or tiledImageSize(path) != self.imageSize:
+                return
+            options = dict(path=path, size=self.imageSize)
+        elif pixmap.width() * pixmap.height() >= TILED_MIN_PIXELS:
+            options = {}
+        else:
+            return
+        if image is None:
+            image = pixmap if isinstance(pixmap, QImage) else pixmap.toImage()
+        self.pyramid = ImagePyramid(image, parent=self, **options)
+        self.pyramid.tileReady.connect(self.tileReady)
+
+    def isProxy(self):
+        return bool(self.pixmap) and self.pixmap.size() != self.imageSize
+
+    def isTiled(self):
+        """Whether the full size is read a tile at a time and never replaces the proxy."""
+        return self.pyramid is not None and self.pyramid.path is not None
+
+    def proxyFactor(self):
+        """Original image pixels per pixmap pixel."""
+        if not self.pixmap:
+            return 1.0
+        return max(self.imageSize.width() / float(self.pixmap.width()),
+                   self.imageSize.height() / float(self.pixmap.height()))
+
+    def pixmapRect(self, rect):
+        """Map an image-space rect onto the pixmap, which may be a proxy."""
+        rect = QRectF(rect)
+        if not self.isProxy():
+            return rect
+        sx = self.pixmap.width() / float(self.imageSize.width())
+        sy = self.pixmap.height() / float(self.imageSize.height())
+        return QRectF(rect.x() * sx, rect.y() * sy, rect.width() * sx, rect.height() * sy)
 
     def loadShapes(self, shapes):
         self.shapes = list(shapes)
+        self.reindexShapes()
         self.current = None
-        self.repaint()
+        self.update()
+
+    def dropPyramid(self):
+        if self.pyramid is not None:
+            self.pyramid.tileReady.disconnect(self.tileReady)
+            self.pyramid.cancel()
+            self.droppedPyramids.append(self.pyramid)
+            self.pyramid = None
+        # Their thread pools may only go once no task is running
+        for pyramid in [p for p in self.droppedPyramids if p.isIdle()]:
+            self.droppedPyramids.remove(pyramid)
+            pyramid.deleteLater()
+
+    def waitForPyramids(self):
+        """Drop the pyramid and wait for the tiles still being built."""
+        self.dropPyramid()
+        for pyramid in self.droppedPyramids:
+            pyramid.waitForDone()
+        self.dropPyramid()
+
+    def tileReady(self, level, tx, ty):
+        if self.pyramid is not None and self.pixmap and level == self.pyramid.levelFor(self.scale):
+            self.updateRects(self.pyramid.tileRect(level, tx, ty))
 
     def setShapeVisible(self, shape, value):
         self.visible[shape] = value
-        self.repaint()
+        self.update()
 
     def currentCursor(self):
         cursor = QApplication.overrideCursor()
@@ -706,4 +904,6 @@ class Canvas(QWidget):
     def resetState(self):
         self.restoreCursor()
         self.pixmap = None
+        self.imageSize = QSize()
+        self.dropPyramid()
         self.update()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Export a set of Pascal VOC XMLs as one COCO detection JSON file.
+
+Images and annotations are written to disk as they are parsed, so memory
+stays flat however many faces the set holds. Every annotation carries
+its face attributes as an "attributes" object keyed by XML tag, and the
+top-level "face_attributes" list names the value of each code.
+
+    python -m libs.cocoExport /data/labels faces.json --image-root /data
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+from collections import deque
+
+from libs.annotationCatalog import PARALLEL_THRESHOLD
+from libs.attributes import ATTRIBUTE_SCHEMA, ATTRIBUTE_TAGS
+from libs.headless import annotatedImagePath, findAnnotations
+from libs.imageProbe import imageShape
+from libs.pascal_voc_io import PascalVocReader
+from libs.workerPool import spawnPool
+
+# XMLs per pool task
+CHUNK_SIZE = 256
+# Chunks parsed ahead of the writer per worker; bounds memory with a pool
+PREFETCH = 2
+
+
+def renderChunk(start, xmlPaths, imageRoot=None):
+    """
+        Parse xmlPaths, the images numbered start + 1 onwards, into COCO JSON
+        text. Returns an (image JSON, [(label, annotation JSON tail)]) pair
+        per XML; the writer prefixes each tail with its id and category id.
+        Runs in worker processes.
+    """
+    rendered = []
+    for number, xmlPath in enumerate(xmlPaths, start + 1):
+        reader = PascalVocReader(xmlPath)
+        imagePath = annotatedImagePath(reader, xmlPath)
+        size = reader.imageSize or imageShape(imagePath) or [0, 0, 0]
+        fileName = os.path.relpath(imagePath, imageRoot) if imageRoot else imagePath
+        image = json.dumps({'id': number, 'file_name': fileName, 'height': size[0], 'width': size[1],
+                            'verified': reader.verified}, ensure_ascii=False)
+        faces = []
+        for label, points, _, _, codes in reader.getShapes():
+            (xmin, ymin), _, (xmax, ymax), _ = points
+            width, height = xmax - xmin, ymax - ymin
+            tail = json.dumps({'image_id': number, 'bbox': [xmin, ymin, width, height],
+                               'area': width * height, 'iscrowd': 0,
+                               'attributes': dict(zip(ATTRIBUTE_TAGS, codes))})
+            faces.append((label, tail[1:]))
+        rendered.append((image, faces))
+    return rendered
+
+
+def _renderChunks(xmlPaths, imageRoot, workers, chunkSize):
+    """Yield renderChunk() results in order, at most PREFETCH chunks per worker ahead."""
+    chunks = [(start, xmlPaths[start:start + chunkSize]) for start in range(0, len(xmlPaths), chunkSize)]
+    if workers <= 1 or len(chunks) < 2:
+        for start, chunk in chunks:
+            yield renderChunk(start, chunk, imageRoot)
+        return
+    with spawnPool(workers) as pool:
+        pending = deque()
+        for start, chunk in chunks:
+            pending.append(pool.submit(renderChunk, start, chunk, imageRoot))
+            if len(pending) >= workers * PREFETCH:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def exportCOCO(xmlPaths, outputPath, imageRoot=None, workers=None, chunkSize=CHUNK_SIZE):
+    """
+        Write the XMLs in xmlPaths (a list, or a directory to search) to
+        outputPath as COCO JSON, atomically. Image ids follow the order of
+        xmlPaths, categories are numbered as their labels first appear and
+        file names are made relative to imageRoot when given. Returns
+        (images, annotations) written.
+    """
+    if not isinstance(xmlPaths, (list, tuple)):
+        xmlPaths = findAnnotations(xmlPaths)
+    if workers is None:
+        workers = multiprocessing.cpu_count() if len(xmlPaths) >= PARALLEL_THRESHOLD else 0
+    directory, name = os.path.split(os.path.abspath(outputPath))
+    fd, tmpPath = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=directory)
+    # Annotations come after all images in the file, so they wait in a
+    # second temporary file until the images are written
+    annotationFile = tempfile.TemporaryFile('w+', encoding='utf-8', dir=directory)
+    categories = {}
+    imageCount = annotationCount = 0
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f, annotationFile:
+            f.write('{"info": {"description": "face boxes and attributes"},\n"images": [')
+            for rendered in _renderChunks(xmlPaths, imageRoot, workers, chunkSize):
+                for image, faces in rendered:
+                    f.write(',\n' if imageCount else '\n')
+                    f.write(image)
+                    imageCount += 1
+                    for label, tail in faces:
+                        category = categories.setdefault(label, len(categories) + 1)
+                        annotationFile.write(',\n' if annotationCount else '\n')
+                        annotationCount += 1
+                        annotationFile.write('{"id": %d, "category_id": %d, %s' % (annotationCount, category, tail))
+            f.write('\n],\n"annotations": [')
+            annotationFile.seek(0)
+            shutil.copyfileobj(annotationFile, f)
+            f.write('\n],\n"categories": %s,\n' % json.dumps(
+                [{'id': category, 'name': label} for label, category in categories.items()],
+                ensure_ascii=False))
+            f.write('"face_attributes": %s}\n' % json.dumps(
+                [{'name': tag, 'values': list(flags)} for tag, flags, _ in ATTRIBUTE_SCHEMA]))
+        os.replace(tmpPath, outputPath)
+    except BaseException:
+        try:
+            os.remove(tmpPath)
+        except OSError:
+            pass
+        raise
+    return imageCount, annotationCount
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export Pascal VOC face XMLs as COCO JSON.')
+    parser.add_argument('xmlDir', help='directory searched for XMLs')
+    parser.add_argument('output', help='COCO JSON file to write')
+    parser.add_argument('--image-root', help='write image file names relative to this directory')
+    parser.add_argument('--workers', type=int, help='parser processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+    images, annotations = exportCOCO(args.xmlDir, args.output, args.image_root, args.workers)
+    print('%d images, %d annotations written to %s' % (images, annotations, args.output))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -8,4 +8,9 @@ SETTING_FILL_COLOR = 'fill/color'
 SETTING_ADVANCE_MODE = 'advanced'
 SETTING_WIN_STATE = 'window/state'
 SETTING_SAVE_DIR = 'savedir'
-SETTING_LAST_OPEN_DIR = 'lastOpenDir'
\ No newline at end of file
+SETTING_LAST_OPEN_DIR = 'lastOpenDir'
+SETTING_PREFETCH_CACHE_MB = 'prefetch/cacheMB'
+SETTING_PROXY_LOADING = 'proxyLoading'
+SETTING_AUTO_ANNOTATE = 'autoAnnotate'
+SETTING_FACE_DETECTOR = 'faceDetector'
+SETTING_PROPAGATE = 'propagateFrames'
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Seed annotations from a detector's output, so annotators correct boxes
+instead of drawing every one.
+
+The dump is CSV with an "image,xmin,ymin,xmax,ymax,score" header (plus
+optional "label" and attribute tag columns) or JSON lines like
+{"image": ..., "box": [xmin, ymin, xmax, ymax], "score": ..., "label":
+..., "attributes": {"mask": 1, ...}}. It need not be sorted: lines are
+first spread over bucket files by image, then each bucket is merged into
+the XMLs on a process pool, so memory is bounded by the bucket size.
+
+    python -m libs.detectionImport detections.csv --save-dir labels/ --min-score 0.5
+"""
+import argparse
+import csv
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import zlib
+from collections import OrderedDict, namedtuple
+
+from libs.attributes import ATTRIBUTE_TAGS, defaultAttributes
+from libs.headless import Annotation, annotationPath, loadAnnotation, saveAnnotation
+from libs.workerPool import spawnPool
+
+# Detections overlapping a box of the same label at least this much are duplicates
+IOU_THRESHOLD = 0.5
+# Dump bytes per bucket; one bucket is held in memory at a time per worker
+BUCKET_BYTES = 64 * 1024 * 1024
+DEFAULT_LABEL = 'face'
+
+_TAG_INDEX = dict((tag, index) for index, tag in enumerate(ATTRIBUTE_TAGS))
+
+
+class ImportResult(namedtuple('ImportResult', 'images boxes duplicates verified failures')):
+    """
+    XMLs written, boxes added, detections dropped as duplicates, images
+    skipped because verified, and [(image path, error message)], where
+    malformed dump lines appear as "dump:line".
+    """
+    __slots__ = ()
+
+    def __add__(self, other):
+        return ImportResult(*(a + b for a, b in zip(self, other)))
+
+
+def boxIoU(a, b):
+    """Intersection over union of two (xmin, ymin, xmax, ymax) boxes."""
+    width = min(a[2], b[2]) - max(a[0], b[0])
+    height = min(a[3], b[3]) - max(a[1], b[1])
+    if width <= 0 or height <= 0:
+        return 0.0
+    overlap = float(width * height)
+    return overlap / ((a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - overlap)
+
+
+def _attributeCodes(values):
+    """Codes from a {tag: code} mapping or a list in ATTRIBUTE_TAGS order."""
+    if isinstance(values, dict):
+        codes = defaultAttributes()
+        for tag, code in values.items():
+            if tag in _TAG_INDEX and code not in (None, ''):
+                codes[_TAG_INDEX[tag]] = int(code)
+        return codes
+    return [int(code) for code in values]
+
+
+def readDetections(dumpPath, imageRoot=None, minScore=0.0, failures=None):
+    """
+        Yield (image path, label, box, score, attribute codes) from a CSV or
+        JSON lines dump, one line at a time. Relative image paths are taken
+        from imageRoot, by default the dump's directory. Malformed lines are
+        skipped; with failures, a list, each adds ("dump:line", error message).
+    """
+    imageRoot = imageRoot or os.path.dirname(os.path.abspath(dumpPath))
+    with io.open(dumpPath, encoding='utf-8', newline='') as f:
+        if dumpPath.lower().endswith('.csv'):
+            rows = csv.DictReader(f)
+            lines = ((rows.line_num, row) for row in rows)
+        else:
+            lines = ((number, line) for number, line in enumerate(f, 1) if line.strip())
+        for number, line in lines:
+            try:
+                if isinstance(line, dict):
+                    image, label, box, score, attributes = (
+                        line['image'], line.get('label'),
+                        [line['xmin'], line['ymin'], line['xmax'], line['ymax']], line.get('score'), line)
+                else:
+                    record = json.loads(line)
+                    image, label, box, score, attributes = (
+                        record['image'], record.get('label'), record['box'], record.get('score'),
+                        record.get('attributes') or {})
+                score = float(score) if score not in (None, '') else 1.0
+                if score < minScore:
+                    continue
+                detection = (os.path.join(imageRoot, image), label or DEFAULT_LABEL,
+                             [int(round(float(value))) for value in box], score, _attributeCodes(attributes))
+                if len(detection[2]) != 4:
+                    raise ValueError('box has %d values, not 4' % len(detection[2]))
+            except (KeyError, TypeError, ValueError) as e:
+                if failures is not None:
+                    failures.append(('%s:%d' % (dumpPath, number), 'malformed line: %s' % e))
+                continue
+            yield detection
+
+
+def partitionDetections(detections, directory, buckets):
+    """
+        Spread detections over buckets JSON lines files in directory by a
+        hash of the image path, so every image ends up in one bucket.
+        Returns the bucket paths that received lines.
+    """
+    paths = [os.path.join(directory, 'bucket%04d.jsonl' % i) for i in range(buckets)]
+    files = [None] * buckets
+    try:
+        for detection in detections:
+            bucket = zlib.crc32(detection[0].encode('utf-8')) % buckets
+            if files[bucket] is None:
+                files[bucket] = io.open(paths[bucket], 'w', encoding='utf-8')
+            files[bucket].write(json.dumps(detection, ensure_ascii=False) + u'\n')
+    finally:
+        for f in files:
+            if f is not None:
+                f.close()
+    return [path for path, f in zip(paths, files) if f is not None]
+
+
+def mergeDetections(annotation, detections, iouThreshold=IOU_THRESHOLD):
+    """
+        Add detections, highest score first, to annotation unless one
+        overlaps a face of the same label by iouThreshold. Returns the
+        number added.
+    """
+    added = 0
+    for label, box, score, attributes in sorted(detections, key=lambda detection: -detection[2]):
+        if any(face.label == label and boxIoU(face.box, box) >= iouThreshold for face in annotation.faces):
+            continue
+        annotation.addFace(label, box[0], box[1], box[2], box[3], attributes)
+        added += 1
+    return added
+
+
+def importBucket(bucketPath, saveDir=None, iouThreshold=IOU_THRESHOLD):
+    """Merge one bucket into its images' XMLs. Runs in worker processes."""
+    groups = OrderedDict()
+    with io.open(bucketPath, encoding='utf-8') as f:
+        for line in f:
+            imagePath, label, box, score, attributes = json.loads(line)
+            groups.setdefault(imagePath, []).append((label, box, score, attributes))
+    images = boxes = duplicates = verified = 0
+    failures = []
+    for imagePath, detections in groups.items():
+        xmlPath = annotationPath(imagePath, saveDir)
+        try:
+            if os.path.isfile(xmlPath):
+                annotation = loadAnnotation(xmlPath)
+                if annotation.verified:
+                    verified += 1
+                    continue
+                annotation.imagePath = imagePath
+            else:
+                annotation = Annotation(imagePath, xmlPath=xmlPath)
+            added = mergeDetections(annotation, detections, iouThreshold)
+            duplicates += len(detections) - added
+            if added:
+                saveAnnotation(annotation, xmlPath)
+                images += 1
+                boxes += added
+        except (IOError, OSError, ValueError) as e:
+            failures.append((imagePath, str(e)))
+    return ImportResult(images, boxes, duplicates, verified, failures)
+
+
+def importDetections(dumpPath, saveDir=None, imageRoot=None, minScore=0.0, iouThreshold=IOU_THRESHOLD,
+                     workers=None, bucketBytes=BUCKET_BYTES):
+    """
+        Merge the detections of dumpPath into the XMLs of their images,
+        in saveDir or next to each image. Verified XMLs are left alone.
+        Returns an ImportResult.
+    """
+    buckets = max(1, -(-os.path.getsize(dumpPath) // bucketBytes))
+    if workers is None:
+        workers = multiprocessing.cpu_count() if buckets > 1 else 0
+    if saveDir and not os.path.isdir(saveDir):
+        os.makedirs(saveDir)
+    tmp = tempfile.mkdtemp(prefix='.detections.', dir=saveDir or None)
+    malformed = []
+    try:
+        paths = partitionDetections(readDetections(dumpPath, imageRoot, minScore, malformed), tmp, buckets)
+        if workers <= 1 or len(paths) < 2:
+            results = [importBucket(path, saveDir, iouThreshold) for path in paths]
+        else:
+            with spawnPool(workers) as pool:
+                results = list(pool.map(importBucket, paths, [saveDir] * len(paths),
+                                        [iouThreshold] * len(paths)))
+    finally:
+        shutil.rmtree(tmp)
+    return sum(results, ImportResult(0, 0, 0, 0, malformed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Seed face XMLs from a CSV or JSON lines detection dump.')
+    parser.add_argument('dump', help='detections, .csv or JSON lines')
+    parser.add_argument('--save-dir', help='where the XMLs are kept (default: next to each image)')
+    parser.add_argument('--image-root', help='base of relative image paths (default: the dump directory)')
+    parser.add_argument('--min-score', type=float, default=0.0, help='drop detections scored below this')
+    parser.add_argument('--iou', type=float, default=IOU_THRESHOLD, help='overlap at which a box is a duplicate')
+    parser.add_argument('--workers', type=int, help='writer processes (default: one per CPU)')
+    args = parser.parse_args(argv)
+    result = importDetections(args.dump, args.save_dir, args.image_root, args.min_score, args.iou, args.workers)
+    for imagePath, message in result.failures:
+        print('skipped %s: %s' % (imagePath, message))
+    print('%d boxes added to %d XMLs, %d duplicates, %d verified images left alone, %d failed' % (
+        result.boxes, result.images, result.duplicates, result.verified, len(result.failures)))
+    return 1 if result.failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,536 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Append-only journal of annotation edits, so a crash loses nothing that
+was not saved yet.
+
+Each session appends JSON lines to its own file in JOURNAL_DIR, named
+after its start time, pid and a random part. An 'open' record snapshots
+the shapes of the image being annotated, then every edit appends the
+operations (create, move, resize, delete, label, attributes, verified)
+that turn the journaled shapes into the current ones. 'commit' marks an
+image's edits as written to its XML and 'discard' as thrown away. 'open'
+and 'commit' stamp the XML with its mtime and size, so a recovery can
+tell whether anything else wrote it since. Records are buffered; flush()
+hands them to the OS, and open(), leave(), compact() and close() flush
+on their own. compact() rewrites the file as one snapshot per image that
+still has unsaved edits. recoverSessions() replays the journals of
+sessions that did not close() cleanly, and rewriteSession() keeps what a
+recovery left out. If the journal cannot be written, editing goes on
+unjournaled and EditJournal.error tells why.
+"""
+import io
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+from libs.userDirectory import userDirectory
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Next to the annotation catalogs
+JOURNAL_DIR = userDirectory('journals')
+JOURNAL_EXT = '.journal'
+LOCK_EXT = '.lock'
+# The journal is rewritten once it grows past this
+COMPACT_BYTES = 1024 * 1024
+# How often the main window checkpoints the journal
+CHECKPOINT_INTERVAL_MS = 60 * 1000
+# How long the main window lets journaled edits sit in the write buffer
+FLUSH_INTERVAL_MS = 1000
+# Points moved by the same offset within this are journaled as a move
+MOVE_TOLERANCE = 1e-6
+
+
+def _tryLock(f):
+    """Take an exclusive lock on an open file without waiting for it."""
+    try:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    except (IOError, OSError):
+        return False
+    return True
+
+
+def fileStamp(path):
+    """[mtime, size] of a file, or None if there is none."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime, stat.st_size]
+
+
+def _points(shape):
+    return [[p.x(), p.y()] for p in shape.points]
+
+
+def _offset(old, new):
+    """The (dx, dy) moving every old point onto new, or None."""
+    if len(old) != len(new) or not old:
+        return None
+    dx, dy = new[0][0] - old[0][0], new[0][1] - old[0][1]
+    for (x1, y1), (x2, y2) in zip(old, new):
+        if abs(x2 - x1 - dx) > MOVE_TOLERANCE or abs(y2 - y1 - dy) > MOVE_TOLERANCE:
+            return None
+    return dx, dy
+
+
+class JournaledAnnotation(object):
+    """
+    The journaled state of one image: its shapes by id as [label, points,
+    attributes]. Ids grow in canvas order, as shapes are only added on top
+    or put back where they were. dirty is set while it has edits newer
+    than the last commit. xmlStamp is the fileStamp() of the XML as the
+    shapes were loaded from it or last saved to it.
+    """
+
+    def __init__(self, imagePath, xmlPath, verified=False, shapes=(), nextId=None, xmlStamp=None):
+        self.imagePath = imagePath
+        self.xmlPath = xmlPath
+        self.xmlStamp = xmlStamp
+        self.verified = verified
+        self.shapes = dict((sid, [label, points, list(attributes)])
+                           for sid, label, points, attributes in shapes)
+        self.nextId = nextId if nextId is not None else len(self.shapes)
+        self.dirty = False
+        self.seq = 0
+
+    @classmethod
+    def fromRecord(cls, record):
+        annotation = cls(record['image'], record['xml'], record['verified'], record['shapes'],
+                         record['next'], record.get('stamp'))
+        annotation.dirty = record.get('dirty', False)
+        annotation.seq = record['seq']
+        return annotation
+
+    def record(self, seq, dirty):
+        """The 'open' record recreating this state."""
+        return {'op': 'open', 'seq': seq, 'image': self.imagePath, 'xml': self.xmlPath,
+                'verified': self.verified, 'next': self.nextId, 'dirty': dirty, 'stamp': self.xmlStamp,
+                'shapes': [[sid] + self.shapes[sid] for sid in sorted(self.shapes)]}
+
+    def apply(self, record):
+        op = record['op']
+        if op == 'create':
+            self.shapes[record['id']] = [record['label'], record['points'], record['attributes']]
+            self.nextId = max(self.nextId, record['id'] + 1)
+        elif op == 'delete':
+            self.shapes.pop(record['id'], None)
+        elif op == 'verified':
+            self.verified = record['value']
+        else:
+            shape = self.shapes[record['id']]
+            if op == 'move':
+                dx, dy = record['dx'], record['dy']
+                shape[1] = [[x + dx, y + dy] for x, y in shape[1]]
+            elif op == 'resize':
+                shape[1] = record['points']
+            elif op == 'label':
+                shape[0] = record['label']
+            elif op == 'attributes':
+                shape[2] = record['attributes']
+        self.dirty = True
+        self.seq = record['seq']
+
+    def faces(self):
+        """[(label, points, attributes)] in canvas order."""
+        return [tuple(self.shapes[sid]) for sid in sorted(self.shapes)]
+
+    def xmlChanged(self):
+        """Whether the XML was written, created or removed since xmlStamp."""
+        return fileStamp(self.xmlPath) != self.xmlStamp
+
+
+def replay(records):
+    """
+        Fold journal records into the annotations left with unsaved edits,
+        in the order they were last touched.
+    """
+    annotations = OrderedDict()
+    current = None
+    for record in records:
+        op = record['op']
+        if op == 'open':
+            current = JournaledAnnotation.fromRecord(record)
+            annotations.pop(current.xmlPath, None)
+            annotations[current.xmlPath] = current
+        elif op == 'commit':
+            annotation = annotations.get(record['xml'])
+            if annotation is not None:
+                annotation.xmlStamp = record.get('stamp')
+                if annotation.seq <= record['seq']:
+                    annotation.dirty = False
+        elif op == 'discard':
+            annotation = annotations.get(record['xml'])
+            if annotation is not None:
+                annotation.dirty = False
+        elif current is not None:
+            current.apply(record)
+    return [annotation for annotation in annotations.values() if annotation.dirty]
+
+
+def readJournal(path):
+    """The records of a journal, up to a line torn by a crash."""
+    records = []
+    with io.open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+    return records
+
+
+def recoverSessions(directory=None):
+    """
+        Return [(journal path, annotations with unsaved edits)] for the
+        sessions in directory (JOURNAL_DIR by default) that ended without
+        close(). Pass each path to removeSession() once its edits are safe.
+    """
+    directory = directory or JOURNAL_DIR
+    if not os.path.isdir(directory):
+        return []
+    sessions = []
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(JOURNAL_EXT):
+            continue
+        path = os.path.join(directory, name)
+        lockPath = path[:-len(JOURNAL_EXT)] + LOCK_EXT
+        try:
+            if os.path.exists(lockPath):
+                # A live session holds the lock on its file
+                with open(lockPath, 'a') as lockFile:
+                    if not _tryLock(lockFile):
+                        continue
+            records = readJournal(path)
+        except (IOError, OSError):
+            # Unreadable: left for a later try
+            continue
+        sessions.append((path, replay(records)))
+    return sessions
+
+
+def rewriteSession(path, annotations):
+    """
+        Replace the journal of a crashed session with annotations alone, e.g.
+        the ones a recovery left out, or remove it if there are none.
+    """
+    if not annotations:
+        removeSession(path)
+        return
+    tmpPath = path + '.tmp'
+    with io.open(tmpPath, 'w', encoding='utf-8') as f:
+        f.write(u''.join(json.dumps(annotation.record(annotation.seq, True)) + '\n'
+                         for annotation in annotations))
+    os.replace(tmpPath, path)
+
+
+def removeSession(path):
+    for target in (path, path[:-len(JOURNAL_EXT)] + LOCK_EXT):
+        try:
+            os.remove(target)
+        except OSError:
+            pass
+
+
+class EditJournal(object):
+    """
+    The journal of this session. open() starts an image, record() journals
+    whatever changed in the shapes since the last call, commit() and
+    discard() settle an image's edits. Shapes are Shape-like objects with
+    label, attributes, points and a revision bumped on point changes.
+
+    Each shape has an id for as long as the image is open, and ids grow in
+    canvas order, so indexOf() finds a shape by bisection. record() returns
+    the ops it journaled along with the values they replaced, which is all
+    an undo step needs.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory or JOURNAL_DIR
+        # Never the name of an earlier session's journal that is still
+        # waiting to be recovered, even one of a process with the same pid
+        self.path = os.path.join(self.directory, '%s-%d-%s%s' % (
+            time.strftime('%Y%m%d-%H%M%S'), os.getpid(), uuid.uuid4().hex[:8], JOURNAL_EXT))
+        # The OSError that stopped journaling, if any
+        self.error = None
+        self.seq = 0
+        self.current = None
+        # Images opened earlier whose saves have not been committed yet
+        self._pending = {}
+        # shape -> id, id -> shape, and id -> shape revision last journaled
+        self._ids = {}
+        self._shapes = {}
+        self._revisions = {}
+        self._file = None
+        self._unflushed = False
+        self._lockFile = None
+        self._size = 0
+        self._compactedSeq = None
+
+    def open(self, imagePath, xmlPath, shapes, verified):
+        """Start journaling edits of imagePath, whose shapes are as on disk."""
+        self.flush()
+        self._setAside()
+        self._pending.pop(xmlPath, None)
+        self._ids = {}
+        self._shapes = {}
+        self._revisions = {}
+        faces = []
+        for sid, shape in enumerate(shapes):
+            self._ids[shape] = sid
+            self._shapes[sid] = shape
+            self._revisions[sid] = shape.revision
+            faces.append((sid, shape.label, _points(shape), shape.attributes))
+        self.current = JournaledAnnotation(imagePath, xmlPath, verified, faces,
+                                           xmlStamp=fileStamp(xmlPath))
+        self.seq += 1
+        self._write([self.current.record(self.seq, False)])
+
+    def leave(self):
+        """Stop journaling the open image, e.g. when it is closed."""
+        self.flush()
+        self._setAside()
+        self.current = None
+        self._ids = {}
+        self._shapes = {}
+        self._revisions = {}
+
+    def shapeOf(self, sid):
+        """The shape journaled under an id, or None."""
+        return self._shapes.get(sid)
+
+    def adopt(self, shape, sid):
+        """Journal a new shape under an id it had before, e.g. to redo its creation."""
+        self._ids[shape] = sid
+        self._shapes[sid] = shape
+
+    def indexOf(self, shapes, sid):
+        """
+            The index in shapes, in canvas order, of the shape journaled as
+            sid, or where it goes if it is not there. Shapes the journal has
+            no id for yet are on top.
+        """
+        ids = self._ids
+        low, high = 0, len(shapes)
+        while low < high:
+            middle = (low + high) // 2
+            other = ids.get(shapes[middle])
+            if other is not None and other < sid:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def record(self, shapes, verified, touched=None):
+        """
+            Journal how shapes, in canvas order, differ from the last record.
+            touched, if given, holds the only shapes that can have changed
+            or gone, and the others are not compared; new shapes, always
+            added on top, are found there. Then a record costs the size of
+            the edit, not of the image.
+
+            Returns the changes as [(op, before)]: before is the label,
+            points, attributes or verified flag the op replaced, and for a
+            delete the (label, points, attributes) of the shape.
+        """
+        current = self.current
+        if current is None:
+            return []
+        changes = []
+        if touched is None:
+            present = set(shapes)
+            gone = [shape for shape in self._ids if shape not in present]
+            live = shapes
+        else:
+            gone, live, seen = [], [], set()
+            for shape in touched:
+                sid = self._ids.get(shape)
+                if sid is None or shape in seen:
+                    continue
+                seen.add(shape)
+                index = self.indexOf(shapes, sid)
+                if index < len(shapes) and shapes[index] is shape:
+                    live.append(shape)
+                else:
+                    gone.append(shape)
+            start = len(shapes)
+            while start > 0 and shapes[start - 1] not in self._ids:
+                start -= 1
+            live.extend(shapes[start:])
+        for shape in gone:
+            sid = self._ids.get(shape)
+            if sid is not None:
+                del self._ids[shape]
+                del self._shapes[sid]
+                self._revisions.pop(sid, None)
+                if sid in current.shapes:
+                    changes.append(({'op': 'delete', 'id': sid}, tuple(current.shapes[sid])))
+                    self._apply(changes[-1][0])
+        for shape in live:
+            sid = self._ids.get(shape)
+            if sid is None or sid not in current.shapes:
+                if sid is None:
+                    sid = current.nextId
+                    self._ids[shape] = sid
+                    self._shapes[sid] = shape
+                self._revisions[sid] = shape.revision
+                op = {'op': 'create', 'id': sid, 'label': shape.label,
+                      'points': _points(shape), 'attributes': list(shape.attributes)}
+                changes.append((op, None))
+                # Applied right away so nextId moves on for the next new shape
+                self._apply(op)
+                continue
+            label, points, attributes = current.shapes[sid]
+            if shape.revision != self._revisions[sid]:
+                self._revisions[sid] = shape.revision
+                newPoints = _points(shape)
+                if newPoints != points:
+                    offset = _offset(points, newPoints)
+                    if offset is not None:
+                        op = {'op': 'move', 'id': sid, 'dx': offset[0], 'dy': offset[1]}
+                    else:
+                        op = {'op': 'resize', 'id': sid, 'points': newPoints}
+                    changes.append((op, points))
+                    self._apply(op)
+                    # Keep the canvas's exact coordinates, not the sums
+                    current.shapes[sid][1] = newPoints
+            if shape.label != label:
+                changes.append(({'op': 'label', 'id': sid, 'label': shape.label}, label))
+                self._apply(changes[-1][0])
+            if shape.attributes != attributes:
+                changes.append(({'op': 'attributes', 'id': sid, 'attributes': list(shape.attributes)},
+                                attributes))
+                self._apply(changes[-1][0])
+        if verified != current.verified:
+            changes.append(({'op': 'verified', 'value': verified}, current.verified))
+            self._apply(changes[-1][0])
+        if changes:
+            self._write([op for op, _ in changes])
+        return changes
+
+    def commit(self, xmlPath, seq):
+        """The edits of xmlPath up to seq are written to it."""
+        annotation = self.current if self.current is not None and self.current.xmlPath == xmlPath \
+            else self._pending.get(xmlPath)
+        if annotation is None:
+            return
+        # The save changed the XML: later edits are recovered over this one
+        annotation.xmlStamp = fileStamp(xmlPath)
+        if annotation.seq <= seq:
+            annotation.dirty = False
+            self._pending.pop(xmlPath, None)
+        self._write([{'op': 'commit', 'xml': xmlPath, 'seq': seq, 'stamp': annotation.xmlStamp}])
+        if self._size > COMPACT_BYTES:
+            self.compact()
+
+    def discard(self):
+        """Forget the unsaved edits of the open image."""
+        if self.current is None or not self.current.dirty:
+            return
+        self.current.dirty = False
+        self._write([{'op': 'discard', 'xml': self.current.xmlPath}])
+
+    def isDirty(self):
+        return bool(self._pending) or (self.current is not None and self.current.dirty)
+
+    def flush(self):
+        """Hand the buffered records to the OS, so a crash of the process keeps them."""
+        if self._file is None or not self._unflushed:
+            return
+        try:
+            self._file.flush()
+        except (IOError, OSError) as e:
+            self._fail(e)
+            return
+        self._unflushed = False
+
+    def compact(self):
+        """Rewrite the journal as one snapshot per image with unsaved edits."""
+        self.flush()
+        if self._file is None or self._compactedSeq == self.seq:
+            return
+        records = [annotation.record(annotation.seq, True) for annotation in self._pending.values()]
+        if self.current is not None:
+            records.append(self.current.record(self.seq, self.current.dirty))
+        data = ''.join(json.dumps(record) + '\n' for record in records)
+        tmpPath = self.path + '.tmp'
+        try:
+            with io.open(tmpPath, 'w', encoding='utf-8') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmpPath, self.path)
+            self._file = io.open(self.path, 'a', encoding='utf-8')
+        except (IOError, OSError) as e:
+            self._fail(e)
+            return
+        self._size = len(data)
+        self._compactedSeq = self.seq
+
+    def close(self):
+        """End the session cleanly: nothing is left to recover."""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except (IOError, OSError):
+                pass
+            self._file = None
+        if self._lockFile is not None:
+            self._lockFile.close()
+            self._lockFile = None
+            removeSession(self.path)
+
+    def _setAside(self):
+        if self.current is not None and self.current.dirty:
+            self._pending[self.current.xmlPath] = self.current
+
+    def _apply(self, op):
+        self.seq += 1
+        op['seq'] = self.seq
+        self.current.apply(op)
+
+    def _write(self, records):
+        if self._file is None:
+            if self.error is not None:
+                return
+            try:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                # The lock tells recoverSessions() in other processes we are alive
+                self._lockFile = open(self.path[:-len(JOURNAL_EXT)] + LOCK_EXT, 'a')
+                _tryLock(self._lockFile)
+                # Appended to, never truncated
+                self._file = io.open(self.path, 'a', encoding='utf-8')
+            except (IOError, OSError) as e:
+                self._fail(e)
+                return
+        data = ''.join(json.dumps(record) + '\n' for record in records)
+        try:
+            # Buffered: a drag journals a record per mouse move
+            self._file.write(data)
+        except (IOError, OSError) as e:
+            self._fail(e)
+            return
+        self._unflushed = True
+        self._size += len(data)
+
+    def _fail(self, error):
+        """Stop journaling, keeping whatever was written for recovery."""
+        self.error = error
+        if self._file is not None:
+            try:
+                self._file.close()
+            except (IOError, OSError):
+                pass
+            self._file = None
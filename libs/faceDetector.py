@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+CPU face detectors for pre-annotation, run in worker processes by
+PreAnnotator. Qt-free: the workers start from libs.workerPool, not from
+labelImg.py, and import this module alone.
+
+A detector is a picklable object whose detect(imagePath) returns a list
+of (xmin, ymin, xmax, ymax, score) boxes in image pixels. 'haar' uses the
+frontal face cascade bundled with OpenCV, which is optional: the module
+imports without it and detectorAvailable('haar') tells whether it is
+there. 'stub' needs nothing and is what the tests use.
+"""
+import os
+
+from libs.imageProbe import imageShape
+
+DEFAULT_DETECTOR = 'haar'
+# Niceness added to the workers, so detection yields the CPU to the GUI
+WORKER_NICENESS = 10
+
+DETECTORS = {}
+
+
+def registerDetector(detectorClass):
+    """Class decorator adding a detector to DETECTORS under its name."""
+    DETECTORS[detectorClass.name] = detectorClass
+    return detectorClass
+
+
+def detectorAvailable(name):
+    """Whether the detector is registered and its dependencies import."""
+    detectorClass = DETECTORS.get(name)
+    return detectorClass is not None and detectorClass.available()
+
+
+def getDetector(name, **options):
+    """An instance of the detector registered as name; ValueError if there is none."""
+    try:
+        detectorClass = DETECTORS[name]
+    except KeyError:
+        raise ValueError('Unknown face detector %r, expected one of %s' % (name, ', '.join(sorted(DETECTORS))))
+    return detectorClass(**options)
+
+
+@registerDetector
+class StubDetector(object):
+    """
+    Proposes boxes without looking at the pixels: the given ones, or a
+    square in the middle of the image a third of its shorter side wide.
+    """
+    name = 'stub'
+
+    def __init__(self, boxes=None):
+        self.boxes = boxes
+
+    @staticmethod
+    def available():
+        return True
+
+    def detect(self, imagePath):
+        if self.boxes is not None:
+            return [tuple(box) for box in self.boxes]
+        shape = imageShape(imagePath)
+        if shape is None:
+            return []
+        height, width = shape[0], shape[1]
+        side = min(height, width) // 3
+        x, y = (width - side) // 2, (height - side) // 2
+        return [(x, y, x + side, y + side, 1.0)]
+
+
+@registerDetector
+class HaarCascadeDetector(object):
+    """
+    OpenCV's bundled Haar cascade for frontal faces, run on a copy of the
+    image whose longer side is at most maxSide pixels.
+    """
+    name = 'haar'
+    cascadeFile = 'haarcascade_frontalface_default.xml'
+
+    def __init__(self, maxSide=800, minFace=24, scaleFactor=1.1, minNeighbors=5):
+        self.maxSide = maxSide
+        self.minFace = minFace
+        self.scaleFactor = scaleFactor
+        self.minNeighbors = minNeighbors
+        self._cascade = None
+
+    @staticmethod
+    def available():
+        try:
+            import cv2
+        except ImportError:
+            return False
+        return hasattr(cv2, 'CascadeClassifier') and hasattr(cv2, 'data')
+
+    def __getstate__(self):
+        # The loaded cascade is not picklable; each worker loads its own
+        state = dict(self.__dict__)
+        state['_cascade'] = None
+        return state
+
+    def detect(self, imagePath):
+        import cv2
+        if self._cascade is None:
+            self._cascade = cv2.CascadeClassifier(os.path.join(cv2.data.haarcascades, self.cascadeFile))
+        image = cv2.imread(imagePath, cv2.IMREAD_GRAYSCALE)
+        if image is None:
+            return []
+        scale = min(1.0, float(self.maxSide) / max(image.shape))
+        if scale < 1.0:
+            image = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        image = cv2.equalizeHist(image)
+        faces = self._cascade.detectMultiScale(image, scaleFactor=self.scaleFactor, minNeighbors=self.minNeighbors,
+                                               minSize=(self.minFace, self.minFace))
+        return [(int(x / scale), int(y / scale), int((x + w) / scale), int((y + h) / scale), 1.0)
+                for x, y, w, h in faces]
+
+
+def lowerPriority():
+    """Pool initializer: run the worker at a lower scheduling priority."""
+    try:
+        os.nice(WORKER_NICENESS)
+    except (AttributeError, OSError):
+        # No os.nice() on Windows
+        pass
+
+
+def fileStamp(path):
+    """(mtime, size) of path, or None if it is gone."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime, stat.st_size
+
+
+def detectFaces(detector, imagePath):
+    """
+        Return (imagePath, file stamp, boxes), the stamp telling which
+        version of the file the boxes are for. Runs in worker processes.
+    """
+    stamp = fileStamp(imagePath)
+    try:
+        boxes = detector.detect(imagePath)
+    except Exception:
+        # A detector failing on one image must not stop the others
+        boxes = []
+    return imagePath, stamp, boxes
@@ -0,0 +1,150 @@
+try:
+    from PyQt5.QtGui import QColor
+    from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QThread, pyqtSignal
+except ImportError:
+    from PyQt4.QtGui import QColor
+    from PyQt4.QtCore import Qt, QAbstractListModel, QModelIndex, QThread, pyqtSignal
+
+import sqlite3
+import time
+
+from libs.annotationCatalog import AnnotationCatalog, STATUS_ANNOTATED, STATUS_VERIFIED
+from libs.imageList import ImageList, iterImagePaths
+
+SCAN_BATCH_SIZE = 512
+SCAN_BATCH_INTERVAL = 0.1
+
+STATUS_COLORS = {
+    STATUS_ANNOTATED: QColor(0, 0, 192),
+    STATUS_VERIFIED: QColor(0, 128, 0),
+}
+
+
+class ImageScanner(QThread):
+    """
+    Walks a directory tree for images on a worker thread and emits the
+    paths in sorted batches. The first image is emitted on its own so the
+    window can show it while the rest of the tree is still being listed.
+    """
+    batchFound = pyqtSignal(list)
+
+    def __init__(self, folderPath, parent=None):
+        super(ImageScanner, self).__init__(parent)
+        self.folderPath = folderPath
+        self.count = 0
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def isCancelled(self):
+        return self._cancelled
+
+    def run(self):
+        batch = []
+        lastEmit = None
+        for path in iterImagePaths(self.folderPath, cancelled=self.isCancelled):
+            if self._cancelled:
+                return
+            batch.append(path)
+            now = time.time()
+            if (lastEmit is None or len(batch) >= SCAN_BATCH_SIZE
+                    or now - lastEmit >= SCAN_BATCH_INTERVAL):
+                self._emit(batch)
+                batch, lastEmit = [], now
+        if batch and not self._cancelled:
+            self._emit(batch)
+
+    def _emit(self, batch):
+        self.count += len(batch)
+        self.batchFound.emit(batch)
+
+
+class CatalogRefresher(QThread):
+    """
+    Brings the annotation catalog at catalogPath up to date with a list of
+    images on a worker thread, through its own connection. Database errors
+    are reported through failed instead of escaping the thread.
+    """
+    refreshed = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, catalogPath, imagePaths, saveDir=None, rebuild=False, parent=None):
+        super(CatalogRefresher, self).__init__(parent)
+        self.catalogPath = catalogPath
+        self.imagePaths = list(imagePaths)
+        self.saveDir = saveDir
+        self.rebuild = rebuild
+
+    def run(self):
+        try:
+            catalog = AnnotationCatalog(self.catalogPath)
+        except (sqlite3.Error, OSError) as e:
+            self.failed.emit(str(e))
+            return
+        try:
+            if self.rebuild:
+                catalog.rebuild(self.imagePaths, self.saveDir)
+            else:
+                catalog.refresh(self.imagePaths, self.saveDir)
+            statuses = catalog.statuses()
+        except sqlite3.Error as e:
+            # E.g. the database is locked by another instance
+            self.failed.emit(str(e))
+            return
+        finally:
+            catalog.close()
+        self.refreshed.emit(statuses)
+
+
+class FileListModel(QAbstractListModel):
+    """
+    Read-only list model over an ImageList, so the file dock only creates
+    the rows that are visible instead of one QListWidgetItem per image.
+    """
+
+    def __init__(self, images=None, parent=None):
+        super(FileListModel, self).__init__(parent)
+        self.images = images if images is not None else ImageList()
+        # image path -> annotation catalog status
+        self.statuses = {}
+
+    def setImageList(self, images):
+        self.beginResetModel()
+        self.images = images
+        self.statuses = {}
+        self.endResetModel()
+
+    def setStatuses(self, statuses):
+        self.statuses = statuses
+        if len(self.images):
+            self.dataChanged.emit(self.index(0), self.index(len(self.images) - 1))
+
+    def setStatus(self, path, status):
+        self.statuses[path] = status
+        if path in self.images:
+            index = self.index(self.images.index(path))
+            self.dataChanged.emit(index, index)
+
+    def appendPaths(self, paths):
+        if not paths:
+            return
+        first = len(self.images)
+        self.beginInsertRows(QModelIndex(), first, first + len(paths) - 1)
+        self.images.extend(paths)
+        self.endInsertRows()
+
+    def path(self, index):
+        return self.images.get(index.row()) if index.isValid() else None
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.images)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.path(index)
+        if role == Qt.ForegroundRole:
+            return STATUS_COLORS.get(self.statuses.get(self.path(index)))
+        return None
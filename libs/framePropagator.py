@@ -0,0 +1,168 @@
+try:
+    from PyQt5.QtGui import QImage, QImageReader
+    from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+except ImportError:
+    from PyQt4.QtGui import QImage, QImageReader
+    from PyQt4.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from libs.boxTracker import matchBoxes, propagateBoxes
+from libs.imagePrefetcher import imageBytes
+
+# Longer side of the frames the tracker sees
+FRAME_SIDE = 480
+# Decoded frames kept: the current one, the next and a spare
+FRAME_CACHE = 3
+# A tracked box this close to a proposed face takes the proposal's box
+PROPOSAL_IOU = 0.5
+
+
+def decodeGray(path, side=FRAME_SIDE):
+    """
+        Decode path as a grayscale array reduced to fit side, decoding the
+        reduced size directly like decodeProxy(). Returns the array and
+        its (x, y) scale from the full size, or (None, None).
+    """
+    reader = QImageReader(path)
+    reader.setDecideFormatFromContent(True)
+    size = reader.size()
+    if size.isValid() and (size.width() > side or size.height() > side):
+        reader.setScaledSize(size.scaled(side, side, Qt.KeepAspectRatio))
+    image = reader.read()
+    if image.isNull():
+        return None, None
+    fullWidth, fullHeight = (size.width(), size.height()) if size.isValid() else (image.width(), image.height())
+    scale = (image.width() / float(fullWidth), image.height() / float(fullHeight))
+    grayscale = getattr(QImage, 'Format_Grayscale8', None)
+    if grayscale is None:
+        # Qt < 5.5: average the channels of 32-bit pixels
+        image = image.convertToFormat(QImage.Format_RGB32)
+    else:
+        image = image.convertToFormat(grayscale)
+    bits = image.constBits()
+    bits.setsize(imageBytes(image))
+    rows = np.frombuffer(bits, np.uint8).reshape(image.height(), image.bytesPerLine())
+    if grayscale is None:
+        pixels = rows[:, :image.width() * 4].reshape(image.height(), image.width(), 4)
+        return pixels[:, :, :3].mean(axis=2).astype(np.uint8), scale
+    return rows[:, :image.width()].copy(), scale
+
+
+def facesKey(faces):
+    return tuple((label, tuple(box), tuple(attributes)) for label, box, attributes in faces)
+
+
+class PropagateTask(QRunnable):
+
+    def __init__(self, propagator, previousPath, currentPath, faces):
+        super(PropagateTask, self).__init__()
+        self.propagator = propagator
+        self.previousPath = previousPath
+        self.currentPath = currentPath
+        self.faces = faces
+
+    def run(self):
+        self.propagator._track(self.previousPath, self.currentPath, self.faces)
+
+
+class FramePropagator(QObject):
+    """
+    Carries the faces of a video frame over to the next one. prepare()
+    tracks them on a worker thread while the annotator is still on the
+    frame; propagate() then only looks the result up. If the faces changed
+    since, or tracking is not done yet, it returns None and tracked is
+    emitted once the worker has the result, so the GUI thread never waits
+    for the tracker. Tracking is NumPy work on small grayscale frames,
+    which releases the GIL for most of it.
+    """
+    # (previous path, current path) of a finished tracking task
+    tracked = pyqtSignal(str, str)
+
+    def __init__(self, parent=None):
+        super(FramePropagator, self).__init__(parent)
+        self._lock = threading.Lock()
+        self._frames = OrderedDict()
+        # (previous path, current path, faces key) -> tracked boxes, or
+        # None while a task is tracking them
+        self._results = OrderedDict()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+
+    def prepare(self, previousPath, currentPath, faces):
+        """Start tracking faces of previousPath into currentPath in the background."""
+        key = (previousPath, currentPath, facesKey(faces))
+        with self._lock:
+            if key in self._results:
+                return
+            self._results[key] = None
+            self._trim()
+        self._pool.start(PropagateTask(self, previousPath, currentPath, list(faces)))
+
+    def propagate(self, previousPath, currentPath, faces, proposals=()):
+        """
+            The faces [(label, box, attributes)] of previousPath as found in
+            currentPath. A face whose tracked box overlaps one of the
+            proposals (boxes) by PROPOSAL_IOU takes that box. Empty if a
+            frame cannot be decoded. None if they are not tracked yet:
+            tracking is started, if it is not running, and tracked tells
+            when to ask again.
+        """
+        key = (previousPath, currentPath, facesKey(faces))
+        with self._lock:
+            result = self._results.get(key)
+        if result is None:
+            self.prepare(previousPath, currentPath, faces)
+            return None
+        if not result:
+            return []
+        boxes = list(result)
+        for i, j in matchBoxes(boxes, [box[:4] for box in proposals], PROPOSAL_IOU).items():
+            boxes[i] = tuple(int(value) for value in proposals[j][:4])
+        return [(label, box, list(attributes)) for (label, _, attributes), box in zip(faces, boxes)]
+
+    def frame(self, path):
+        """The decoded (array, scale) of path, from the cache when it is there."""
+        with self._lock:
+            frame = self._frames.get(path)
+            if frame is not None:
+                self._frames.move_to_end(path)
+                return frame
+        frame = decodeGray(path)
+        if frame[0] is None:
+            return frame
+        with self._lock:
+            self._frames[path] = frame
+            while len(self._frames) > FRAME_CACHE:
+                self._frames.popitem(last=False)
+        return frame
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._results.clear()
+
+    def waitForDone(self):
+        self._pool.waitForDone()
+
+    def _track(self, previousPath, currentPath, faces):
+        key = (previousPath, currentPath, facesKey(faces))
+        previous, previousScale = self.frame(previousPath)
+        current, currentScale = self.frame(currentPath)
+        boxes = []
+        if previous is not None and current is not None:
+            boxes = propagateBoxes([box for _, box, _ in faces], previous, previousScale, current, currentScale)
+        with self._lock:
+            if key not in self._results:
+                # Trimmed or cleared meanwhile: of no use any more
+                return
+            self._results[key] = boxes
+        self.tracked.emit(previousPath, currentPath)
+
+    def _trim(self):
+        # Only the latest positions are of use
+        while len(self._results) > 2:
+            self._results.popitem(last=False)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Load, save and iterate face annotations without Qt, for batch jobs on
+machines without a display. Importing this module pulls in neither PyQt
+nor lxml; reading an XML loads lxml on first use.
+
+    from libs.headless import iterAnnotations, saveAnnotation
+
+    for annotation in iterAnnotations('/data/labels'):
+        for face in annotation.faces:
+            print(face.label, face.box, face.attribute('mask'))
+        saveAnnotation(annotation)
+"""
+import os
+from collections import namedtuple
+
+from libs.attributes import ATTRIBUTE_TAGS, defaultAttributes, normalizeAttributes
+from libs.imageProbe import imageShape
+from libs.pascal_voc_io import PascalVocReader, PascalVocWriter, XML_EXT
+
+_TAG_INDEX = dict((tag, index) for index, tag in enumerate(ATTRIBUTE_TAGS))
+
+
+class Face(namedtuple('Face', 'label xmin ymin xmax ymax attributes')):
+    """One face box; attributes holds a code per ATTRIBUTE_TAGS entry."""
+    __slots__ = ()
+
+    @property
+    def box(self):
+        return self.xmin, self.ymin, self.xmax, self.ymax
+
+    def attribute(self, tag):
+        """The code of an attribute by its XML tag, e.g. 'mask'."""
+        return self.attributes[_TAG_INDEX[tag]]
+
+    def namedAttributes(self):
+        return dict(zip(ATTRIBUTE_TAGS, self.attributes))
+
+
+class Annotation(object):
+    """
+    The faces of one image as stored in its Pascal VOC XML. size is
+    [height, width, depth], or None to read it from the image on save.
+    """
+
+    def __init__(self, imagePath, faces=None, size=None, verified=False, xmlPath=None):
+        self.imagePath = imagePath
+        self.faces = list(faces) if faces is not None else []
+        self.size = size
+        self.verified = verified
+        self.xmlPath = xmlPath
+
+    def addFace(self, label, xmin, ymin, xmax, ymax, attributes=None):
+        attributes = normalizeAttributes(attributes) if attributes is not None else defaultAttributes()
+        face = Face(label, xmin, ymin, xmax, ymax, attributes)
+        self.faces.append(face)
+        return face
+
+    def __repr__(self):
+        return 'Annotation(%r, %d faces%s)' % (self.imagePath, len(self.faces),
+                                               ', verified' if self.verified else '')
+
+
+def annotationPath(imagePath, saveDir=None):
+    """Where the GUI keeps the XML of imagePath: next to it, or in saveDir."""
+    name = os.path.splitext(os.path.basename(imagePath))[0] + XML_EXT
+    return os.path.join(saveDir if saveDir else os.path.dirname(imagePath), name)
+
+
+def annotatedImagePath(reader, xmlPath):
+    """
+        The image a PascalVocReader of xmlPath describes: the path it
+        records, else its file name next to the XML, where images usually are.
+    """
+    return reader.localImgPath or os.path.join(os.path.dirname(xmlPath), reader.filename or '')
+
+
+def findAnnotations(directory, recursive=True, isAnnotation=None):
+    """
+        The XML files in directory and, if recursive, below it, in name
+        order. isAnnotation(name), if given, picks the files instead.
+    """
+    found = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        found.extend(os.path.join(root, name) for name in sorted(files)
+                     if (isAnnotation(name) if isAnnotation is not None else name.lower().endswith(XML_EXT)))
+        if not recursive:
+            break
+    return found
+
+
+def loadAnnotation(xmlPath):
+    """Read an annotation; IOError if xmlPath does not exist."""
+    if not os.path.isfile(xmlPath):
+        raise IOError('No such annotation: %s' % xmlPath)
+    reader = PascalVocReader(xmlPath)
+    imagePath = annotatedImagePath(reader, xmlPath)
+    faces = [Face(label, points[0][0], points[0][1], points[2][0], points[2][1], list(attributes))
+             for label, points, _, _, attributes in reader.getShapes()]
+    return Annotation(imagePath, faces, reader.imageSize, reader.verified, xmlPath)
+
+
+def saveAnnotation(annotation, xmlPath=None):
+    """
+        Write an annotation atomically to xmlPath, its own xmlPath, or the
+        XML next to its image. Returns the path written.
+    """
+    xmlPath = xmlPath or annotation.xmlPath or annotationPath(annotation.imagePath)
+    size = annotation.size or imageShape(annotation.imagePath)
+    if size is None:
+        raise ValueError('Cannot read the size of %s' % annotation.imagePath)
+    imagePath = annotation.imagePath
+    writer = PascalVocWriter(os.path.basename(os.path.dirname(imagePath)), os.path.basename(imagePath),
+                             size, localImgPath=imagePath)
+    writer.verified = annotation.verified
+    for face in annotation.faces:
+        writer.addBndBox(face.xmin, face.ymin, face.xmax, face.ymax, face.label, face.attributes)
+    writer.save(targetFile=xmlPath)
+    annotation.xmlPath = xmlPath
+    return xmlPath
+
+
+def iterAnnotations(directory, recursive=False):
+    """Yield the annotation of every XML in directory, in name order."""
+    for xmlPath in findAnnotations(directory, recursive):
+        yield loadAnnotation(xmlPath)
@@ -0,0 +1,139 @@
+import os
+
+IMAGE_EXTENSIONS = ('.jpeg', '.jpg', '.png', '.bmp')
+
+
+def iterImagePaths(folderPath, extensions=IMAGE_EXTENSIONS, cancelled=None):
+    """
+    Yield the absolute paths of all images under folderPath with os.scandir,
+    already in case-insensitive path order, so callers can show results as
+    they stream in instead of sorting the whole tree first.
+    cancelled() is polled before each directory is listed.
+    """
+    def isDir(entry):
+        # Like os.walk, symlinked directories are not descended into, so
+        # a link back up the tree cannot loop
+        try:
+            return entry.is_dir(follow_symlinks=False)
+        except OSError:
+            return False
+
+    def sortKey(entry):
+        # Order entries by how their full path compares: a directory
+        # sorts as 'name/', so 'b.jpg' comes before 'b/c.jpg'.
+        return (entry.name + '/' if isDir(entry) else entry.name).lower()
+
+    # Stack of pending entry lists, each reversed so pop() yields in order
+    stack = [[os.path.abspath(folderPath)]]
+    root = True
+    while stack:
+        entries = stack[-1]
+        if not entries:
+            stack.pop()
+            continue
+        entry = entries.pop()
+        if root:
+            path, root = entry, False
+        elif isDir(entry):
+            path = entry.path
+        else:
+            if entry.name.lower().endswith(extensions):
+                yield entry.path
+            continue
+        if cancelled is not None and cancelled():
+            return
+        try:
+            children = sorted(os.scandir(path), key=sortKey, reverse=True)
+        except OSError:
+            continue
+        stack.append(children)
+
+
+class ImageList(object):
+    """
+    Ordered list of image paths with O(1) path -> position lookups.
+
+    It stands in for the plain list MainWindow.mImgList used to be:
+    indexing, slicing, len(), iteration, `in` and index() behave like a
+    list, but `in` and index() no longer scan. Reordering goes through
+    sort()/filter()/setPaths(), which rebuild the position index.
+    """
+
+    def __init__(self, paths=()):
+        self.setPaths(paths)
+
+    def setPaths(self, paths):
+        self._paths = list(paths)
+        self._reindex()
+
+    def _reindex(self):
+        positions = {}
+        for i, path in enumerate(self._paths):
+            # Keep the first position of a duplicate, like list.index
+            positions.setdefault(path, i)
+        self._positions = positions
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __getitem__(self, key):
+        return self._paths[key]
+
+    def __contains__(self, path):
+        return path in self._positions
+
+    def __eq__(self, other):
+        if isinstance(other, ImageList):
+            other = other._paths
+        return self._paths == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return 'ImageList(%d images)' % len(self._paths)
+
+    def index(self, path):
+        try:
+            return self._positions[path]
+        except KeyError:
+            raise ValueError('%r is not in image list' % (path,))
+
+    def get(self, index, default=None):
+        if 0 <= index < len(self._paths):
+            return self._paths[index]
+        return default
+
+    def nextPath(self, path):
+        """Return the path after `path`, or None at the end or if unknown."""
+        index = self._positions.get(path)
+        if index is None:
+            return None
+        return self.get(index + 1)
+
+    def prevPath(self, path):
+        """Return the path before `path`, or None at the start or if unknown."""
+        index = self._positions.get(path)
+        if index is None:
+            return None
+        return self.get(index - 1)
+
+    def append(self, path):
+        self._positions.setdefault(path, len(self._paths))
+        self._paths.append(path)
+
+    def extend(self, paths):
+        for path in paths:
+            self.append(path)
+
+    def sort(self, key=None, reverse=False):
+        self._paths.sort(key=key, reverse=reverse)
+        self._reindex()
+
+    def filter(self, predicate):
+        """Keep only the paths for which predicate(path) is true."""
+        self._paths = [path for path in self._paths if predicate(path)]
+        self._reindex()
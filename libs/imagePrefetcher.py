@@ -0,0 +1,190 @@
+try:
+    from PyQt5.QtGui import QImage, QImageIOHandler, QImageReader
+    from PyQt5.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+except ImportError:
+    from PyQt4.QtGui import QImage, QImageIOHandler, QImageReader
+    from PyQt4.QtCore import Qt, QObject, QRunnable, QThreadPool, pyqtSignal
+
+from collections import OrderedDict
+
+DEFAULT_CACHE_MB = 512
+DEFAULT_AHEAD = 3
+DEFAULT_BEHIND = 1
+# From this many pixels on, images are drawn from a tile pyramid, and
+# those tiledImageSize() accepts are never decoded whole
+TILED_MIN_PIXELS = 16 * 1000 * 1000
+
+
+def imageBytes(image):
+    try:
+        return image.sizeInBytes()
+    except AttributeError:
+        # Qt < 5.10
+        return image.byteCount()
+
+
+def paintableImage(image):
+    """
+        Convert image to a format QPainter draws without converting, so the
+        Canvas can draw it directly instead of from a QPixmap copy.
+    """
+    if image.isNull() or image.format() in (QImage.Format_RGB32, QImage.Format_ARGB32_Premultiplied):
+        return image
+    target = QImage.Format_ARGB32_Premultiplied if image.hasAlphaChannel() else QImage.Format_RGB32
+    if hasattr(image, 'convertTo'):
+        # Qt >= 5.13: between formats of the same depth this reuses the
+        # buffer instead of holding two copies at the peak
+        image.convertTo(target)
+        return image
+    return image.convertToFormat(target)
+
+
+def decodeImage(path):
+    """Decode an image file, sniffing the format like QImage.fromData does.
+
+    QImageReader.read() releases the GIL while decoding, QImage.fromData()
+    does not, so only the former actually runs beside the GUI thread. The
+    reader streams the file, so its encoded bytes are never held whole.
+    """
+    reader = QImageReader(path)
+    reader.setDecideFormatFromContent(True)
+    return paintableImage(reader.read())
+
+
+def decodeProxy(path, maxSize):
+    """
+        Decode an image reduced to fit maxSize, or whole if it already fits
+        or its size cannot be read from the header. Returns the image and
+        the original QSize. JPEGs are reduced during the DCT, so most of the
+        full size decode is skipped.
+    """
+    reader = QImageReader(path)
+    reader.setDecideFormatFromContent(True)
+    size = reader.size()
+    if size.isValid() and (size.width() > maxSize.width() or size.height() > maxSize.height()):
+        reader.setScaledSize(size.scaled(maxSize, Qt.KeepAspectRatio))
+    return paintableImage(reader.read()), size
+
+
+def tiledImageSize(path):
+    """
+        The full QSize of path if it has at least TILED_MIN_PIXELS and its
+        format decodes a clip rect at a reduced size, like JPEG, so tiles
+        can be read straight from the file. None otherwise.
+    """
+    reader = QImageReader(path)
+    reader.setDecideFormatFromContent(True)
+    size = reader.size()
+    if not size.isValid() or size.width() * size.height() < TILED_MIN_PIXELS:
+        return None
+    if not (reader.supportsOption(QImageIOHandler.ClipRect) and
+            reader.supportsOption(QImageIOHandler.ScaledSize)):
+        return None
+    return size
+
+
+class DecodeTask(QRunnable):
+
+    def __init__(self, prefetcher, path):
+        super(DecodeTask, self).__init__()
+        self.prefetcher = prefetcher
+        self.path = path
+
+    def run(self):
+        # Skip paths the annotator has navigated away from since queueing,
+        # and images the canvas reads a tile at a time
+        if self.path not in self.prefetcher.wanted or tiledImageSize(self.path) is not None:
+            self.prefetcher.decoded.emit(self.path, QImage())
+            return
+        self.prefetcher.decoded.emit(self.path, decodeImage(self.path))
+
+
+class ImagePrefetcher(QObject):
+    """
+    Decodes the neighbours of the current image on a worker pool and keeps
+    them in an LRU cache bounded to cacheMB megabytes of decoded pixels.
+    All bookkeeping happens on the GUI thread; workers only decode.
+    Images tiledImageSize() accepts are left out: they are never decoded
+    at full size.
+    """
+    decoded = pyqtSignal(str, QImage)
+
+    def __init__(self, cacheMB=DEFAULT_CACHE_MB, ahead=DEFAULT_AHEAD, behind=DEFAULT_BEHIND,
+                 parent=None):
+        super(ImagePrefetcher, self).__init__(parent)
+        self.cacheBytes = int(cacheMB * 1024 * 1024)
+        self.ahead = ahead
+        self.behind = behind
+        self.hits = 0
+        self.misses = 0
+        self.wanted = frozenset()
+        self._cache = OrderedDict()
+        self._cachedBytes = 0
+        self._pending = set()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self.decoded.connect(self._store)
+
+    def get(self, path):
+        """Return the cached QImage for path, or None on a miss."""
+        image = self._cache.get(path)
+        if image is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._cache.move_to_end(path)
+        return image
+
+    def put(self, path, image):
+        """Cache an image decoded elsewhere, e.g. on a miss."""
+        self.wanted = self.wanted | frozenset((path,))
+        self._store(path, image)
+
+    def prefetch(self, paths, index):
+        """Queue decoding of the images around paths[index].
+
+        Queued work for images outside the new window is dropped, so a
+        jump in the file list cancels the prefetches of the old position.
+        """
+        start = max(0, index - self.behind)
+        stop = min(len(paths), index + self.ahead + 1)
+        self.wanted = frozenset(paths[i] for i in range(start, stop))
+        # Nearest neighbours first, next before previous
+        order = sorted(range(start, stop), key=lambda i: i - index if i >= index else index - i + 0.5)
+        for path in (paths[i] for i in order):
+            if path in self._cache or path in self._pending:
+                continue
+            self._pending.add(path)
+            self._pool.start(DecodeTask(self, path))
+
+    def request(self, path):
+        """Queue decoding of one image, e.g. the full size of a proxy."""
+        self.wanted = self.wanted | frozenset((path,))
+        if path not in self._cache and path not in self._pending:
+            self._pending.add(path)
+            self._pool.start(DecodeTask(self, path))
+
+    def clear(self):
+        self.wanted = frozenset()
+        self._cache.clear()
+        self._cachedBytes = 0
+
+    def waitForDone(self):
+        self._pool.waitForDone()
+
+    def stats(self):
+        return dict(hits=self.hits, misses=self.misses, images=len(self._cache),
+                    megabytes=self._cachedBytes / (1024.0 * 1024.0))
+
+    def _store(self, path, image):
+        self._pending.discard(path)
+        if image.isNull() or path not in self.wanted or path in self._cache:
+            return
+        size = imageBytes(image)
+        if size > self.cacheBytes:
+            return
+        self._cache[path] = image
+        self._cachedBytes += size
+        while self._cachedBytes > self.cacheBytes:
+            _, evicted = self._cache.popitem(last=False)
+            self._cachedBytes -= imageBytes(evicted)
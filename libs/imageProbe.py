@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Read image dimensions from JPEG/PNG/BMP headers without decoding pixels.
+
+probeImageShape() returns [height, width, depth] in the layout
+PascalVocWriter expects, where depth is 1 for grayscale images
+(single-channel JPEG/PNG or a gray palette) and 3 otherwise. Unlike
+QImage.isGrayscale() it does not scan the pixels of RGB images.
+"""
+import os
+import struct
+from collections import OrderedDict
+
+# JPEG start-of-frame markers, i.e. everything in C0-CF except DHT, JPG and DAC
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - frozenset((0xC4, 0xC8, 0xCC))
+# Markers without a length field
+_STANDALONE_MARKERS = frozenset(range(0xD0, 0xDA)) | frozenset((0x01,))
+
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+
+# path -> ((mtime, size), shape), least recently used first
+_shapeCache = OrderedDict()
+SHAPE_CACHE_SIZE = 65536
+
+
+def _isGrayPalette(data, entrySize):
+    for i in range(0, len(data) - entrySize + 1, entrySize):
+        if not data[i] == data[i + 1] == data[i + 2]:
+            return False
+    return True
+
+
+def _probeJPEG(f):
+    f.seek(2)
+    while True:
+        byte = f.read(1)
+        if not byte:
+            return None
+        if byte != b'\xff':
+            continue
+        marker = ord(f.read(1) or b'\x00')
+        while marker == 0xFF:
+            # Fill bytes before a marker
+            marker = ord(f.read(1) or b'\x00')
+        if marker == 0x00 or marker in _STANDALONE_MARKERS:
+            continue
+        if marker == 0xD9:
+            return None
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        length = struct.unpack('>H', header)[0]
+        if marker in _SOF_MARKERS:
+            frame = f.read(6)
+            if len(frame) < 6:
+                return None
+            _, height, width, components = struct.unpack('>BHHB', frame)
+            return [height, width, 1 if components == 1 else 3]
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def _probePNG(f):
+    f.seek(8)
+    header = f.read(25)
+    if len(header) < 25 or header[4:8] != b'IHDR':
+        return None
+    width, height, _, colorType = struct.unpack('>IIBB', header[8:18])
+    if colorType in (0, 4):
+        return [height, width, 1]
+    if colorType != 3:
+        return [height, width, 3]
+    # Palette image: grayscale when every PLTE entry is gray
+    while True:
+        chunk = f.read(8)
+        if len(chunk) < 8:
+            return [height, width, 3]
+        length, kind = struct.unpack('>I4s', chunk)
+        if kind == b'PLTE':
+            gray = _isGrayPalette(bytearray(f.read(length)), 3)
+            return [height, width, 1 if gray else 3]
+        if kind == b'IDAT':
+            return [height, width, 3]
+        f.seek(length + 4, os.SEEK_CUR)
+
+
+def _probeBMP(f):
+    f.seek(14)
+    headerSize = struct.unpack('<I', f.read(4))[0]
+    if headerSize == 12:
+        width, height, _, bpp = struct.unpack('<hhHH', f.read(8))
+        colors, entrySize = 0, 3
+    else:
+        width, height, _, bpp, _, _, _, _, colors = struct.unpack('<iiHHIIiiI', f.read(32))
+        entrySize = 4
+    height = abs(height)  # negative for top-down bitmaps
+    if bpp > 8:
+        return [height, width, 3]
+    f.seek(14 + headerSize)
+    palette = bytearray(f.read((colors or 1 << bpp) * entrySize))
+    return [height, width, 1 if _isGrayPalette(palette, entrySize) else 3]
+
+
+def probeImageShape(path):
+    """
+        Return [height, width, depth] read from the file header,
+        or None when the format is not recognized.
+    """
+    try:
+        with open(path, 'rb') as f:
+            magic = f.read(8)
+            if magic[:2] == b'\xff\xd8':
+                return _probeJPEG(f)
+            if magic == _PNG_SIGNATURE:
+                return _probePNG(f)
+            if magic[:2] == b'BM':
+                return _probeBMP(f)
+    except (IOError, OSError, struct.error, TypeError):
+        pass
+    return None
+
+
+def imageShape(path):
+    """
+        Cached probeImageShape(), refreshed when the file's mtime or size changes
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    key = (stat.st_mtime, stat.st_size)
+    cached = _shapeCache.get(path)
+    if cached is not None and cached[0] == key:
+        _shapeCache.move_to_end(path)
+        return list(cached[1])
+    shape = probeImageShape(path)
+    if shape is not None:
+        _shapeCache[path] = (key, shape)
+        _shapeCache.move_to_end(path)
+        if len(_shapeCache) > SHAPE_CACHE_SIZE:
+            _shapeCache.popitem(last=False)
+        shape = list(shape)
+    return shape
@@ -0,0 +1,285 @@
+try:
+    from PyQt5.QtGui import QImage, QImageReader, QPainter
+    from PyQt5.QtCore import Qt, QObject, QRect, QRectF, QRunnable, QSize, QThreadPool, pyqtSignal
+except ImportError:
+    from PyQt4.QtGui import QImage, QImageReader, QPainter
+    from PyQt4.QtCore import Qt, QObject, QRect, QRectF, QRunnable, QSize, QThreadPool, pyqtSignal
+
+import threading
+from collections import OrderedDict
+from math import floor, log
+
+from libs.imagePrefetcher import imageBytes
+
+TILE_SIZE = 512
+DEFAULT_TILE_CACHE_MB = 256
+
+
+def _ceilDiv(a, b):
+    return -(-a // b)
+
+
+class TileTask(QRunnable):
+
+    def __init__(self, pyramid, key):
+        super(TileTask, self).__init__()
+        self.pyramid = pyramid
+        self.key = key
+
+    def run(self):
+        level, tx, ty = self.key
+        if self.pyramid.renderTile(level, tx, ty) is None:
+            return
+        if self.pyramid.path is None:
+            self.pyramid.tileReady.emit(level, tx, ty)
+        else:
+            # The rest of the row was read with it
+            for tx in range(self.pyramid.gridSize(level)[0]):
+                self.pyramid.tileReady.emit(level, tx, ty)
+
+
+class ImagePyramid(QObject):
+    """
+    Power-of-two reduced copies of a large image, cut into tiles that are
+    built lazily on a worker pool and kept in an LRU bounded to cacheMB.
+    Level n is reduced by 2**n.
+
+    By default image is the image itself, level 0 is drawn from it and is
+    not tiled. A level n tile is built from four level n-1 tiles, or from
+    the image for level 1, so no other level is ever held whole.
+
+    With path, the image is never held at full size: image is only a
+    reduced preview of the file, of the full size given as size. Every
+    level, 0 included, is tiled, and the tiles are decoded from the file
+    a row at a time at their level's resolution (see tiledImageSize()).
+    """
+    tileReady = pyqtSignal(int, int, int)
+
+    def __init__(self, image, tileSize=TILE_SIZE, cacheMB=DEFAULT_TILE_CACHE_MB, parent=None,
+                 path=None, size=None):
+        super(ImagePyramid, self).__init__(parent)
+        self.image = image
+        self.path = path
+        self.size = QSize(size) if size is not None else image.size()
+        self.tileSize = tileSize
+        self.cacheBytes = int(cacheMB * 1024 * 1024)
+        self.cancelled = False
+        size = max(self.size.width(), self.size.height(), 1)
+        # Stop at the level whose whole image fits in one tile
+        self.maxLevel = 0
+        while size > tileSize:
+            size = _ceilDiv(size, 2)
+            self.maxLevel += 1
+        self._tiles = OrderedDict()
+        self._cachedBytes = 0
+        self._lock = threading.Lock()
+        self._pending = set()
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(2)
+        self.tileReady.connect(self._tileReady)
+
+    def levelFor(self, scale):
+        """The coarsest level that still has at least one pixel per screen pixel."""
+        if scale <= 0:
+            return self.maxLevel
+        return max(0, min(self.maxLevel, int(floor(log(1.0 / scale, 2)))))
+
+    def levelSize(self, level):
+        factor = 1 << level
+        return _ceilDiv(self.size.width(), factor), _ceilDiv(self.size.height(), factor)
+
+    def tileSizeAt(self, level, tx, ty):
+        """(width, height) of a tile in its level's pixels; edge tiles are smaller."""
+        width, height = self.levelSize(level)
+        return (min(self.tileSize, width - tx * self.tileSize),
+                min(self.tileSize, height - ty * self.tileSize))
+
+    def gridSize(self, level):
+        """(columns, rows) of tiles at a level."""
+        width, height = self.levelSize(level)
+        return _ceilDiv(width, self.tileSize), _ceilDiv(height, self.tileSize)
+
+    def tileRect(self, level, tx, ty):
+        """Image-space rect covered by a tile."""
+        factor = 1 << level
+        w, h = self.tileSizeAt(level, tx, ty)
+        return QRectF(tx * self.tileSize * factor, ty * self.tileSize * factor, w * factor, h * factor)
+
+    def tilesIn(self, level, rect):
+        """Keys of the level's tiles intersecting an image-space rect."""
+        span = float(self.tileSize << level)
+        columns, rows = self.gridSize(level)
+        x1 = max(0, int(floor(rect.left() / span)))
+        y1 = max(0, int(floor(rect.top() / span)))
+        x2 = min(columns - 1, int(floor(rect.right() / span)))
+        y2 = min(rows - 1, int(floor(rect.bottom() / span)))
+        return [(level, tx, ty) for ty in range(y1, y2 + 1) for tx in range(x1, x2 + 1)]
+
+    def tile(self, level, tx, ty):
+        """Return the cached tile, or None after queueing it to be built."""
+        key = (level, tx, ty)
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                return tile
+        pendingKey = self._pendingKey(*key)
+        if pendingKey not in self._pending:
+            self._pending.add(pendingKey)
+            self._pool.start(TileTask(self, key))
+        return None
+
+    def renderTile(self, level, tx, ty):
+        """
+            Build (or fetch) a tile; safe to call from worker threads.
+            Returns None once the pyramid is cancelled, also for a tile
+            that was being built at the time.
+        """
+        if self.cancelled:
+            return None
+        key = (level, tx, ty)
+        with self._lock:
+            tile = self._tiles.get(key)
+        if tile is not None:
+            return tile
+        if self.path is not None:
+            row = self._decodeRow(level, ty)
+            tile = row.pop(key, None)
+            # The requested tile last, as the most recently used
+            for rowKey, rowTile in list(row.items()) + [(key, tile)]:
+                if rowTile is None or not self._store(rowKey, rowTile):
+                    return None
+            return tile
+        if level == 1:
+            size = self.tileSize * 2
+            source = self.image.copy(QRect(tx * size, ty * size, size, size).intersected(self.image.rect()))
+        else:
+            columns, rows = self.gridSize(level - 1)
+            children = [(i, j, self.renderTile(level - 1, 2 * tx + i, 2 * ty + j))
+                        for j in (0, 1) for i in (0, 1)
+                        if 2 * tx + i < columns and 2 * ty + j < rows]
+            if any(child is None for _, _, child in children):
+                return None
+            sourceWidth = sum(child.width() for i, j, child in children if j == 0)
+            sourceHeight = sum(child.height() for i, j, child in children if i == 0)
+            source = QImage(sourceWidth, sourceHeight, QImage.Format_ARGB32_Premultiplied)
+            painter = QPainter(source)
+            for i, j, child in children:
+                painter.drawImage(i * self.tileSize, j * self.tileSize, child)
+            painter.end()
+        tile = source.scaled(_ceilDiv(source.width(), 2), _ceilDiv(source.height(), 2),
+                             Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+        if tile.format() != QImage.Format_ARGB32_Premultiplied:
+            tile = tile.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        if not self._store(key, tile):
+            return None
+        return tile
+
+    def paint(self, painter, rect, level):
+        """
+            Draw the image-space rect of the image at a level. Tiles still being
+            built are drawn from a cached coarser tile if there is one, else
+            from the image (or preview) with fast sampling, until they arrive.
+        """
+        smooth = painter.testRenderHint(QPainter.SmoothPixmapTransform)
+        for key in self.tilesIn(level, rect):
+            target = self.tileRect(*key)
+            tile = self.tile(*key)
+            if tile is not None:
+                painter.drawImage(target, tile, QRectF(tile.rect()))
+                continue
+            area = target.intersected(rect)
+            coarser = self._cachedAncestor(*key)
+            if coarser is not None:
+                coarseKey, tile = coarser
+                factor = float(1 << coarseKey[0])
+                origin = self.tileRect(*coarseKey).topLeft()
+                source = area.translated(-origin)
+                painter.drawImage(area, tile, QRectF(source.x() / factor, source.y() / factor,
+                                                     source.width() / factor, source.height() / factor))
+                continue
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, False)
+            sx = self.image.width() / float(self.size.width())
+            sy = self.image.height() / float(self.size.height())
+            painter.drawImage(area, self.image, QRectF(area.x() * sx, area.y() * sy,
+                                                       area.width() * sx, area.height() * sy))
+            painter.setRenderHint(QPainter.SmoothPixmapTransform, smooth)
+
+    def cancel(self):
+        """
+            Drop queued work and the cache, without waiting: tiles being built
+            are thrown away when they finish. Keep the pyramid until isIdle().
+        """
+        self.cancelled = True
+        self._pool.clear()
+        with self._lock:
+            self._tiles.clear()
+            self._cachedBytes = 0
+
+    def isIdle(self):
+        """Whether no tile is being built, so the pyramid can be deleted."""
+        return self._pool.activeThreadCount() == 0
+
+    def waitForDone(self):
+        self._pool.waitForDone()
+
+    def stats(self):
+        with self._lock:
+            return dict(tiles=len(self._tiles), megabytes=self._cachedBytes / (1024.0 * 1024.0))
+
+    def _decodeRow(self, level, ty):
+        """
+            The tiles of a row read from the file, by key: one full-width clip
+            rect, reduced while decoding and cut up. A JPEG clip still decodes
+            every scanline above its bottom edge across the whole width, so
+            the row costs what any one of its tiles would on its own.
+        """
+        columns, _ = self.gridSize(level)
+        width, _ = self.levelSize(level)
+        height = self.tileSizeAt(level, 0, ty)[1]
+        reader = QImageReader(self.path)
+        reader.setDecideFormatFromContent(True)
+        reader.setClipRect(self.tileRect(level, 0, ty).united(self.tileRect(level, columns - 1, ty))
+                           .toAlignedRect().intersected(QRect(0, 0, self.size.width(), self.size.height())))
+        reader.setScaledSize(QSize(width, height))
+        strip = reader.read()
+        if strip.isNull():
+            return {}
+        if strip.format() != QImage.Format_ARGB32_Premultiplied:
+            strip = strip.convertToFormat(QImage.Format_ARGB32_Premultiplied)
+        return dict(((level, tx, ty), strip.copy(tx * self.tileSize, 0, self.tileSizeAt(level, tx, ty)[0], height))
+                    for tx in range(columns))
+
+    def _store(self, key, tile):
+        """Cache a tile; False, leaving it out, once the pyramid is cancelled."""
+        size = imageBytes(tile)
+        with self._lock:
+            if self.cancelled:
+                return False
+            if key in self._tiles:
+                return True
+            self._tiles[key] = tile
+            self._cachedBytes += size
+            while self._cachedBytes > self.cacheBytes and len(self._tiles) > 1:
+                _, evicted = self._tiles.popitem(last=False)
+                self._cachedBytes -= imageBytes(evicted)
+        return True
+
+    def _cachedAncestor(self, level, tx, ty):
+        """The closest cached coarser tile covering a tile, as (key, tile)."""
+        with self._lock:
+            while level < self.maxLevel:
+                level, tx, ty = level + 1, tx // 2, ty // 2
+                tile = self._tiles.get((level, tx, ty))
+                if tile is not None:
+                    return (level, tx, ty), tile
+        return None
+
+    def _pendingKey(self, level, tx, ty):
+        # Tiles read from the file are queued and built a row at a time
+        if self.path is not None:
+            return level, ty
+        return level, tx, ty
+
+    def _tileReady(self, level, tx, ty):
+        self._pending.discard(self._pendingKey(level, tx, ty))
@@ -1,14 +1,12 @@
 # Copyright (c) 2016 Tzutalin
 # Create by TzuTaLin <tzu.ta.lin@gmail.com>
 
-try:
-    from PyQt5.QtGui import QImage
-except ImportError:
-    from PyQt4.QtGui import QImage
-
 from base64 import b64encode, b64decode
+from libs.attributes import normalizeAttributes
 from libs.pascal_voc_io import PascalVocWriter
 from libs.pascal_voc_io import XML_EXT
+from libs.imageProbe import imageShape
+import hashlib
 import os.path
 import sys
 
@@ -34,108 +32,29 @@ class LabelFile(object):
         imgFolderName = os.path.split(imgFolderPath)[-1]
         imgFileName = os.path.basename(imagePath)
         #imgFileNameWithoutExt = os.path.splitext(imgFileName)[0]
-        # Read from file path because self.imageData might be empty if saving to
-        # Pascal format
-        image = QImage()
-        image.load(imagePath)
-        imageShape = [image.height(), image.width(),
-                      1 if image.isGrayscale() else 3]
+        # Read the size from the header; decode only formats the probe does not know
+        imgShape = imageShape(imagePath)
+        if imgShape is None:
+            try:
+                from PyQt5.QtGui import QImage
+            except ImportError:
+                from PyQt4.QtGui import QImage
+            image = QImage()
+            image.load(imagePath)
+            imgShape = [image.height(), image.width(),
+                        1 if image.isGrayscale() else 3]
         writer = PascalVocWriter(imgFolderName, imgFileName,
-                                 imageShape, localImgPath=imagePath)
+                                 imgShape, localImgPath=imagePath)
         writer.verified = self.verified
 
         for shape in shapes:
             points = shape['points']
             label = shape['label']
 
-            # Add Chris
-            if shape['ismale']:
-                gender = 1
-            else:
-                gender = 0
-
-            if shape['middle']:
-                age = 1
-            elif shape['old']:
-                age = 2
-            elif shape['children']:
-                age = 3
-            else:
-                age = 0
-
-            mask = int(shape['mask'])
-
-            if shape['openmouth']:
-                mouth = 1
-            elif shape['uncertainmouth']:
-                mouth = 2
-            else:
-                mouth = 0
-
-            if shape['eyeglass']:
-                eyeglass = 1
-            else:
-                eyeglass = 0
-
-            sunglass = int(shape['sunglass'])
-
-            if shape['closeeye']:
-                eye = 1
-            elif shape['uncertaineye']:
-                eye = 2
-            else:
-                eye = 0
-
-            if shape['laugh']:
-                emotion = 1
-            elif shape['shock']:
-                emotion = 2
-            else:
-                emotion = 0
-
-            blurriness = int(shape['blur'])
-
-            if shape['dim']:
-                illumination = 1
-            elif shape['bright']:
-                illumination = 2
-            elif shape['backlight']:
-                illumination = 3
-            elif shape['yinyang']:
-                illumination = 4
-            else:
-                illumination = 0
-
-            if shape['yaw_30']:
-                yaw = 1
-            elif shape['yaw_60']:
-                yaw = 2
-            else:
-                yaw = 0
-
-            if shape['roll_20']:
-                roll = 1
-            elif shape['roll_45']:
-                roll = 2
-            else:
-                roll = 0
-
-            if shape['pitch_20up']:
-                pitch = 1
-            elif shape['pitch_45up']:
-                pitch = 2
-            elif shape['pitch_20down']:
-                pitch = 3
-            elif shape['pitch_45down']:
-                pitch = 4
-            else:
-                pitch = 0
-
             bndbox = LabelFile.convertPoints2BndBox(points)
             if bndbox:
-                writer.addBndBox(bndbox[0], bndbox[1], bndbox[2], bndbox[3], label, gender, age, mask,\
-                             mouth, eyeglass, sunglass, eye,\
-                             emotion, blurriness, illumination, yaw, roll, pitch)
+                writer.addBndBox(bndbox[0], bndbox[1], bndbox[2], bndbox[3], label,
+                                 shape['attributes'])
 
         writer.save(targetFile=filename)
         return
@@ -143,6 +62,20 @@ class LabelFile(object):
     def toggleVerify(self):
         self.verified = not self.verified
 
+    @staticmethod
+    def fingerprint(shapes, verified):
+        """
+            Digest of what savePascalVocFormat would write for shapes: labels,
+            boxes and attribute codes as normalized for the XML, in order,
+            and the verified flag. Equal digests mean an identical save.
+        """
+        digest = hashlib.sha1(b'verified' if verified else b'unverified')
+        for shape in shapes:
+            face = (shape['label'], LabelFile.convertPoints2BndBox(shape['points']),
+                    normalizeAttributes(shape['attributes']))
+            digest.update(repr(face).encode('utf-8'))
+        return digest.hexdigest()
+
     @staticmethod
     def isLabelFile(filename):
         fileSuffix = os.path.splitext(filename)[1].lower()
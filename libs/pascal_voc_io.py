@@ -3,12 +3,44 @@
 import sys
 from xml.etree import ElementTree
 from xml.etree.ElementTree import Element, SubElement
-from lxml import etree
-import codecs
+import io
+import os
+import tempfile
+
+from libs.attributes import ATTRIBUTE_TAGS, DEFAULT_ATTRIBUTES
+from libs.attributes import normalizeAttributes, parseAttributes
 
 XML_EXT = '.xml'
 ENCODE_METHOD = 'utf-8'
 
+# mkstemp creates files 0600; saved XMLs get the mode a plain open() would give
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+OBJECT_TEMPLATE = (
+    '\t\t<truncated>%s</truncated>\n' +
+    ''.join('\t\t<%s>%%d</%s>\n' % (tag, tag) for tag in ATTRIBUTE_TAGS) +
+    '\t\t<bndbox>\n'
+    '\t\t\t<xmin>%s</xmin>\n'
+    '\t\t\t<ymin>%s</ymin>\n'
+    '\t\t\t<xmax>%s</xmax>\n'
+    '\t\t\t<ymax>%s</ymax>\n'
+    '\t\t</bndbox>\n'
+    '\t</object>\n')
+
+
+def textElement(indent, tag, text):
+    """
+        Return one tab-indented leaf element, formatted the way prettify() does
+    """
+    if not text:
+        return '%s<%s/>\n' % (indent, tag)
+    text = text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+    # prettify() turns every double space of the document into a tab
+    text = text.replace('  ', '\t')
+    return '%s<%s>%s</%s>\n' % (indent, tag, text, tag)
+
+
 class PascalVocWriter:
 
     def __init__(self, foldername, filename, imgSize, databaseSrc='Unknown', localImgPath=None):
@@ -24,6 +56,8 @@ class PascalVocWriter:
         """
             Return a pretty-printed XML string for the Element.
         """
+        # Imported here: it costs more than the rest of this module
+        from lxml import etree
         rough_string = ElementTree.tostring(elem, 'utf8')
         root = etree.fromstring(rough_string)
         return etree.tostring(root, pretty_print=True, encoding=ENCODE_METHOD).replace("  ".encode(), "\t".encode())
@@ -74,23 +108,14 @@ class PascalVocWriter:
         segmented.text = '0'
         return top
 
-    def addBndBox(self, xmin, ymin, xmax, ymax, name, gender, age, mask, mouth, eyeglass, sunglass, eye,
-                  emotion, blurriness, illumination, yaw, roll, pitch):
+    def addBndBox(self, xmin, ymin, xmax, ymax, name, attributes=None):
+        """
+            attributes: one code per ATTRIBUTE_SCHEMA entry, see libs/attributes.py
+        """
         bndbox = {'xmin': xmin, 'ymin': ymin, 'xmax': xmax, 'ymax': ymax}
         bndbox['name'] = name
-        bndbox['gender'] = gender
-        bndbox['age'] = age
-        bndbox['mask'] = mask
-        bndbox['mouth'] = mouth
-        bndbox['eyeglass'] = eyeglass
-        bndbox['sunglass'] = sunglass
-        bndbox['eye'] = eye
-        bndbox['emotion'] = emotion
-        bndbox['blurriness'] = blurriness
-        bndbox['illumination'] = illumination
-        bndbox['yaw'] = yaw
-        bndbox['roll'] = roll
-        bndbox['pitch'] = pitch
+        bndbox['attributes'] = normalizeAttributes(attributes) \
+            if attributes is not None else DEFAULT_ATTRIBUTES
         self.boxlist.append(bndbox)
 
     def appendObjects(self, top):
@@ -111,44 +136,8 @@ class PascalVocWriter:
             else:
                 truncated.text = "0"
 
-            gender = SubElement(object_item, 'gender')
-            gender.text = str(bool(each_object['gender']) & 1 )
-
-            age = SubElement(object_item, 'age')
-            age.text = str(each_object['age'])
-
-            mask = SubElement(object_item, 'mask')
-            mask.text = str(bool(each_object['mask']) & 1)
-
-            mouth = SubElement(object_item, 'mouth')
-            mouth.text = str(each_object['mouth'])
-
-            eyeglass = SubElement(object_item, 'eyeglass')
-            eyeglass.text = str(bool(each_object['eyeglass']) & 1)
-
-            sunglass = SubElement(object_item, 'sunglass')
-            sunglass.text = str(bool(each_object['sunglass']) & 1)
-
-            eye = SubElement(object_item, 'eye')
-            eye.text = str(each_object['eye'])
-
-            emotion = SubElement(object_item, 'emotion')
-            emotion.text = str(each_object['emotion'])
-
-            blurriness = SubElement(object_item, 'blurriness')
-            blurriness.text = str(bool(each_object['blurriness']) & 1 )
-
-            illumination = SubElement(object_item, 'illumination')
-            illumination.text = str(each_object['illumination'])
-
-            yaw = SubElement(object_item, 'yaw')
-            yaw.text = str(each_object['yaw'])
-
-            roll = SubElement(object_item, 'roll')
-            roll.text = str(each_object['roll'])
-
-            pitch = SubElement(object_item, 'pitch')
-            pitch.text = str(each_object['pitch'])
+            for tag, code in zip(ATTRIBUTE_TAGS, each_object['attributes']):
+                SubElement(object_item, tag).text = str(code)
 
             bndbox = SubElement(object_item, 'bndbox')
             xmin = SubElement(bndbox, 'xmin')
@@ -160,29 +149,88 @@ class PascalVocWriter:
             ymax = SubElement(bndbox, 'ymax')
             ymax.text = str(each_object['ymax'])
 
-    def save(self, targetFile=None):
-        root = self.genXML()
-        self.appendObjects(root)
-        out_file = None
-        if targetFile is None:
-            out_file = codecs.open(
-                self.filename + XML_EXT, 'w', encoding=ENCODE_METHOD)
+    def writeXML(self, out_file):
+        """
+            Stream the annotation to out_file in a single pass.
+            The output is byte-identical to prettify(genXML() + appendObjects())
+        """
+        write = out_file.write
+        if self.verified:
+            write('<annotation verified="yes">\n')
         else:
-            out_file = codecs.open(targetFile, 'w', encoding=ENCODE_METHOD)
+            write('<annotation>\n')
+        write(textElement('\t', 'folder', self.foldername))
+        write(textElement('\t', 'filename', self.filename))
+        if self.localImgPath is not None:
+            write(textElement('\t', 'path', self.localImgPath))
+        write('\t<source>\n')
+        write(textElement('\t\t', 'database', self.databaseSrc))
+        write('\t</source>\n')
+        depth = str(self.imgSize[2]) if len(self.imgSize) == 3 else '1'
+        write('\t<size>\n'
+              '\t\t<width>%s</width>\n'
+              '\t\t<height>%s</height>\n'
+              '\t\t<depth>%s</depth>\n'
+              '\t</size>\n'
+              '\t<segmented>0</segmented>\n' % (self.imgSize[1], self.imgSize[0], depth))
+
+        height = int(self.imgSize[0])
+        width = int(self.imgSize[1])
+        for each_object in self.boxlist:
+            xmin = each_object['xmin']
+            ymin = each_object['ymin']
+            xmax = each_object['xmax']
+            ymax = each_object['ymax']
+            if int(ymax) == height or int(ymin) == 1 or \
+                    int(xmax) == width or int(xmin) == 1:
+                truncated = '1'
+            else:
+                truncated = '0'
+            write('\t<object>\n')
+            write(textElement('\t\t', 'name', each_object['name']))
+            write(OBJECT_TEMPLATE % ((truncated,) + tuple(each_object['attributes']) +
+                                     (xmin, ymin, xmax, ymax)))
+        write('</annotation>\n')
 
-        prettifyResult = self.prettify(root)
-        out_file.write(prettifyResult.decode('utf8'))
-        out_file.close()
+    def save(self, targetFile=None):
+        if targetFile is None:
+            targetFile = self.filename + XML_EXT
+        # Write next to the target and rename over it, so readers (and a
+        # crash mid-write) see either the old XML or the new one
+        directory, name = os.path.split(os.path.abspath(targetFile))
+        fd, tmpPath = tempfile.mkstemp(prefix='.' + name + '.', suffix='.tmp', dir=directory)
+        try:
+            # newline='' keeps '\n' on every platform, as the old binary codecs writer did
+            with io.open(fd, 'w', encoding=ENCODE_METHOD, newline='') as out_file:
+                self.writeXML(out_file)
+            try:
+                mode = os.stat(targetFile).st_mode & 0o777
+            except OSError:
+                mode = 0o666 & ~_UMASK
+            os.chmod(tmpPath, mode)
+            os.replace(tmpPath, targetFile)
+        except BaseException:
+            try:
+                os.remove(tmpPath)
+            except OSError:
+                pass
+            raise
 
 
 class PascalVocReader:
 
     def __init__(self, filepath):
         # shapes type:
-        # [labbel, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, ismale]
+        # [label, [(x1,y1), (x2,y2), (x3,y3), (x4,y4)], color, color, [attribute codes]]
         self.shapes = []
         self.filepath = filepath
         self.verified = False
+        # [height, width, depth] from <size>, None when absent
+        self.imageSize = None
+        # <folder>, <filename> and <path>, None when absent
+        self.foldername = None
+        self.filename = None
+        self.localImgPath = None
         try:
             self.parseXML()
         except:
@@ -191,217 +239,34 @@ class PascalVocReader:
     def getShapes(self):
         return self.shapes
 
-    def addShape(self, label, bndbox,
-                 isfemale, ismale,
-                 young, middle, old, children,
-                 nomask, mask,
-                 closemouth, openmouth, uncertainmouth,
-                 noeyeglass, eyeglass,
-                 nosunglass, sunglass,
-                 openeye, closeeye, uncertaineye,
-                 norm_emotion, laugh, shock,
-                 noblur, blur,
-                 norm_illumination, dim, bright, backlight, yinyang,
-                 norm_yaw, yaw_30, yaw_60,
-                 norm_roll, roll_20, roll_45,
-                 norm_pitch, pitch_20up, pitch_45up, pitch_20down, pitch_45down):
+    def addShape(self, label, bndbox, attributes):
         xmin = int(bndbox.find('xmin').text)
         ymin = int(bndbox.find('ymin').text)
         xmax = int(bndbox.find('xmax').text)
         ymax = int(bndbox.find('ymax').text)
         points = [(xmin, ymin), (xmax, ymin), (xmax, ymax), (xmin, ymax)]
-        self.shapes.append((label, points, None, None,
-                            isfemale, ismale,
-                            young, middle, old, children,
-                            nomask, mask,
-                            closemouth, openmouth, uncertainmouth,
-                            noeyeglass, eyeglass,
-                            nosunglass, sunglass,
-                            openeye, closeeye, uncertaineye,
-                            norm_emotion, laugh, shock,
-                            noblur, blur,
-                            norm_illumination, dim, bright, backlight, yinyang,
-                            norm_yaw, yaw_30, yaw_60,
-                            norm_roll, roll_20, roll_45,
-                            norm_pitch, pitch_20up, pitch_45up, pitch_20down, pitch_45down
-                            ))
+        self.shapes.append((label, points, None, None, attributes))
 
     def parseXML(self):
         assert self.filepath.endswith(XML_EXT), "Unsupport file format"
+        from lxml import etree
         parser = etree.XMLParser(encoding=ENCODE_METHOD)
         xmltree = ElementTree.parse(self.filepath, parser=parser).getroot()
-        if xmltree.find('filename') is not None:
-            filename = xmltree.find('filename').text
+        self.foldername = xmltree.findtext('folder')
+        self.filename = xmltree.findtext('filename')
+        self.localImgPath = xmltree.findtext('path')
         try:
             verified = xmltree.attrib['verified']
             if verified == 'yes':
                 self.verified = True
         except KeyError:
             self.verified = False
+        size = xmltree.find('size')
+        if size is not None:
+            self.imageSize = [int(size.findtext(tag) or 0) for tag in ('height', 'width', 'depth')]
 
         for object_iter in xmltree.findall('object'):
             bndbox = object_iter.find("bndbox")
             label = object_iter.find('name').text
-
-            # Add chris
-            isfemale = False
-            ismale = False
-            young = False
-            middle = False
-            old = False
-            children = False
-            nomask = False
-            mask = False
-            closemouth = False
-            openmouth = False
-            uncertainmouth = False
-            noeyeglass = False
-            eyeglass = False
-            nosunglass = False
-            sunglass = False
-            openeye = False
-            closeeye = False
-            uncertaineye = False
-            norm_emotion = False
-            laugh = False
-            shock = False
-            noblur = False
-            blur = False
-            norm_illumination = False
-            dim = False
-            bright = False
-            backlight = False
-            yinyang = False
-            norm_yaw = False
-            yaw_30 = False
-            yaw_60 = False
-            norm_roll = False
-            roll_20 = False
-            roll_45 = False
-            norm_pitch = False
-            pitch_20up = False
-            pitch_45up = False
-            pitch_20down = False
-            pitch_45down = False
-
-            if object_iter.find('gender') is not None:
-                if int(object_iter.find('gender').text) == 0:
-                    isfemale = True
-                else:
-                    ismale = True
-
-            if object_iter.find('age') is not None:
-                if int(object_iter.find('age').text) == 0:
-                    young = True
-                elif int(object_iter.find('age').text) == 1:
-                    middle = True
-                elif int(object_iter.find('age').text) == 2:
-                    old = True
-                else:
-                    children = True
-
-            if object_iter.find('mask') is not None:
-                mask = bool(int(object_iter.find('mask').text))
-                if mask:
-                    mask = True
-                else:
-                    nomask = True
-
-            if object_iter.find('mouth') is not None:
-                if int(object_iter.find('mouth').text) == 0:
-                    closemouth = True
-                elif int(object_iter.find('mouth').text) == 1:
-                    openmouth = True
-                else:
-                    uncertainmouth = True
-
-            if object_iter.find('eyeglass') is not None:
-                if int(object_iter.find('eyeglass').text) == 0:
-                    noeyeglass = True
-                else:
-                    eyeglass = True
-
-            if object_iter.find('sunglass') is not None:
-                if int(object_iter.find('sunglass').text) == 1:
-                    sunglass = True
-                else:
-                    nosunglass = True
-
-            if object_iter.find('eye') is not None:
-                if int(object_iter.find('eye').text) == 0:
-                    openeye = True
-                elif int(object_iter.find('eye').text) == 1:
-                    closeeye = True
-                else:
-                    uncertaineye = True
-
-            if object_iter.find('emotion') is not None:
-                if int(object_iter.find('emotion').text) == 1:
-                    laugh = True
-                elif int(object_iter.find('emotion').text) == 2:
-                    shock = True
-                else:
-                    norm_emotion = True
-
-            if object_iter.find('blurriness') is not None:
-                blur = bool(int(object_iter.find('blurriness').text))
-                if blur:
-                    blur = True
-                else:
-                    noblur = True
-
-            if object_iter.find('illumination') is not None:
-                if int(object_iter.find('illumination').text) == 1:
-                    dim = True
-                elif int(object_iter.find('illumination').text) == 2:
-                    bright = True
-                elif int(object_iter.find('illumination').text) == 3:
-                    backlight = True
-                elif int(object_iter.find('illumination').text) == 4:
-                    yinyang = True
-                else:
-                    norm_illumination = True
-
-            if object_iter.find('yaw') is not None:
-                if int(object_iter.find('yaw').text) == 1:
-                    yaw_30 = True
-                elif int(object_iter.find('yaw').text) == 2:
-                    yaw_60 = True
-                else:
-                    norm_yaw = True
-
-            if object_iter.find('roll') is not None:
-                if int(object_iter.find('roll').text) == 1:
-                    roll_20 = True
-                elif int(object_iter.find('roll').text) == 2:
-                    roll_45 = True
-                else:
-                    norm_roll = True
-
-            if object_iter.find('pitch') is not None:
-                if int(object_iter.find('pitch').text) == 1:
-                    pitch_20up = True
-                elif int(object_iter.find('pitch').text) == 2:
-                    pitch_45up = True
-                elif int(object_iter.find('pitch').text) == 3:
-                    pitch_20down = True
-                elif int(object_iter.find('pitch').text) == 4:
-                    pitch_45down = True
-                else:
-                    norm_pitch = True
-
-            self.addShape(label, bndbox,
-                          isfemale, ismale,
-                          young, middle, old, children,
-                          nomask, mask,
-                          closemouth, openmouth, uncertainmouth,
-                          noeyeglass, eyeglass,
-                          nosunglass, sunglass,
-                          openeye, closeeye, uncertaineye,
-                          norm_emotion, laugh, shock,
-                          noblur, blur,
-                          norm_illumination, dim, bright, backlight, yinyang,
-                          norm_yaw, yaw_30, yaw_60,
-                          norm_roll, roll_20, roll_45,
-                          norm_pitch, pitch_20up, pitch_45up, pitch_20down, pitch_45down)
+            self.addShape(label, bndbox, parseAttributes(object_iter))
         return True
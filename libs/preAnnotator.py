@@ -0,0 +1,110 @@
+try:
+    from PyQt5.QtCore import QObject, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QObject, pyqtSignal
+
+import os
+from collections import OrderedDict, deque
+from functools import partial
+
+from libs.faceDetector import detectFaces, fileStamp, lowerPriority
+from libs.workerPool import spawnPool
+
+# Images ahead of the current one that get detected in the background
+DEFAULT_AHEAD = 8
+# Proposals kept, least recently used dropped first
+CACHE_SIZE = 10000
+
+
+def defaultWorkers():
+    """One process per CPU but one, which is left to the GUI."""
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+class PreAnnotator(QObject):
+    """
+    Runs a face detector from libs.faceDetector over the images ahead of
+    the current one on a process pool, and caches the proposed boxes per
+    image. All bookkeeping happens on the GUI thread; workers only detect.
+    At most one image per worker is in flight, and the workers run at a
+    lower priority and start without Qt (see libs.workerPool), so the
+    annotator does not feel them.
+    """
+    proposed = pyqtSignal(str, object)
+    # Results come back on the pool's thread and are handed over here
+    _detected = pyqtSignal(object)
+
+    def __init__(self, detector, workers=None, ahead=DEFAULT_AHEAD, parent=None):
+        super(PreAnnotator, self).__init__(parent)
+        self.detector = detector
+        self.workers = workers or defaultWorkers()
+        self.ahead = ahead
+        self._cache = OrderedDict()
+        self._queue = deque()
+        self._running = set()
+        self._pool = None
+        self._detected.connect(self._store)
+
+    def proposals(self, path):
+        """The cached boxes proposed for path, or None if it was not detected yet."""
+        entry = self._cache.get(path)
+        if entry is None or entry[0] != fileStamp(path):
+            return None
+        self._cache.move_to_end(path)
+        return entry[1]
+
+    def schedule(self, paths, index, isAnnotated):
+        """
+            Queue detection of paths[index] and the images after it that
+            isAnnotated(path) rejects and have no proposals yet. The queue
+            of the previous position is dropped.
+        """
+        stop = min(len(paths), index + self.ahead + 1)
+        self._queue = deque(path for path in (paths[i] for i in range(index, stop))
+                            if path not in self._running and self.proposals(path) is None
+                            and not isAnnotated(path))
+        self._submit()
+
+    def isBusy(self):
+        return bool(self._queue or self._running)
+
+    def shutdown(self):
+        """Drop queued work and stop the workers, without waiting for them."""
+        self._queue.clear()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self._running.clear()
+
+    def _submit(self):
+        while self._queue and len(self._running) < self.workers:
+            path = self._queue.popleft()
+            if self._pool is None:
+                # Spawn rather than fork: the GUI has live threads
+                self._pool = spawnPool(self.workers, initializer=lowerPriority)
+            self._running.add(path)
+            future = self._pool.submit(detectFaces, self.detector, path)
+            future.add_done_callback(partial(self._finished, path))
+
+    def _finished(self, path, future):
+        if future.cancelled():
+            return
+        if future.exception() is not None:
+            # Free the slot without caching anything for path
+            self._detected.emit((path, None, []))
+        else:
+            self._detected.emit(future.result())
+
+    def _store(self, result):
+        path, stamp, boxes = result
+        if path not in self._running:
+            # Finished after shutdown()
+            return
+        self._running.discard(path)
+        if stamp is not None:
+            self._cache[path] = (stamp, boxes)
+            self._cache.move_to_end(path)
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        self._submit()
+        self.proposed.emit(path, boxes)
@@ -0,0 +1,79 @@
+try:
+    from PyQt5.QtCore import QThread, pyqtSignal
+except ImportError:
+    from PyQt4.QtCore import QThread, pyqtSignal
+
+import threading
+from collections import OrderedDict
+
+
+class SaveQueue(QThread):
+    """
+    Writes annotation files on a worker thread, in submission order.
+
+    A job is a callable that serializes a snapshot taken on the GUI thread
+    and writes it to targetPath. Submitting a path that is still waiting
+    replaces its job, so repeated saves of one XML are written once. The
+    outcome comes back through saved / failed, keyed by the target and the
+    image it annotates.
+    """
+    saved = pyqtSignal(str, str)
+    failed = pyqtSignal(str, str, str)
+
+    def __init__(self, parent=None):
+        super(SaveQueue, self).__init__(parent)
+        self._jobs = OrderedDict()
+        self._writing = None
+        self._stopped = False
+        self._condition = threading.Condition()
+
+    def submit(self, targetPath, imagePath, job):
+        """Queue job; returns True if it replaced one still waiting for targetPath."""
+        with self._condition:
+            replaced = targetPath in self._jobs
+            self._jobs[targetPath] = (imagePath, job)
+            self._condition.notify_all()
+            return replaced
+
+    def isPending(self, targetPath=None):
+        """Whether targetPath, or any path if None, is queued or being written."""
+        with self._condition:
+            return self._busy(targetPath)
+
+    def flush(self, targetPath=None):
+        """Block until targetPath, or everything if None, has been written."""
+        with self._condition:
+            while self.isRunning() and self._busy(targetPath):
+                self._condition.wait()
+
+    def stop(self):
+        """Write what is queued, then end the thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self.wait()
+
+    def run(self):
+        while True:
+            with self._condition:
+                while not self._jobs and not self._stopped:
+                    self._condition.wait()
+                if not self._jobs:
+                    return
+                targetPath, (imagePath, job) = self._jobs.popitem(last=False)
+                self._writing = targetPath
+            try:
+                job()
+            except Exception as e:
+                self.failed.emit(targetPath, imagePath, u'%s' % e)
+            else:
+                self.saved.emit(targetPath, imagePath)
+            finally:
+                with self._condition:
+                    self._writing = None
+                    self._condition.notify_all()
+
+    def _busy(self, targetPath):
+        if targetPath is None:
+            return bool(self._jobs) or self._writing is not None
+        return targetPath in self._jobs or self._writing == targetPath
@@ -10,6 +10,7 @@ except ImportError:
     from PyQt4.QtCore import *
 
 from libs.lib import distance
+from libs.attributes import FLAG_INDEX, defaultAttributes, flagProperty
 
 DEFAULT_LINE_COLOR = QColor(0, 255, 0, 128)
 DEFAULT_FILL_COLOR = QColor(255, 0, 0, 128)
@@ -35,76 +36,18 @@ class Shape(object):
     point_type = P_ROUND
     point_size = 8
     scale = 1.0
+    # Bumped by invalidate(), i.e. on every change to the points
+    revision = 0
 
-    def __init__(self, label=None, line_color=None,isfemale = True, ismale = False,
-                 young = True, middle = False, old = False, children = False,
-                 nomask = True, mask = False,
-                 closemouth = True, openmouth = False, uncertainmouth = False,
-                 noeyeglass = True, eyeglass = False,
-                 nosunglass = True, sunglass = False,
-                 openeye = True, closeeye = False, uncertaineye = False,
-                 norm_emotion=True, laugh=False, shock=False,
-                 noblur = True, blur = False,
-                 norm_illumination = True, dim = False, bright = False, backlight = False, yinyang = False,
-                 norm_yaw=True, yaw_30=False, yaw_60=False,
-                 norm_roll = True, roll_20 = False, roll_45 = False,
-                 norm_pitch = True, pitch_20up = False, pitch_45up = False, pitch_20down = False, pitch_45down = False):
+    def __init__(self, label=None, line_color=None, attributes=None):
         self.label = label
+        self._closed = False
         self.points = []
         self.fill = False
         self.selected = False
-
-        self.isfemale = isfemale
-        self.ismale = ismale
-
-        self.young = young
-        self.middle = middle
-        self.old = old
-        self.children = children
-
-        self.nomask = nomask
-        self.mask = mask
-
-        self.closemouth = closemouth
-        self.openmouth = openmouth
-        self.uncertainmouth = uncertainmouth
-
-        self.noeyeglass = noeyeglass
-        self.eyeglass = eyeglass
-
-        self.nosunglass = nosunglass
-        self.sunglass  = sunglass
-
-        self.closeeye = closeeye
-        self.openeye = openeye
-        self.uncertaineye = uncertaineye
-
-        self.norm_emotion = norm_emotion
-        self.laugh = laugh
-        self.shock = shock
-
-        self.noblur = noblur
-        self.blur = blur
-
-        self.norm_illumination = norm_illumination
-        self.dim = dim
-        self.bright = bright
-        self.backlight = backlight
-        self.yinyang = yinyang
-
-        self.norm_yaw = norm_yaw
-        self.yaw_30 = yaw_30
-        self.yaw_60 = yaw_60
-
-        self.norm_roll = norm_roll
-        self.roll_20 = roll_20
-        self.roll_45 = roll_45
-
-        self.norm_pitch = norm_pitch
-        self.pitch_20up = pitch_20up
-        self.pitch_45up = pitch_45up
-        self.pitch_20down = pitch_20down
-        self.pitch_45down = pitch_45down
+        # One code per ATTRIBUTE_SCHEMA entry; the one-hot flags
+        # (isfemale, ismale, young, ...) are properties over this list.
+        self.attributes = list(attributes) if attributes is not None else defaultAttributes()
 
         self._highlightIndex = None
         self._highlightMode = self.NEAR_VERTEX
@@ -113,16 +56,34 @@ class Shape(object):
             self.MOVE_VERTEX: (1.5, self.P_SQUARE),
         }
 
-        self._closed = False
-
         if line_color is not None:
             # Override the class line_color attribute
             # with an object attribute. Currently this
             # is used for drawing the pending line a different color.
             self.line_color = line_color
 
+    @property
+    def points(self):
+        return self._points
+
+    @points.setter
+    def points(self, points):
+        self._points = points
+        self.invalidate()
+
+    def invalidate(self):
+        """Drop the cached paths; call after changing self.points in place."""
+        # Lets observers such as the edit journal skip unchanged shapes
+        self.revision += 1
+        self._path = None
+        self._linePath = None
+        self._vertexPath = None
+        self._vertexKey = None
+        self._boundingRect = None
+
     def close(self):
         self._closed = True
+        self._linePath = None
 
     def reachMaxPoints(self):
         if len(self.points) >= 4:
@@ -132,9 +93,11 @@ class Shape(object):
     def addPoint(self, point):
         if not self.reachMaxPoints():
             self.points.append(point)
+            self.invalidate()
 
     def popPoint(self):
         if self.points:
+            self.invalidate()
             return self.points.pop()
         return None
 
@@ -143,6 +106,7 @@ class Shape(object):
 
     def setOpen(self):
         self._closed = False
+        self._linePath = None
 
     def paint(self, painter):
         if self.points:
@@ -152,20 +116,12 @@ class Shape(object):
             pen.setWidth(max(1, int(round(2.0 / self.scale))))
             painter.setPen(pen)
 
-            line_path = QPainterPath()
-            vrtx_path = QPainterPath()
-
-            line_path.moveTo(self.points[0])
-            # Uncommenting the following line will draw 2 paths
-            # for the 1st vertex, and make it non-filled, which
-            # may be desirable.
-            #self.drawVertex(vrtx_path, 0)
-
-            for i, p in enumerate(self.points):
-                line_path.lineTo(p)
-                self.drawVertex(vrtx_path, i)
-            if self.isClosed():
-                line_path.lineTo(self.points[0])
+            line_path = self.linePath()
+            vrtx_path = self.vertexPath()
+            if self._highlightIndex is not None:
+                self.vertex_fill_color = self.hvertex_fill_color
+            else:
+                self.vertex_fill_color = Shape.vertex_fill_color
 
             painter.drawPath(line_path)
             painter.drawPath(vrtx_path)
@@ -181,10 +137,6 @@ class Shape(object):
         if i == self._highlightIndex:
             size, shape = self._highlightSettings[self._highlightMode]
             d *= size
-        if self._highlightIndex is not None:
-            self.vertex_fill_color = self.hvertex_fill_color
-        else:
-            self.vertex_fill_color = Shape.vertex_fill_color
         if shape == self.P_SQUARE:
             path.addRect(point.x() - d / 2, point.y() - d / 2, d, d)
         elif shape == self.P_ROUND:
@@ -198,23 +150,56 @@ class Shape(object):
                 return i
         return None
 
+    def linePath(self):
+        """Outline as painted, closed back to the first point once the shape is."""
+        if self._linePath is None:
+            path = QPainterPath()
+            path.moveTo(self.points[0])
+            for p in self.points:
+                path.lineTo(p)
+            if self.isClosed():
+                path.lineTo(self.points[0])
+            self._linePath = path
+        return self._linePath
+
+    def vertexPath(self):
+        """Vertex markers, rebuilt when the scale or the highlight changes."""
+        key = (self.scale, self.point_size, self.point_type,
+               self._highlightIndex, self._highlightMode)
+        if self._vertexPath is None or self._vertexKey != key:
+            path = QPainterPath()
+            # Calling drawVertex(path, 0) once more here would draw 2 paths
+            # for the 1st vertex, and make it non-filled, which may be desirable.
+            for i in range(len(self.points)):
+                self.drawVertex(path, i)
+            self._vertexPath, self._vertexKey = path, key
+        return self._vertexPath
+
     def containsPoint(self, point):
-        return self.makePath().contains(point)
+        return self._outline().contains(point)
 
     def makePath(self):
-        path = QPainterPath(self.points[0])
-        for p in self.points[1:]:
-            path.lineTo(p)
-        return path
+        return QPainterPath(self._outline())
+
+    def _outline(self):
+        if self._path is None:
+            path = QPainterPath(self.points[0])
+            for p in self.points[1:]:
+                path.lineTo(p)
+            self._path = path
+        return self._path
 
     def boundingRect(self):
-        return self.makePath().boundingRect()
+        if self._boundingRect is None:
+            self._boundingRect = self._outline().boundingRect()
+        return QRectF(self._boundingRect)
 
     def moveBy(self, offset):
         self.points = [p + offset for p in self.points]
 
     def moveVertexBy(self, i, offset):
         self.points[i] = self.points[i] + offset
+        self.invalidate()
 
     def highlightVertex(self, i, action):
         self._highlightIndex = i
@@ -243,3 +228,8 @@ class Shape(object):
 
     def __setitem__(self, key, value):
         self.points[key] = value
+        self.invalidate()
+
+
+for _flag, (_index, _code) in FLAG_INDEX.items():
+    setattr(Shape, _flag, flagProperty(_index, _code))
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Uniform grid over axis-aligned bounding boxes, for hit-testing shapes
+without visiting all of them.
+"""
+from math import floor
+
+DEFAULT_CELL_SIZE = 64.0
+# Items covering more cells than this are kept in a list checked on every query
+MAX_ITEM_CELLS = 256
+
+
+class ShapeIndex(object):
+    """
+    Maps grid cells to the items whose bounds (x1, y1, x2, y2) overlap
+    them. Items are kept in insertion order, which is also paint order, so
+    query() can return the topmost candidates first. It only narrows the
+    search: callers still run the exact hit test on what it returns.
+    """
+
+    def __init__(self, cellSize=DEFAULT_CELL_SIZE):
+        self.cellSize = float(cellSize)
+        self._cells = {}
+        self._large = set()
+        # item -> (insertion order, cells it was filed under or None if large)
+        self._items = {}
+        self._counter = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def clear(self):
+        self._cells = {}
+        self._large = set()
+        self._items = {}
+        self._counter = 0
+
+    def rebuild(self, items):
+        """Index (item, bounds) pairs, in paint order."""
+        self.clear()
+        for item, bounds in items:
+            self.insert(item, bounds)
+
+    def insert(self, item, bounds):
+        """Add item, or move it to new bounds keeping its paint order."""
+        entry = self._items.get(item)
+        if entry is not None:
+            order = entry[0]
+            self._unfile(item, entry[1])
+        else:
+            order = self._counter
+            self._counter += 1
+        cells = self._cellsOf(bounds)
+        if cells is None:
+            self._large.add(item)
+        else:
+            for cell in cells:
+                bucket = self._cells.get(cell)
+                if bucket is None:
+                    self._cells[cell] = bucket = set()
+                bucket.add(item)
+        self._items[item] = (order, cells)
+
+    def remove(self, item):
+        entry = self._items.pop(item, None)
+        if entry is not None:
+            self._unfile(item, entry[1])
+
+    def query(self, x, y, radius=0.0):
+        """Return the items whose cells come within radius of (x, y), topmost first."""
+        size = self.cellSize
+        x1, x2 = int(floor((x - radius) / size)), int(floor((x + radius) / size))
+        y1, y2 = int(floor((y - radius) / size)), int(floor((y + radius) / size))
+        found = set(self._large)
+        cells = self._cells
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                bucket = cells.get((cx, cy))
+                if bucket:
+                    found.update(bucket)
+        items = self._items
+        return sorted(found, key=lambda item: items[item][0], reverse=True)
+
+    def _cellsOf(self, bounds):
+        size = self.cellSize
+        x1, y1, x2, y2 = bounds
+        cx1, cx2 = int(floor(min(x1, x2) / size)), int(floor(max(x1, x2) / size))
+        cy1, cy2 = int(floor(min(y1, y2) / size)), int(floor(max(y1, y2) / size))
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > MAX_ITEM_CELLS:
+            return None
+        return tuple((cx, cy) for cx in range(cx1, cx2 + 1) for cy in range(cy1, cy2 + 1))
+
+    def _unfile(self, item, cells):
+        if cells is None:
+            self._large.discard(item)
+            return
+        for cell in cells:
+            bucket = self._cells.get(cell)
+            if bucket is not None:
+                bucket.discard(item)
+                if not bucket:
+                    del self._cells[cell]
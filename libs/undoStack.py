@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Bounded undo/redo history of annotation edits, kept as deltas.
+"""
+from collections import deque
+
+UNDO_LIMIT = 1000
+
+
+def _delta(op, before):
+    """Pack a journal op and the value it replaced as (kind, id, after, before)."""
+    kind = op['op']
+    if kind == 'create':
+        after = (op['label'], op['points'], op['attributes'])
+    elif kind == 'move':
+        after = (op['dx'], op['dy'])
+    elif kind == 'resize':
+        after = op['points']
+    elif kind == 'verified':
+        after = op['value']
+    elif kind == 'delete':
+        after = None
+    else:
+        after = op[kind]
+    return kind, op.get('id'), after, before
+
+
+class UndoStack(object):
+    """
+    Undo and redo steps, each the deltas of one edit as returned by
+    EditJournal.record(): (kind, shape id, after, before), with after and
+    before holding only what changed. A created or deleted shape carries
+    (label, points, attributes) on the side it exists; its id tells where
+    it goes back.
+
+    A single move or resize of one shape merges into the step before if
+    that one was also for the shape, so a drag or a run of arrow key nudges
+    undoes at once; seal() ends the run. At most limit steps are kept.
+    """
+
+    def __init__(self, limit=UNDO_LIMIT):
+        self._undo = deque(maxlen=limit)
+        self._redo = deque(maxlen=limit)
+        self._sealed = True
+
+    def __len__(self):
+        return len(self._undo)
+
+    def canUndo(self):
+        return bool(self._undo)
+
+    def canRedo(self):
+        return bool(self._redo)
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+        self._sealed = True
+
+    def seal(self):
+        self._sealed = True
+
+    def push(self, changes):
+        step = [_delta(op, before) for op, before in changes]
+        self._redo.clear()
+        if not self._sealed and self._undo and self._merge(self._undo[-1], step):
+            return
+        self._undo.append(step)
+        self._sealed = False
+
+    def undo(self):
+        """Pop the last step; apply its deltas in reverse, restoring before."""
+        step = self._undo.pop()
+        self._redo.append(step)
+        self._sealed = True
+        return step
+
+    def redo(self):
+        """Pop the last undone step; apply its deltas in order, restoring after."""
+        step = self._redo.pop()
+        self._undo.append(step)
+        self._sealed = True
+        return step
+
+    def _merge(self, last, step):
+        if len(last) != 1 or len(step) != 1:
+            return False
+        kind, sid, after, before = step[0]
+        lastKind, lastSid, lastAfter, lastBefore = last[0]
+        if sid != lastSid or kind not in ('move', 'resize') or lastKind not in ('move', 'resize'):
+            return False
+        if kind == 'move' and lastKind == 'move':
+            last[0] = (kind, sid, (lastAfter[0] + after[0], lastAfter[1] + after[1]), None)
+        elif lastKind == 'resize' and kind == 'resize':
+            last[0] = (kind, sid, after, lastBefore)
+        else:
+            # A move then a vertex drag, or the other way round
+            return False
+        return True
@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+The per-user labelImg directory: annotation catalogs, edit journals and
+whatever else the application keeps between runs outside the datasets.
+Free of Qt, for worker processes.
+"""
+import os
+
+
+def userDirectory(*parts):
+    """A path under the per-user labelImg directory."""
+    base = os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA') or \
+        os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'labelImg', *parts)
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf8 -*-
+"""
+Process pools whose workers do not load Qt, for every pool in libs.
+
+A spawned worker first re-imports the parent's __main__, which for the
+GUI is labelImg.py with PyQt5 and all of libs. Workers of spawnPool()
+start from this module instead, which imports nothing but the standard
+library; they then import only what the submitted functions need.
+Spawn rather than fork, as the caller may have live threads.
+"""
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.context import SpawnContext, SpawnProcess
+
+# sys.modules['__main__'] is shared by all threads: one start at a time
+_startLock = threading.Lock()
+
+
+class _WorkerProcess(SpawnProcess):
+
+    def start(self):
+        # The spawn start method reads the main module to re-import while
+        # the process starts
+        with _startLock:
+            main = sys.modules['__main__']
+            sys.modules['__main__'] = sys.modules[__name__]
+            try:
+                super(_WorkerProcess, self).start()
+            finally:
+                sys.modules['__main__'] = main
+
+
+class _WorkerContext(SpawnContext):
+    Process = _WorkerProcess
+
+
+def spawnPool(workers, initializer=None):
+    """A spawning ProcessPoolExecutor whose workers start from this module."""
+    return ProcessPoolExecutor(workers, mp_context=_WorkerContext(), initializer=initializer)
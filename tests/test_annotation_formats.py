@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import io
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.annotationFormats import FORMATS, convert, getFormat
+from libs.headless import Annotation, iterAnnotations, saveAnnotation
+
+
+class TestAnnotationFormats(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.images = os.path.join(self.tmp, 'images')
+        self.voc = os.path.join(self.tmp, 'voc')
+        os.makedirs(self.images)
+        os.makedirs(self.voc)
+        self.annotations = []
+        for i, name in enumerate(('a', 'b', 'c')):
+            imagePath = os.path.join(self.images, name + '.bmp')
+            shutil.copy(os.path.join(dir_name, 'test.bmp'), imagePath)
+            annotation = Annotation(imagePath, verified=False)
+            for j in range(i + 1):
+                annotation.addFace('face', 10 + 50 * j, 20, 60 + 50 * j, 90,
+                                   [1, 2, 1, 2, 1, 0, 2, 0, j % 2, 0, 0, 0, i % 3])
+            saveAnnotation(annotation, os.path.join(self.voc, name + '.xml'))
+            self.annotations.append(annotation)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def loadVoc(self, directory):
+        return [(os.path.basename(a.imagePath), a.faces) for a in iterAnnotations(directory)]
+
+    def test_registry(self):
+        self.assertEqual(sorted(FORMATS), ['voc', 'wider', 'yolo'])
+        self.assertEqual(getFormat('yolo', classes=['face', 'hand']).classes, ['face', 'hand'])
+        self.assertRaises(ValueError, getFormat, 'kitti')
+
+    def test_yolo_round_trip(self):
+        yolo = os.path.join(self.tmp, 'yolo')
+        self.assertEqual(convert(getFormat('voc'), self.voc, getFormat('yolo'), yolo, workers=0), (3, []))
+        with io.open(os.path.join(yolo, 'classes.txt')) as f:
+            self.assertEqual(f.read(), 'face\n')
+        with io.open(os.path.join(yolo, 'b.txt')) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[1], '0 0.166016 0.107422 0.097656 0.136719 1 2 1 2 1 0 2 0 1 0 0 0 1')
+
+        back = os.path.join(self.tmp, 'back')
+        self.assertEqual(convert(getFormat('yolo', imageRoot=self.images), yolo, getFormat('voc'), back,
+                                 workers=0), (3, []))
+        self.assertEqual(self.loadVoc(back), self.loadVoc(self.voc))
+
+    def test_wider_round_trip(self):
+        wider = os.path.join(self.tmp, 'gt.txt')
+        self.assertEqual(convert(getFormat('voc'), self.voc, getFormat('wider', imageRoot=self.tmp), wider,
+                                 workers=0), (3, []))
+        with io.open(wider) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[:3], ['images/a.bmp', '1', '10 20 50 70 0 0 0 0 1 0 '])
+        self.assertEqual(lines[6], '60 20 50 70 2 0 0 0 1 1 ')
+
+        back = os.path.join(self.tmp, 'back')
+        self.assertEqual(convert(getFormat('wider', imageRoot=self.tmp), wider, getFormat('voc'), back,
+                                 workers=0), (3, []))
+        faces = dict(self.loadVoc(back))
+        self.assertEqual([face.box for face in faces['c.bmp']], [face.box for face in self.annotations[2].faces])
+        # WIDER FACE keeps blur only
+        self.assertEqual([face.attribute('blurriness') for face in faces['c.bmp']], [0, 1, 0])
+        self.assertEqual([face.attribute('gender') for face in faces['c.bmp']], [0, 0, 0])
+
+    def test_process_pool(self):
+        serial, pooled = os.path.join(self.tmp, 'serial'), os.path.join(self.tmp, 'pooled')
+        convert(getFormat('voc'), self.voc, getFormat('yolo'), serial, workers=0)
+        self.assertEqual(convert(getFormat('voc'), self.voc, getFormat('yolo'), pooled, workers=2,
+                                 chunkSize=1), (3, []))
+        for name in ('a.txt', 'b.txt', 'c.txt', 'classes.txt'):
+            with io.open(os.path.join(serial, name)) as f, io.open(os.path.join(pooled, name)) as g:
+                self.assertEqual(f.read(), g.read())
+
+    def test_failures_are_reported(self):
+        self.annotations[1].addFace('hand', 1, 2, 3, 4)
+        saveAnnotation(self.annotations[1], os.path.join(self.voc, 'b.xml'))
+        yolo = os.path.join(self.tmp, 'yolo')
+        converted, failures = convert(getFormat('voc'), self.voc, getFormat('yolo'), yolo, workers=0)
+        self.assertEqual(converted, 2)
+        self.assertEqual([os.path.basename(path) for path, _ in failures], ['b.xml'])
+        self.assertFalse(os.path.exists(os.path.join(yolo, 'b.txt')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.annotationTable import exportTable, loadAnnotationTable, loadExport, writeAnnotations
+import numpy as np
+from libs.pascal_voc_io import PascalVocWriter
+
+
+def writeXML(path, faces, verified=False):
+    writer = PascalVocWriter('images', os.path.basename(path)[:-4] + '.jpg', (480, 640, 3),
+                             localImgPath='/images/' + os.path.basename(path)[:-4] + '.jpg')
+    writer.verified = verified
+    for label, box, codes in faces:
+        writer.addBndBox(box[0], box[1], box[2], box[3], label, codes)
+    writer.save(path)
+
+
+class TestAnnotationTable(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = os.path.join(self.tmp, 'table.npz')
+        self.paths = []
+        for i in range(5):
+            path = os.path.join(self.tmp, '%02d.xml' % i)
+            faces = [('face', (10 * j + i, 20, 10 * j + i + 30, 60), [j % 2, i % 4] + [0] * 11)
+                     for j in range(i)]
+            writeXML(path, faces, verified=i == 3)
+            self.paths.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_columns(self):
+        table = loadAnnotationTable(self.tmp, self.cache, workers=0, chunkSize=2)
+        self.assertEqual(table.xmlPaths, self.paths)
+        self.assertEqual(table.imagePaths[2], '/images/02.jpg')
+        self.assertEqual(table.faceCount, 0 + 1 + 2 + 3 + 4)
+        self.assertEqual(list(table.offsets), [0, 0, 1, 3, 6, 10])
+        self.assertEqual(list(table.verified), [False, False, False, True, False])
+        self.assertEqual(table.imageSizes[0].tolist(), [480, 640, 3])
+        faces = table.faces(table.index('/images/04.jpg'))
+        self.assertEqual(table.boxes[faces][1].tolist(), [14, 20, 44, 60])
+        self.assertEqual(table.attributes[faces][:, 1].tolist(), [0, 0, 0, 0])
+        self.assertEqual(table.attributes[faces][:, 0].tolist(), [0, 1, 0, 1])
+        self.assertEqual([table.labelNames[code] for code in table.labels], ['face'] * 10)
+        self.assertEqual(table.faceImages().tolist(), [1, 2, 2, 3, 3, 3, 4, 4, 4, 4])
+
+    def test_cache_reparses_changed_files(self):
+        first = loadAnnotationTable(self.paths, self.cache, workers=0)
+        self.assertEqual(first.parsedCount, 5)
+        again = loadAnnotationTable(self.paths, self.cache, workers=0)
+        self.assertEqual(again.parsedCount, 0)
+        self.assertEqual(again.boxes.tolist(), first.boxes.tolist())
+
+        writeXML(self.paths[1], [('person', (1, 2, 3, 4), [1] * 13)])
+        os.remove(self.paths[4])
+        table = loadAnnotationTable(self.paths, self.cache, workers=0)
+        self.assertEqual(table.parsedCount, 1)
+        self.assertEqual(table.xmlPaths, self.paths[:4])
+        self.assertEqual(table.boxes[table.faces(1)].tolist(), [[1, 2, 3, 4]])
+        self.assertEqual(table.labelNames[table.labels[table.faces(1)][0]], 'person')
+        self.assertEqual(table.boxes[table.faces(3)].tolist(), first.boxes[first.faces(3)].tolist())
+        self.assertEqual(loadAnnotationTable(self.paths, self.cache, workers=0).parsedCount, 0)
+
+    def test_process_pool(self):
+        serial = loadAnnotationTable(self.paths, workers=0)
+        pooled = loadAnnotationTable(self.paths, workers=2, chunkSize=2)
+        self.assertEqual(pooled.xmlPaths, serial.xmlPaths)
+        self.assertEqual(pooled.offsets.tolist(), serial.offsets.tolist())
+        self.assertEqual(pooled.attributes.tolist(), serial.attributes.tolist())
+
+    def test_export_round_trip(self):
+        table = loadAnnotationTable(self.tmp, workers=0)
+        export = os.path.join(self.tmp, 'export')
+        exportTable(table, export)
+        self.assertEqual(np.load(os.path.join(export, 'boxes.npy'), mmap_mode='r').dtype, np.int32)
+        self.assertEqual(np.load(os.path.join(export, 'attributes.npy'), mmap_mode='r').dtype, np.uint8)
+
+        loaded = loadExport(export)
+        self.assertIsInstance(loaded.boxes, np.memmap)
+        self.assertEqual(list(loaded.imagePaths), table.imagePaths)
+        self.assertEqual(loaded.imagePaths[-1], '/images/04.jpg')
+        self.assertEqual(loaded.index('/images/03.jpg'), 3)
+        self.assertEqual(loaded.offsets.tolist(), table.offsets.tolist())
+        self.assertEqual(loaded.attributes.tolist(), table.attributes.tolist())
+        self.assertEqual(loaded.labelNames, ['face'])
+
+        # Re-import next to fresh image paths, then parse the XMLs back
+        target = os.path.join(self.tmp, 'reimported')
+        self.assertEqual(writeAnnotations(loaded, target, workers=0), [])
+        again = loadAnnotationTable(target, workers=0)
+        self.assertEqual(again.imagePaths, table.imagePaths)
+        self.assertEqual(again.verified.tolist(), table.verified.tolist())
+        self.assertEqual(again.imageSizes.tolist(), table.imageSizes.tolist())
+        self.assertEqual(again.boxes.tolist(), table.boxes.tolist())
+        self.assertEqual(again.attributes.tolist(), table.attributes.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+
+import numpy as np
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs import boxTracker
+from libs.boxTracker import iouMatrix, matchBoxes, propagateBoxes, trackBox
+
+
+def texture(height, width, seed=0):
+    """Smooth random texture, something the tracker can lock on to."""
+    noise = np.random.RandomState(seed).rand(height // 8 + 2, width // 8 + 2)
+    return (np.kron(noise, np.ones((8, 8)))[:height, :width] * 255).astype(np.uint8)
+
+
+class TestBoxTracker(TestCase):
+
+    def test_iou(self):
+        ious = iouMatrix([(0, 0, 10, 10), (20, 20, 30, 30)], [(5, 0, 15, 10), (0, 0, 10, 10)])
+        self.assertAlmostEqual(ious[0, 0], 50.0 / 150)
+        self.assertEqual(ious[0, 1], 1.0)
+        self.assertEqual(ious[1].tolist(), [0.0, 0.0])
+        self.assertEqual(iouMatrix([], [(0, 0, 1, 1)]).shape, (0, 1))
+
+        # Best pairs first, every box used once
+        self.assertEqual(matchBoxes([(0, 0, 10, 10), (1, 0, 11, 10)], [(1, 0, 11, 10)]), {1: 0})
+        self.assertEqual(matchBoxes([(0, 0, 10, 10)], [(5, 0, 15, 10)]), {})
+        self.assertEqual(matchBoxes([], []), {})
+
+    def test_track(self):
+        previous = texture(300, 400)
+        current = np.zeros_like(previous)
+        current[4:, :-7] = previous[:-4, 7:]
+        box, score = trackBox(previous, current, (100, 80, 180, 170))
+        self.assertEqual(box, (93, 84, 173, 174))
+        self.assertGreater(score, 0.9)
+
+        # A flat patch has nothing to match and stays
+        self.assertEqual(trackBox(np.zeros_like(previous), current, (100, 80, 180, 170)), ((100, 80, 180, 170), 0.0))
+
+        # Full-resolution boxes in and out, clipped to the image
+        boxes = propagateBoxes([(200, 160, 360, 340), (780, 0, 800, 20)], previous, (0.5, 0.5), current, (0.5, 0.5))
+        self.assertEqual(boxes[0], (186, 168, 346, 348))
+        self.assertLessEqual(boxes[1][2], 800)
+
+
+    def test_window_views(self):
+        # The stand-in for NumPy < 1.20 matches sliding_window_view()
+        array = texture(30, 40)
+        np.testing.assert_array_equal(boxTracker._windowViews(array, (5, 7)),
+                                      np.lib.stride_tricks.sliding_window_view(array, (5, 7)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+libs_path = os.path.join(dir_name, '..', 'libs')
+sys.path.insert(0, libs_path)
+from annotationCatalog import AnnotationCatalog, annotationPath
+from annotationCatalog import STATUS_UNANNOTATED, STATUS_ANNOTATED, STATUS_VERIFIED
+from pascal_voc_io import PascalVocWriter
+
+
+class TestAnnotationCatalog(TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.images = [os.path.join(self.root, 'img%d.jpg' % i) for i in range(4)]
+        for path in self.images:
+            open(path, 'w').close()
+        self.catalog = AnnotationCatalog.forDirectory(self.root, cacheDir=self.root)
+
+    def tearDown(self):
+        self.catalog.close()
+        shutil.rmtree(self.root)
+
+    def writeXML(self, imagePath, boxes, verified=False):
+        writer = PascalVocWriter(self.root, os.path.basename(imagePath), (480, 640, 3))
+        writer.verified = verified
+        for i in range(boxes):
+            writer.addBndBox(10 * i, 10, 10 * i + 5, 20, 'face', [1] * 13)
+        writer.save(annotationPath(imagePath))
+
+    def test_refresh(self):
+        self.writeXML(self.images[1], 2)
+        self.writeXML(self.images[2], 1, verified=True)
+        self.assertEqual(self.catalog.refresh(self.images), 2)
+        self.assertEqual(self.catalog.statuses(), {
+            self.images[0]: STATUS_UNANNOTATED, self.images[1]: STATUS_ANNOTATED,
+            self.images[2]: STATUS_VERIFIED, self.images[3]: STATUS_UNANNOTATED})
+        info = self.catalog.info(self.images[1])
+        self.assertEqual((info['boxes'], info['height'], info['width'], info['depth']), (2, 480, 640, 3))
+        self.assertEqual(self.catalog.faces(self.images[1])[1], ('face', 10, 10, 15, 20, [1] * 13))
+        # Unchanged XMLs are not parsed again
+        self.assertEqual(self.catalog.refresh(self.images), 0)
+
+        self.writeXML(self.images[3], 3)
+        self.catalog.update(self.images[3], annotationPath(self.images[3]))
+        self.assertEqual(self.catalog.status(self.images[3]), STATUS_ANNOTATED)
+        self.assertEqual(self.catalog.refresh(self.images[1:]), 0)
+        self.assertIsNone(self.catalog.info(self.images[0]))
+
+    def test_next_image(self):
+        self.writeXML(self.images[0], 1)
+        self.writeXML(self.images[2], 1, verified=True)
+        self.catalog.refresh(self.images)
+        unannotated = (STATUS_UNANNOTATED,)
+        unverified = (STATUS_UNANNOTATED, STATUS_ANNOTATED)
+        self.assertEqual(self.catalog.nextImage(self.images[0], unannotated), self.images[1])
+        self.assertEqual(self.catalog.nextImage(self.images[1], unannotated), self.images[3])
+        # Wraps around to the start
+        self.assertEqual(self.catalog.nextImage(self.images[3], unverified), self.images[0])
+        self.assertEqual(self.catalog.nextImage(None, (STATUS_VERIFIED,)), self.images[2])
+        self.assertIsNone(self.catalog.nextImage(self.images[2], (STATUS_VERIFIED,)))
+
+    def test_parallel_rebuild(self):
+        for path in self.images:
+            self.writeXML(path, 2)
+        self.assertEqual(self.catalog.rebuild(self.images, workers=2), len(self.images))
+        self.assertEqual(self.catalog.counts(), {STATUS_ANNOTATED: len(self.images)})
+
+    def test_cache_location(self):
+        from annotationCatalog import catalogFile
+        # Per dataset, outside of it
+        self.assertEqual(os.path.dirname(self.catalog.path), self.root)
+        self.assertNotEqual(catalogFile(self.root, '/cache'), catalogFile(os.path.join(self.root, 'a'), '/cache'))
+        self.assertEqual(os.path.dirname(catalogFile(self.root, '/cache')), '/cache')
+
+
+if __name__ == '__main__':
+    unittest.main()
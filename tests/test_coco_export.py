@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import json
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.attributes import ATTRIBUTE_TAGS
+from libs.cocoExport import exportCOCO
+from libs.pascal_voc_io import PascalVocWriter
+
+
+class TestCOCOExport(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        for i in range(5):
+            writer = PascalVocWriter('images', '%02d.jpg' % i, (480, 640, 3),
+                                     localImgPath='/data/images/%02d.jpg' % i)
+            writer.verified = i == 2
+            for j in range(i):
+                writer.addBndBox(10 * j, 20, 10 * j + 30, 60, 'person' if j == 2 else 'face',
+                                 [j % 2, i % 4] + [0] * 11)
+            writer.save(os.path.join(self.tmp, '%02d.xml' % i))
+        self.output = os.path.join(self.tmp, 'coco.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_export(self):
+        self.assertEqual(exportCOCO(self.tmp, self.output, imageRoot='/data', workers=0), (5, 10))
+        with open(self.output) as f:
+            coco = json.load(f)
+        self.assertEqual([image['id'] for image in coco['images']], [1, 2, 3, 4, 5])
+        self.assertEqual(coco['images'][3], {'id': 4, 'file_name': 'images/03.jpg', 'height': 480,
+                                             'width': 640, 'verified': False})
+        self.assertTrue(coco['images'][2]['verified'])
+        self.assertEqual([a['id'] for a in coco['annotations']], list(range(1, 11)))
+        self.assertEqual([a['image_id'] for a in coco['annotations']], [2, 3, 3, 4, 4, 4, 5, 5, 5, 5])
+        self.assertEqual(coco['categories'], [{'id': 1, 'name': 'face'}, {'id': 2, 'name': 'person'}])
+        annotation = coco['annotations'][4]
+        self.assertEqual(annotation['category_id'], 1)
+        self.assertEqual(annotation['bbox'], [10, 20, 30, 40])
+        self.assertEqual(annotation['area'], 1200)
+        self.assertEqual(annotation['attributes']['gender'], 1)
+        self.assertEqual(annotation['attributes']['age'], 3)
+        self.assertEqual(list(annotation['attributes']), list(ATTRIBUTE_TAGS))
+        self.assertEqual(coco['annotations'][5]['category_id'], 2)
+        self.assertEqual(coco['face_attributes'][0], {'name': 'gender', 'values': ['isfemale', 'ismale']})
+
+    def test_process_pool_keeps_order(self):
+        exportCOCO(self.tmp, self.output, workers=0)
+        with open(self.output) as f:
+            serial = json.load(f)
+        exportCOCO(self.tmp, self.output, workers=2, chunkSize=2)
+        with open(self.output) as f:
+            self.assertEqual(json.load(f), serial)
+
+    def test_empty_set(self):
+        empty = os.path.join(self.tmp, 'empty')
+        os.mkdir(empty)
+        self.assertEqual(exportCOCO(empty, self.output), (0, 0))
+        with open(self.output) as f:
+            coco = json.load(f)
+        self.assertEqual((coco['images'], coco['annotations'], coco['categories']), ([], [], []))
+
+
+if __name__ == '__main__':
+    unittest.main()
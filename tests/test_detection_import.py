@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import io
+import json
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.detectionImport import boxIoU, importDetections
+from libs.headless import Annotation, loadAnnotation, saveAnnotation
+
+
+class TestDetectionImport(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.saveDir = os.path.join(self.tmp, 'labels')
+        for name in ('a', 'b', 'c'):
+            shutil.copy(os.path.join(dir_name, 'test.bmp'), os.path.join(self.tmp, name + '.bmp'))
+        # a.bmp already has a face, c.bmp is verified
+        os.makedirs(self.saveDir)
+        existing = Annotation(os.path.join(self.tmp, 'a.bmp'))
+        existing.addFace('face', 100, 100, 200, 200, [1] * 13)
+        saveAnnotation(existing, os.path.join(self.saveDir, 'a.xml'))
+        verified = Annotation(os.path.join(self.tmp, 'c.bmp'), verified=True)
+        saveAnnotation(verified, os.path.join(self.saveDir, 'c.xml'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_iou(self):
+        self.assertEqual(boxIoU((0, 0, 10, 10), (0, 0, 10, 10)), 1.0)
+        self.assertEqual(boxIoU((0, 0, 10, 10), (10, 0, 20, 10)), 0.0)
+        self.assertAlmostEqual(boxIoU((0, 0, 10, 10), (5, 0, 15, 10)), 50.0 / 150)
+
+    def test_csv_import(self):
+        dump = os.path.join(self.tmp, 'detections.csv')
+        with io.open(dump, 'w') as f:
+            f.write(u'image,xmin,ymin,xmax,ymax,score,mask\n'
+                    u'a.bmp,105,102,204,198,0.9,1\n'    # duplicate of the existing face
+                    u'b.bmp,10,10,50,60,0.8,\n'
+                    u'a.bmp,300,300,350,350,0.7,1\n'
+                    u'b.bmp,12,10,52,60,0.95,0\n'       # beats the 0.8 box it overlaps
+                    u'c.bmp,10,10,50,60,0.9,\n'
+                    u'b.bmp,400,400,420,420,0.1,\n')    # below min score
+        result = importDetections(dump, self.saveDir, minScore=0.5, workers=0)
+        self.assertEqual(result[:4], (2, 2, 2, 1))
+        self.assertEqual(result.failures, [])
+
+        a = loadAnnotation(os.path.join(self.saveDir, 'a.xml'))
+        self.assertEqual([face.box for face in a.faces], [(100, 100, 200, 200), (300, 300, 350, 350)])
+        self.assertEqual(a.faces[1].attribute('mask'), 1)
+        b = loadAnnotation(os.path.join(self.saveDir, 'b.xml'))
+        self.assertEqual([face.box for face in b.faces], [(12, 10, 52, 60)])
+        self.assertEqual(b.size, [512, 512, 3])
+        self.assertFalse(b.verified)
+        self.assertEqual(loadAnnotation(os.path.join(self.saveDir, 'c.xml')).faces, [])
+        self.assertEqual(sorted(os.listdir(self.saveDir)), ['a.xml', 'b.xml', 'c.xml'])
+
+    def test_malformed_lines(self):
+        dump = os.path.join(self.tmp, 'detections.csv')
+        with io.open(dump, 'w') as f:
+            f.write(u'image,xmin,ymin,xmax,ymax,score,mask\n'
+                    u'b.bmp,10,10,50,60,0.8,\n'
+                    u'b.bmp,10,ten,50,60,0.8,\n'
+                    u'a.bmp,10,10,50,60,0.9,yes\n'
+                    u'a.bmp,10,10\n'
+                    u'a.bmp,300,300,350,360,0.9,1\n')
+        result = importDetections(dump, self.saveDir, workers=0)
+        # Only the bad lines are skipped, each reported by line number
+        self.assertEqual(result[:2], (2, 2))
+        self.assertEqual([where for where, _ in result.failures], ['%s:%d' % (dump, n) for n in (3, 4, 5)])
+
+        dump = os.path.join(self.tmp, 'detections.jsonl')
+        with io.open(dump, 'w') as f:
+            f.write(u'{"image": "b.bmp", "box": [1, 2, 3]}\n{"image": "b.bmp"\n'
+                    u'{"image": "b.bmp", "box": [300, 300, 350, 350], "attributes": {"mask": "x"}}\n')
+        result = importDetections(dump, self.saveDir, workers=0)
+        self.assertEqual(result[:2], (0, 0))
+        self.assertEqual(len(result.failures), 3)
+
+    def test_json_lines_over_buckets(self):
+        dump = os.path.join(self.tmp, 'detections.jsonl')
+        with io.open(dump, 'w') as f:
+            for i in range(30):
+                name = 'b.bmp' if i % 2 else 'missing.bmp'
+                f.write(json.dumps({'image': name, 'box': [i * 15, 0, i * 15 + 10, 10], 'score': 0.9,
+                                    'label': 'face', 'attributes': {'gender': 1}}) + u'\n')
+        result = importDetections(dump, self.saveDir, workers=2, bucketBytes=200)
+        self.assertEqual(result[:4], (1, 15, 0, 0))
+        self.assertEqual([os.path.basename(path) for path, _ in result.failures], ['missing.bmp'])
+        b = loadAnnotation(os.path.join(self.saveDir, 'b.xml'))
+        self.assertEqual(len(b.faces), 15)
+        self.assertEqual(set(face.attribute('gender') for face in b.faces), set([1]))
+
+        # Importing again only finds duplicates
+        self.assertEqual(importDetections(dump, self.saveDir, workers=0)[:3], (0, 0, 15))
+
+
+if __name__ == '__main__':
+    unittest.main()
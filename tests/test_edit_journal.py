@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+libs_path = os.path.join(dir_name, '..', 'libs')
+sys.path.insert(0, libs_path)
+from PyQt5.QtCore import QPointF
+import editJournal
+from editJournal import EditJournal, fileStamp, readJournal, recoverSessions, replay, removeSession, \
+    rewriteSession
+from shape import Shape
+
+
+def box(label, x1, y1, x2, y2):
+    shape = Shape(label=label)
+    for x, y in ((x1, y1), (x2, y1), (x2, y2), (x1, y2)):
+        shape.addPoint(QPointF(x, y))
+    shape.close()
+    return shape
+
+
+def faces(shapes):
+    return [(s.label, [[p.x(), p.y()] for p in s.points], list(s.attributes)) for s in shapes]
+
+
+class TestEditJournal(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.journal = EditJournal(self.tmp)
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.tmp)
+
+    def records(self):
+        self.journal.flush()
+        return readJournal(self.journal.path)
+
+    def ops(self):
+        return [record['op'] for record in self.records()]
+
+    def test_replay_edits(self):
+        shapes = [box('face', 0, 0, 10, 10), box('face', 20, 20, 30, 30)]
+        self.journal.open('a.jpg', 'a.xml', shapes, False)
+        self.assertEqual(self.journal.record(shapes, False), [])
+
+        shapes.append(box('face', 5, 5, 15, 15))
+        self.journal.record(shapes, False)
+        shapes[0].moveBy(QPointF(3, 4))
+        shapes[1].moveVertexBy(2, QPointF(5, 5))
+        shapes[2].attributes[0] = 1
+        shapes[2].label = 'person'
+        self.journal.record(shapes, True)
+        del shapes[1]
+        self.journal.record(shapes, True)
+        self.assertEqual(self.ops(), ['open', 'create', 'move', 'resize', 'label',
+                                      'attributes', 'verified', 'delete'])
+
+        recovered = replay(self.records())
+        self.assertEqual(len(recovered), 1)
+        self.assertEqual(recovered[0].xmlPath, 'a.xml')
+        self.assertTrue(recovered[0].verified)
+        self.assertEqual(recovered[0].faces(), [tuple(face) for face in faces(shapes)])
+
+    def test_commit_and_discard(self):
+        a = [box('face', 0, 0, 10, 10)]
+        self.journal.open('a.jpg', 'a.xml', a, False)
+        a[0].moveBy(QPointF(1, 1))
+        self.journal.record(a, False)
+        seq = self.journal.seq
+        a[0].moveBy(QPointF(1, 1))
+        self.journal.record(a, False)
+        # A save of the earlier state does not cover the later edit
+        self.journal.commit('a.xml', seq)
+        self.assertEqual([r.xmlPath for r in replay(self.records())], ['a.xml'])
+
+        # Moving on keeps a.xml's unsaved edits until they are committed
+        b = [box('face', 0, 0, 10, 10)]
+        self.journal.open('b.jpg', 'b.xml', b, False)
+        b[0].label = 'other'
+        self.journal.record(b, False)
+        self.journal.commit('a.xml', self.journal.seq)
+        self.assertEqual([r.xmlPath for r in replay(self.records())], ['b.xml'])
+        self.journal.discard()
+        self.assertEqual(replay(self.records()), [])
+
+    def test_compact(self):
+        shapes = [box('face', 0, 0, 10, 10)]
+        self.journal.open('a.jpg', 'a.xml', shapes, False)
+        for _ in range(50):
+            shapes[0].moveBy(QPointF(1, 0))
+            self.journal.record(shapes, False)
+        self.journal.flush()
+        size = os.path.getsize(self.journal.path)
+        self.journal.compact()
+        self.assertLess(os.path.getsize(self.journal.path), size)
+        self.assertEqual(self.ops(), ['open'])
+        shapes[0].moveBy(QPointF(0, 1))
+        self.journal.record(shapes, False)
+        recovered = replay(self.records())
+        self.assertEqual(recovered[0].faces(), [tuple(face) for face in faces(shapes)])
+
+    def test_recover_dead_sessions_only(self):
+        shapes = [box('face', 0, 0, 10, 10)]
+        self.journal.open('a.jpg', 'a.xml', shapes, False)
+        shapes[0].label = 'edited'
+        self.journal.record(shapes, False)
+        # This session holds its lock
+        self.assertEqual(recoverSessions(self.tmp), [])
+
+        # A crashed session: its lock is free, its last line torn
+        dead = os.path.join(self.tmp, '1' + editJournal.JOURNAL_EXT)
+        self.journal.flush()
+        shutil.copy(self.journal.path, dead)
+        with open(dead, 'a') as f:
+            f.write('{"op": "delete", "id"')
+        sessions = recoverSessions(self.tmp)
+        self.assertEqual([path for path, _ in sessions], [dead])
+        self.assertEqual(sessions[0][1][0].faces()[0][0], 'edited')
+        removeSession(dead)
+        self.assertFalse(os.path.exists(dead))
+
+        self.journal.close()
+        self.assertEqual(os.listdir(self.tmp), [])
+
+    def test_xml_stamps(self):
+        xmlPath = os.path.join(self.tmp, 'a.xml')
+        shapes = [box('face', 0, 0, 10, 10)]
+        self.journal.open('a.jpg', xmlPath, shapes, False)
+        shapes[0].label = 'edited'
+        self.journal.record(shapes, False)
+        # No XML when the image was opened, and none since
+        recovered = replay(self.records())
+        self.assertIsNone(recovered[0].xmlStamp)
+        self.assertFalse(recovered[0].xmlChanged())
+
+        # A save of ours restamps it for the edits after it
+        with open(xmlPath, 'w') as f:
+            f.write('<annotation/>')
+        seq = self.journal.seq
+        shapes[0].label = 'again'
+        self.journal.record(shapes, False)
+        self.journal.commit(xmlPath, seq)
+        recovered = replay(self.records())
+        self.assertEqual(recovered[0].xmlStamp, fileStamp(xmlPath))
+        self.assertFalse(recovered[0].xmlChanged())
+        with open(xmlPath, 'a') as f:
+            f.write('\n')
+        self.assertTrue(recovered[0].xmlChanged())
+
+        # A crashed session's journal cut down to what a recovery left out
+        dead = os.path.join(self.tmp, '1' + editJournal.JOURNAL_EXT)
+        shutil.copy(self.journal.path, dead)
+        rewriteSession(dead, recovered)
+        kept = replay(readJournal(dead))
+        self.assertEqual(kept[0].faces(), recovered[0].faces())
+        self.assertTrue(kept[0].xmlChanged())
+        rewriteSession(dead, [])
+        self.assertFalse(os.path.exists(dead))
+
+    def test_write_failure(self):
+        # A file where the journal directory should be
+        blocker = os.path.join(self.tmp, 'blocker')
+        open(blocker, 'w').close()
+        journal = EditJournal(blocker)
+        shapes = [box('face', 0, 0, 10, 10)]
+        journal.open('a.jpg', 'a.xml', shapes, False)
+        shapes[0].label = 'edited'
+        # Edits are still tracked for undo, only not written
+        self.assertEqual(len(journal.record(shapes, False)), 1)
+        self.assertIsInstance(journal.error, OSError)
+        journal.compact()
+        journal.close()
+
+    def test_buffered_writes(self):
+        shapes = [box('face', 0, 0, 10, 10)]
+        self.journal.open('a.jpg', 'a.xml', shapes, False)
+        size = os.path.getsize(self.journal.path)
+        shapes[0].moveBy(QPointF(1, 0))
+        self.journal.record(shapes, False, touched=shapes)
+        # Written on flush(), not per record
+        self.assertEqual(os.path.getsize(self.journal.path), size)
+        self.assertEqual(self.ops(), ['open', 'move'])
+
+    def test_touched_records(self):
+        shapes = [box('face', i, i, i + 10, i + 10) for i in range(4)]
+        self.journal.open('a.jpg', 'a.xml', shapes, False)
+        removed = shapes.pop(1)
+        shapes.append(box('face', 50, 50, 60, 60))
+        changes = self.journal.record(shapes, False, touched=[removed])
+        self.assertEqual([op['op'] for op, _ in changes], ['delete', 'create'])
+        self.assertEqual(changes[0][1], ('face', [[1, 1], [11, 1], [11, 11], [1, 11]], [0] * 13))
+
+        # Put back by its id, in its place
+        sid = changes[0][0]['id']
+        index = self.journal.indexOf(shapes, sid)
+        self.assertEqual(index, 1)
+        shapes.insert(index, removed)
+        self.journal.adopt(removed, sid)
+        self.assertEqual([op['op'] for op, _ in self.journal.record(shapes, False, touched=[removed])],
+                         ['create'])
+        self.assertEqual(self.journal.current.faces(), [tuple(face) for face in faces(shapes)])
+        self.assertEqual(replay(self.records())[0].faces(), [tuple(face) for face in faces(shapes)])
+
+    def test_session_names(self):
+        other = EditJournal(self.tmp)
+        self.assertNotEqual(other.path, self.journal.path)
+        # A journal already there is appended to, not truncated
+        with open(other.path, 'w') as f:
+            f.write('{"op": "discard", "xml": "old.xml"}\n')
+        other.open('a.jpg', 'a.xml', [], False)
+        other.flush()
+        self.assertEqual([record['op'] for record in readJournal(other.path)], ['discard', 'open'])
+        other.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
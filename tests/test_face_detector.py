@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(dir_name, '..'))
+from libs.faceDetector import DETECTORS, detectFaces, detectorAvailable, getDetector
+
+# A GUI-like main module: it loads Qt, then detects on a worker pool
+WORKER_SCRIPT = '''
+import sys
+sys.path[:0] = [%r, %r]
+import PyQt5.QtCore
+from libs.faceDetector import detectFaces
+from libs.workerPool import spawnPool
+from test_face_detector import QtProbe
+
+if __name__ == '__main__':
+    with spawnPool(1) as pool:
+        print(' '.join(pool.submit(detectFaces, QtProbe(), %r).result()[2]))
+'''
+
+
+class BrokenDetector(object):
+
+    def detect(self, imagePath):
+        raise RuntimeError('no model')
+
+
+class QtProbe(object):
+    """Proposes the names of the Qt modules loaded in its process."""
+
+    def detect(self, imagePath):
+        return [name for name in sys.modules if name.split('.')[0] in ('PyQt4', 'PyQt5')]
+
+
+class TestFaceDetector(TestCase):
+
+    def test_registry(self):
+        self.assertIn('haar', DETECTORS)
+        self.assertTrue(detectorAvailable('stub'))
+        self.assertFalse(detectorAvailable('missing'))
+        self.assertRaises(ValueError, getDetector, 'missing')
+
+    def test_stub_detector(self):
+        imagePath = os.path.join(dir_name, 'test.bmp')
+        path, stamp, boxes = detectFaces(getDetector('stub'), imagePath)
+        self.assertEqual(path, imagePath)
+        self.assertEqual(stamp[1], os.path.getsize(imagePath))
+        self.assertEqual(boxes, [(171, 171, 341, 341, 1.0)])
+        self.assertEqual(getDetector('stub', boxes=[(1, 2, 3, 4, 0.5)]).detect(imagePath), [(1, 2, 3, 4, 0.5)])
+        self.assertEqual(detectFaces(getDetector('stub'), os.path.join(dir_name, 'missing.jpg'))[1:], (None, []))
+        # A failing detector proposes nothing instead of raising in the worker
+        self.assertEqual(detectFaces(BrokenDetector(), imagePath)[2], [])
+
+    def test_workers_without_qt(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            script = os.path.join(tmp, 'gui.py')
+            with open(script, 'w') as f:
+                f.write(WORKER_SCRIPT % (os.path.join(dir_name, '..'), dir_name,
+                                         os.path.join(dir_name, 'test.bmp')))
+            self.assertEqual(subprocess.check_output([sys.executable, script]).decode().strip(), '')
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
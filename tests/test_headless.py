@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import shutil
+import subprocess
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+root_path = os.path.join(dir_name, '..')
+sys.path.insert(0, root_path)
+from libs.headless import Annotation, annotationPath, findAnnotations, iterAnnotations, loadAnnotation, \
+    saveAnnotation
+
+IMPORT_BUDGET = 0.05
+
+IMPORT_SCRIPT = '''
+import sys, time
+start = time.perf_counter()
+import libs.headless
+elapsed = time.perf_counter() - start
+print(elapsed)
+print(' '.join(name for name in sys.modules if name.split('.')[0] in ('PyQt4', 'PyQt5', 'lxml')))
+'''
+
+
+class TestHeadless(TestCase):
+
+    def test_import_without_qt(self):
+        # Best of a few runs in a fresh interpreter, so a busy machine does
+        # not fail the test; the .pyc files are written by the first one
+        timings = []
+        for _ in range(3):
+            output = subprocess.check_output([sys.executable, '-c', IMPORT_SCRIPT],
+                                             cwd=root_path).decode().split('\n')
+            timings.append(float(output[0]))
+            self.assertEqual(output[1], '')
+        self.assertLess(min(timings), IMPORT_BUDGET)
+
+    def test_round_trip(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            imagePath = os.path.join(tmp, 'test.bmp')
+            shutil.copy(os.path.join(dir_name, 'test.bmp'), imagePath)
+            annotation = Annotation(imagePath, verified=True)
+            annotation.addFace('face', 10, 20, 110, 120, [1, 2, 1, 2, 1, 1, 2, 2, 1, 4, 2, 2, 4])
+            # Out-of-range codes are clamped like the GUI does
+            annotation.addFace('face', 30, 40, 60, 70, [9])
+            xmlPath = saveAnnotation(annotation)
+            self.assertEqual(xmlPath, annotationPath(imagePath))
+
+            loaded = loadAnnotation(xmlPath)
+            self.assertTrue(loaded.verified)
+            self.assertEqual(loaded.imagePath, imagePath)
+            self.assertEqual(loaded.size, [512, 512, 3])
+            self.assertEqual(loaded.faces, annotation.faces)
+            self.assertEqual(loaded.faces[0].box, (10, 20, 110, 120))
+            self.assertEqual(loaded.faces[0].attribute('illumination'), 4)
+            self.assertEqual(loaded.faces[1].attribute('gender'), 1)
+
+            self.assertEqual([a.xmlPath for a in iterAnnotations(tmp)], [xmlPath])
+            self.assertRaises(IOError, loadAnnotation, os.path.join(tmp, 'missing.xml'))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_find_annotations(self):
+        tmp = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(tmp, 'b'))
+            for name in ('b/c.xml', 'a.XML', 'a.jpg', 'classes.txt', 'b/d.txt'):
+                open(os.path.join(tmp, name), 'w').close()
+            self.assertEqual(findAnnotations(tmp), [os.path.join(tmp, 'a.XML'), os.path.join(tmp, 'b', 'c.xml')])
+            self.assertEqual(findAnnotations(tmp, recursive=False), [os.path.join(tmp, 'a.XML')])
+            self.assertEqual(findAnnotations(tmp, isAnnotation=lambda name: name.endswith('.txt')),
+                             [os.path.join(tmp, 'classes.txt'), os.path.join(tmp, 'b', 'd.txt')])
+        finally:
+            shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    unittest.main()
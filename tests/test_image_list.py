@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import shutil
+import tempfile
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+libs_path = os.path.join(dir_name, '..', 'libs')
+sys.path.insert(0, libs_path)
+from imageList import ImageList, iterImagePaths
+
+
+class TestImageList(TestCase):
+
+    def test_navigation(self):
+        images = ImageList(['c.jpg', 'a.jpg', 'b.jpg'])
+        self.assertEqual(len(images), 3)
+        self.assertEqual(images.index('a.jpg'), 1)
+        self.assertIn('b.jpg', images)
+        self.assertEqual(images.nextPath('a.jpg'), 'b.jpg')
+        self.assertEqual(images.prevPath('a.jpg'), 'c.jpg')
+        self.assertIsNone(images.prevPath('c.jpg'))
+        self.assertIsNone(images.nextPath('b.jpg'))
+        self.assertIsNone(images.nextPath('missing.jpg'))
+        self.assertRaises(ValueError, images.index, 'missing.jpg')
+
+    def test_reorder(self):
+        images = ImageList(['c.jpg', 'a.jpg', 'b.jpg'])
+        images.sort()
+        self.assertEqual(images, ['a.jpg', 'b.jpg', 'c.jpg'])
+        self.assertEqual(images.index('c.jpg'), 2)
+        images.filter(lambda path: path != 'b.jpg')
+        self.assertEqual(images.nextPath('a.jpg'), 'c.jpg')
+        self.assertNotIn('b.jpg', images)
+        images.append('d.jpg')
+        self.assertEqual(images.index('d.jpg'), 2)
+        self.assertEqual(images[1:], ['c.jpg', 'd.jpg'])
+
+    def test_scan_order(self):
+        root = tempfile.mkdtemp()
+        try:
+            names = ['b.jpg', 'b/c.jpg', 'A/x.PNG', 'a-b.jpg', 'ab/z.bmp', 'a.jpeg', 'notes.txt']
+            for name in names:
+                path = os.path.join(root, name)
+                if not os.path.isdir(os.path.dirname(path)):
+                    os.makedirs(os.path.dirname(path))
+                open(path, 'w').close()
+            found = list(iterImagePaths(root))
+            expected = sorted((os.path.join(root, name) for name in names if not name.endswith('.txt')),
+                              key=lambda x: x.lower())
+            self.assertEqual(found, expected)
+            self.assertEqual(list(iterImagePaths(root, cancelled=lambda: True)), [])
+        finally:
+            shutil.rmtree(root)
+
+    @unittest.skipUnless(hasattr(os, 'symlink'), 'needs symlinks')
+    def test_scan_symlink_loop(self):
+        root = tempfile.mkdtemp()
+        try:
+            os.mkdir(os.path.join(root, 'dir'))
+            open(os.path.join(root, 'dir', 'a.jpg'), 'w').close()
+            os.symlink(root, os.path.join(root, 'dir', 'loop'))
+            # Not followed, so each image is found once
+            self.assertEqual(list(iterImagePaths(root)), [os.path.join(root, 'dir', 'a.jpg')])
+        finally:
+            shutil.rmtree(root)
+
+
+
+if __name__ == '__main__':
+    unittest.main()
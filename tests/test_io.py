@@ -13,9 +13,9 @@ class TestPascalVocRW(TestCase):
 
         # Test Write/Read
         writer = PascalVocWriter('tests', 'test', (512, 512, 1), localImgPath='tests/test.bmp')
-        difficult = 1
-        writer.addBndBox(60, 40, 430, 504, 'person', difficult)
-        writer.addBndBox(113, 40, 450, 403, 'face', difficult)
+        attributes = [1, 2, 1, 2, 1, 1, 2, 2, 1, 4, 2, 2, 4]
+        writer.addBndBox(60, 40, 430, 504, 'person', attributes)
+        writer.addBndBox(113, 40, 450, 403, 'face')
         writer.save('tests/test.xml')
 
         reader = PascalVocReader('tests/test.xml')
@@ -27,6 +27,83 @@ class TestPascalVocRW(TestCase):
         self.assertEqual(personBndBox[1], [(60, 40), (430, 40), (430, 504), (60, 504)])
         self.assertEqual(face[0], 'face')
         self.assertEqual(face[1], [(113, 40), (450, 40), (450, 403), (113, 403)])
+        self.assertEqual(personBndBox[4], attributes)
+        self.assertEqual(face[4], [0] * 13)
+
+    def test_stream_matches_prettify(self):
+        import shutil
+        import tempfile
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        from pascal_voc_io import PascalVocWriter
+
+        writer = PascalVocWriter('a  folder', u'<b&c>屏.jpg', (512, 256), localImgPath='')
+        writer.verified = True
+        writer.addBndBox(1, 40, 256, 504, 'face', [1, 2, 1, 2, 1, 1, 2, 2, 1, 4, 2, 2, 4])
+        writer.addBndBox(113, 40, 200, 403, 'face', [0] * 13)
+
+        root = writer.genXML()
+        writer.appendObjects(root)
+        expected = writer.prettify(root)
+        tmp = tempfile.mkdtemp()
+        try:
+            target = os.path.join(tmp, 'test.xml')
+            writer.save(target)
+            with open(target, 'rb') as f:
+                self.assertEqual(f.read(), expected)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_atomic_save(self):
+        import shutil
+        import stat
+        import tempfile
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        libs_path = os.path.join(dir_name, '..', 'libs')
+        sys.path.insert(0, libs_path)
+        from pascal_voc_io import PascalVocWriter
+
+        tmp = tempfile.mkdtemp()
+        try:
+            target = os.path.join(tmp, 'a.xml')
+            writer = PascalVocWriter('tmp', 'a.jpg', (10, 10, 3))
+            writer.save(target)
+            os.chmod(target, 0o640)
+            writer.addBndBox(1, 1, 5, 5, 'face')
+            writer.save(target)
+            # Replaced in one step: no temp file left, the old mode kept
+            self.assertEqual(os.listdir(tmp), ['a.xml'])
+            self.assertEqual(stat.S_IMODE(os.stat(target).st_mode), 0o640)
+            # A failed write leaves the old file alone
+            os.mkdir(os.path.join(tmp, 'b.xml'))
+            self.assertRaises(OSError, writer.save, os.path.join(tmp, 'b.xml'))
+            self.assertEqual(sorted(os.listdir(tmp)), ['a.xml', 'b.xml'])
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_attribute_codec(self):
+        from xml.etree import ElementTree
+        from libs.attributes import parseAttributes, normalizeAttributes
+
+        # Out-of-range values decode the way the old if/elif chains did,
+        # a missing tag decodes to 0.
+        element = ElementTree.fromstring(
+            '<object><gender>2</gender><age>7</age><mask>1</mask><mouth>01</mouth>'
+            '<eyeglass>5</eyeglass><sunglass>3</sunglass><eye>-1</eye><emotion>9</emotion>'
+            '<blurriness>0</blurriness><illumination>4</illumination><yaw>2</yaw>'
+            '<roll>1</roll></object>')
+        self.assertEqual(parseAttributes(element), [1, 3, 1, 1, 1, 0, 2, 0, 0, 4, 2, 1, 0])
+        self.assertEqual(normalizeAttributes([1, 9]), [1, 3] + [0] * 11)
+
+    def test_image_probe(self):
+        from libs.imageProbe import probeImageShape, imageShape
+
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        self.assertEqual(probeImageShape(os.path.join(dir_name, 'test.bmp')), [512, 512, 3])
+        self.assertEqual(probeImageShape(os.path.join(dir_name, u'臉書.jpg')), [32, 33, 3])
+        self.assertEqual(imageShape(os.path.join(dir_name, u'屏幕截图.png')), [1347, 2505, 3])
+        self.assertEqual(probeImageShape(os.path.join(dir_name, 'test_io.py')), None)
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,17 @@
 
+import atexit
+import os
+import shutil
+import tempfile
 from unittest import TestCase
 
+# The windows keep catalogs and journals in a scratch user directory: a
+# journal left by a crashed run would have the next one ask to recover it
+os.environ['XDG_CACHE_HOME'] = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, os.environ['XDG_CACHE_HOME'], True)
+
 from labelImg import get_main_app
+from libs.pascal_voc_io import PascalVocReader
 
 
 class TestMainWindow(TestCase):
@@ -11,6 +21,9 @@ class TestMainWindow(TestCase):
 
     def setUp(self):
         self.app, self.win = get_main_app()
+        # Freeing the application deletes its windows under live wrappers
+        # of their children, so every test shares the first one
+        TestMainWindow.app = self.app
 
     def tearDown(self):
         self.win.close()
@@ -18,3 +31,620 @@ class TestMainWindow(TestCase):
 
     def test_noop(self):
         pass
+
+    def test_prefetch(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        images = [os.path.join(dir_name, name) for name in ('test.bmp', u'臉書.jpg', u'屏幕截图.png')]
+        prefetcher = self.win.prefetcher
+        prefetcher.prefetch(images, 0)
+        prefetcher.waitForDone()
+        self.app.processEvents()
+        self.assertFalse(prefetcher.get(images[2]).isNull())
+        self.assertEqual(prefetcher.hits, 1)
+
+        # Jumping away drops the old window from the cache's wanted set
+        prefetcher.prefetch(images, 2)
+        self.assertNotIn(images[0], prefetcher.wanted)
+        self.assertIsNone(prefetcher.get(os.path.join(dir_name, 'missing.jpg')))
+        self.assertEqual(prefetcher.misses, 1)
+
+    def test_import_dir(self):
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        self.win.importDirImages(dir_name)
+        while self.win.scanner is not None:
+            self.app.processEvents()
+        images = list(self.win.mImgList)
+        self.assertEqual(images, self.win.scanAllImages(dir_name))
+        self.assertEqual(self.win.fileListModel.rowCount(), len(images))
+        # The first image is opened as soon as the scan finds it
+        self.assertEqual(self.win.filePath, images[0])
+        self.assertEqual(self.win.fileListView.currentIndex().row(), 0)
+
+    def test_catalog_failure(self):
+        import shutil
+        import tempfile
+        from libs.fileListModel import CatalogRefresher
+
+        tmp = tempfile.mkdtemp()
+        try:
+            # A file where the cache directory should be
+            blocker = os.path.join(tmp, 'cache')
+            open(blocker, 'w').close()
+            refresher = CatalogRefresher(os.path.join(blocker, 'catalog.sqlite'), [])
+            errors = []
+            refresher.failed.connect(errors.append)
+            refresher.run()
+            self.assertEqual(len(errors), 1)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_canvas_hit_test(self):
+        from PyQt5.QtCore import QPointF
+        from PyQt5.QtGui import QPixmap
+        from libs.canvas import Canvas
+        from libs.shape import Shape
+
+        def box(x, y, size):
+            shape = Shape('face')
+            for px, py in ((x, y), (x + size, y), (x + size, y + size), (x, y + size)):
+                shape.addPoint(QPointF(px, py))
+            shape.close()
+            return shape
+
+        canvas = Canvas()
+        canvas.loadPixmap(QPixmap(1000, 1000))
+        bottom, top = box(100, 100, 200), box(150, 150, 100)
+        canvas.loadShapes([bottom, top])
+        canvas.selectShapePoint(QPointF(200, 200))
+        self.assertIs(canvas.selectedShape, top)
+
+        # Moving a shape keeps the index in step
+        canvas.prevPoint = QPointF(200, 200)
+        canvas.calculateOffsets(top, QPointF(200, 200))
+        canvas.boundedMoveShape(top, QPointF(700, 700))
+        canvas.selectShapePoint(QPointF(200, 200))
+        self.assertIs(canvas.selectedShape, bottom)
+        canvas.selectShapePoint(QPointF(700, 700))
+        self.assertIs(canvas.selectedShape, top)
+
+        self.assertIs(canvas.deleteSelected(), top)
+        canvas.selectShapePoint(QPointF(700, 700))
+        self.assertIsNone(canvas.selectedShape)
+
+    def test_shape_geometry_cache(self):
+        from PyQt5.QtCore import QPointF
+        from libs.shape import Shape
+
+        shape = Shape('face')
+        for x, y in ((0, 0), (10, 0), (10, 10), (0, 10)):
+            shape.addPoint(QPointF(x, y))
+        self.assertEqual(shape.boundingRect().width(), 10)
+        self.assertIs(shape.linePath(), shape.linePath())
+
+        shape.moveBy(QPointF(100, 0))
+        self.assertEqual(shape.boundingRect().left(), 100)
+        self.assertFalse(shape.containsPoint(QPointF(5, 5)))
+        shape.moveVertexBy(2, QPointF(10, 10))
+        self.assertEqual(shape.boundingRect().height(), 20)
+        shape[0] = QPointF(50, 0)
+        self.assertEqual(shape.boundingRect().left(), 50)
+        shape.popPoint()
+        self.assertEqual(shape.boundingRect().left(), 50)
+        shape.points = [QPointF(0, 0), QPointF(1, 1)]
+        self.assertEqual(shape.boundingRect().width(), 1)
+
+        # Vertex markers follow the zoom level
+        Shape.scale = 1.0
+        before = shape.vertexPath().boundingRect().width()
+        Shape.scale = 2.0
+        self.assertLess(shape.vertexPath().boundingRect().width(), before)
+        Shape.scale = 1.0
+
+    def test_canvas_partial_paint(self):
+        from PyQt5.QtCore import QPointF, QRect
+        from PyQt5.QtGui import QPixmap
+        from libs.canvas import Canvas
+        from libs.shape import Shape
+
+        canvas = Canvas()
+        canvas.verified = True
+        self.assertEqual(canvas.palette().color(canvas.backgroundRole()).green(), 239)
+        canvas.verified = False
+        self.assertEqual(canvas.palette().color(canvas.backgroundRole()).green(), 232)
+
+        canvas.loadPixmap(QPixmap(400, 300))
+        canvas.scale = 2.0
+        canvas.resize(800, 600)
+        # Widget and image coordinates agree in both directions
+        self.assertEqual(canvas.imageRect(QRect(200, 100, 80, 40)).getRect(), (100, 50, 40, 20))
+        self.assertFalse(canvas.grab(QRect(10, 10, 50, 50)).isNull())
+
+        # A zero-width box has an empty bounding rect, and is painted anyway
+        canvas.scale = 1.0
+        canvas.resize(400, 300)
+        line = Shape('face')
+        for x, y in ((100, 100), (100, 100), (100, 200), (100, 200)):
+            line.addPoint(QPointF(x, y))
+        line.close()
+        canvas.loadShapes([line])
+        canvas.selectShape(line)
+        painted = []
+        line.paint = painted.append
+        canvas.grab(QRect(90, 140, 20, 20))
+        self.assertEqual(len(painted), 1)
+
+    def test_image_pyramid(self):
+        from PyQt5.QtCore import QRectF
+        from PyQt5.QtGui import QColor, QImage, QPainter
+        from libs.imagePyramid import ImagePyramid
+
+        image = QImage(300, 200, QImage.Format_RGB32)
+        image.fill(QColor(10, 200, 30))
+        pyramid = ImagePyramid(image, tileSize=64, cacheMB=0.1)
+        self.assertEqual(pyramid.maxLevel, 3)
+        self.assertEqual(pyramid.levelFor(1.0), 0)
+        self.assertEqual(pyramid.levelFor(0.3), 1)
+        self.assertEqual(pyramid.levelFor(0.01), 3)
+        self.assertEqual(pyramid.levelSize(1), (150, 100))
+        self.assertEqual(pyramid.tilesIn(1, QRectF(0, 0, 300, 200))[-1], (1, 2, 1))
+        self.assertEqual(pyramid.tileRect(1, 2, 1).getRect(), (256.0, 128.0, 44.0, 72.0))
+
+        # Edge tiles are clipped and every level keeps the colors
+        tile = pyramid.renderTile(2, 1, 0)
+        self.assertEqual((tile.width(), tile.height()), (11, 50))
+        self.assertEqual(QColor(tile.pixel(5, 5)).getRgb()[:3], (10, 200, 30))
+        # The cache stays bounded by cacheMB
+        self.assertLessEqual(pyramid.stats()['megabytes'], 0.1)
+
+        target = QImage(100, 100, QImage.Format_ARGB32_Premultiplied)
+        painter = QPainter(target)
+        painter.scale(0.25, 0.25)
+        pyramid.paint(painter, QRectF(0, 0, 300, 200), 2)
+        painter.end()
+        self.assertEqual(QColor(target.pixel(20, 20)).getRgb()[:3], (10, 200, 30))
+        pyramid.waitForDone()
+
+        # Cancelling returns at once and drops the cache; a tile finished
+        # after that is not kept
+        pyramid.cancel()
+        self.assertEqual(pyramid.stats()['tiles'], 0)
+        self.assertIsNone(pyramid.renderTile(3, 0, 0))
+        self.assertFalse(pyramid._store((3, 0, 0), tile))
+        self.assertEqual(pyramid.stats()['tiles'], 0)
+
+    def test_proxy_loading(self):
+        import shutil
+        import tempfile
+        from PyQt5.QtCore import QRectF, QSize
+        from PyQt5.QtGui import QColor, QImage
+
+        tmp = tempfile.mkdtemp()
+        try:
+            image = QImage(3000, 2000, QImage.Format_RGB32)
+            image.fill(QColor(200, 100, 50))
+            paths = [os.path.join(tmp, name) for name in ('a.jpg', 'b.jpg')]
+            for path in paths:
+                image.save(path)
+            self.win.proxyLoading.setChecked(True)
+            canvas = self.win.canvas
+            # Let the startup load of the last file run first
+            self.app.processEvents()
+
+            self.assertTrue(self.win.loadFile(paths[0]))
+            # The proxy is drawn over the original pixel space
+            self.assertTrue(canvas.isProxy())
+            self.assertEqual(canvas.imageSize, QSize(3000, 2000))
+            self.assertLess(canvas.pixmap.width(), 3000)
+            self.assertEqual(canvas.pixmapRect(QRectF(0, 0, 3000, 2000)), QRectF(canvas.pixmap.rect()))
+            # and replaced once the full size is decoded in the background
+            self.win.prefetcher.waitForDone()
+            self.app.processEvents()
+            self.assertFalse(canvas.isProxy())
+            self.assertEqual(canvas.pixmap.size(), QSize(3000, 2000))
+
+            # Zooming to 100% before that decodes the full size on the spot
+            self.win.prefetcher.clear()
+            self.assertTrue(self.win.loadFile(paths[1]))
+            self.assertTrue(canvas.isProxy())
+            self.win.setZoom(100)
+            self.assertFalse(canvas.isProxy())
+            self.win.prefetcher.waitForDone()
+            self.app.processEvents()
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_tiled_loading(self):
+        import shutil
+        import tempfile
+        from PyQt5.QtCore import QRect, QRectF, QSize
+        from PyQt5.QtGui import QColor, QImage, QPainter
+        from libs import imagePrefetcher
+        from libs.imagePyramid import ImagePyramid
+
+        tmp = tempfile.mkdtemp()
+        minPixels = imagePrefetcher.TILED_MIN_PIXELS
+        try:
+            image = QImage(3000, 2000, QImage.Format_RGB32)
+            image.fill(QColor(200, 100, 50))
+            path = os.path.join(tmp, 'large.jpg')
+            image.save(path)
+            self.assertIsNone(imagePrefetcher.tiledImageSize(path))
+            imagePrefetcher.TILED_MIN_PIXELS = 1000 * 1000
+            self.assertEqual(imagePrefetcher.tiledImageSize(path), QSize(3000, 2000))
+            # BMP cannot decode a clip rect
+            image.save(os.path.join(tmp, 'large.bmp'))
+            self.assertIsNone(imagePrefetcher.tiledImageSize(os.path.join(tmp, 'large.bmp')))
+
+            # Every level, 0 included, is decoded from the file a tile at a time
+            preview = image.scaled(300, 200)
+            pyramid = ImagePyramid(preview, tileSize=512, path=path, size=QSize(3000, 2000))
+            self.assertEqual(pyramid.maxLevel, 3)
+            tile = pyramid.renderTile(0, 5, 3)
+            self.assertEqual((tile.width(), tile.height()), (440, 464))
+            self.assertLess(abs(QColor(tile.pixel(10, 10)).red() - 200), 8)
+            # A tile is read with the rest of its row
+            self.assertEqual(pyramid.gridSize(0), (6, 4))
+            self.assertEqual(pyramid.stats()['tiles'], 6)
+            self.assertEqual(pyramid.renderTile(0, 0, 3).size(), QSize(512, 464))
+            self.assertEqual(pyramid.renderTile(2, 1, 0).size(), QSize(238, 500))
+            # Tiles not there yet are drawn from the preview
+            target = QImage(300, 200, QImage.Format_ARGB32_Premultiplied)
+            painter = QPainter(target)
+            painter.scale(0.1, 0.1)
+            pyramid.paint(painter, QRectF(0, 0, 3000, 2000), 1)
+            painter.end()
+            self.assertLess(abs(QColor(target.pixel(150, 100)).red() - 200), 8)
+            pyramid.cancel()
+
+            self.app.processEvents()
+            canvas = self.win.canvas
+            proxyLoading = self.win.proxyLoading.isChecked()
+            self.win.proxyLoading.setChecked(False)
+            self.assertTrue(self.win.loadFile(path))
+            # Shown from a proxy even without proxy loading, never decoded whole
+            self.assertTrue(canvas.isTiled())
+            self.assertLess(canvas.pixmap.width(), 3000)
+            self.win.setZoom(100)
+            self.assertTrue(canvas.isProxy())
+            self.assertFalse(canvas.grab(QRect(0, 0, 200, 200)).isNull())
+            canvas.pyramid.waitForDone()
+            self.assertGreater(canvas.pyramid.stats()['tiles'], 0)
+            self.win.prefetcher.waitForDone()
+            self.app.processEvents()
+            self.assertTrue(canvas.isProxy())
+            self.assertEqual(self.win.prefetcher.stats()['images'], 0)
+            # Another image drops the pyramid without waiting for its tiles
+            pyramid = canvas.pyramid
+            canvas.resetState()
+            self.assertTrue(pyramid.cancelled)
+            canvas.waitForPyramids()
+            self.assertEqual(canvas.droppedPyramids, [])
+            self.win.proxyLoading.setChecked(proxyLoading)
+        finally:
+            imagePrefetcher.TILED_MIN_PIXELS = minPixels
+            shutil.rmtree(tmp)
+
+    def test_single_image_copy(self):
+        from PyQt5.QtCore import QRect
+        from PyQt5.QtGui import QColor, QImage
+        from libs.canvas import Canvas
+        from libs.imagePrefetcher import paintableImage
+
+        image = QImage(40, 30, QImage.Format_ARGB32)
+        image.fill(QColor(0, 0, 255, 128))
+        self.assertEqual(paintableImage(image).format(), QImage.Format_ARGB32_Premultiplied)
+        gray = QImage(40, 30, QImage.Format_Grayscale8)
+        self.assertEqual(paintableImage(gray).format(), QImage.Format_RGB32)
+        rgb = QImage(40, 30, QImage.Format_RGB32)
+        rgb.fill(QColor(255, 0, 0))
+        self.assertEqual(paintableImage(rgb).cacheKey(), rgb.cacheKey())
+
+        # The canvas draws the window's QImage itself
+        canvas = Canvas()
+        canvas.loadPixmap(rgb)
+        self.assertIs(canvas.pixmap, rgb)
+        canvas.resize(40, 30)
+        grabbed = canvas.grab(QRect(0, 0, 40, 30)).toImage()
+        self.assertEqual(QColor(grabbed.pixel(20, 15)).getRgb()[:3], (255, 0, 0))
+
+    def test_skip_unchanged_save(self):
+        import shutil
+        import tempfile
+        from libs.pascal_voc_io import PascalVocWriter
+
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        tmp = tempfile.mkdtemp()
+        try:
+            imagePath = os.path.join(tmp, 'test.bmp')
+            xmlPath = os.path.join(tmp, 'test.xml')
+            shutil.copy(os.path.join(dir_name, 'test.bmp'), imagePath)
+            writer = PascalVocWriter('tmp', 'test.bmp', (512, 512, 3))
+            # No mask or sunglasses: selecting the face then leaves the
+            # mouth and eye codes as they are
+            writer.addBndBox(10, 20, 110, 120, 'face', [1, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0])
+            writer.save(xmlPath)
+            self.app.processEvents()
+            self.win.defaultSaveDir = tmp
+            self.win.loadFile(imagePath)
+
+            def written():
+                # Saves os.replace() the file, so each one is a new inode
+                self.win.saveQueue.flush()
+                return os.stat(xmlPath).st_ino
+
+            inode = written()
+            self.win.saveFile()
+            self.assertEqual(written(), inode)
+
+            self.win.canvas.shapes[0].attributes[0] = 0
+            self.win.saveFile()
+            inode, before = written(), inode
+            self.assertNotEqual(inode, before)
+            self.win.saveFile()
+            self.assertEqual(written(), inode)
+
+            # Verifying changes the content even without shape edits
+            self.win.verifyImg()
+            self.assertNotEqual(written(), inode)
+            self.assertTrue(PascalVocReader(xmlPath).verified)
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_edit_journal_recovery(self):
+        import shutil
+        import tempfile
+        from unittest import mock
+        from PyQt5.QtCore import QPointF
+        from PyQt5.QtWidgets import QMessageBox
+        from libs.editJournal import EditJournal, JOURNAL_EXT, readJournal
+        from libs.shape import Shape
+
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        tmp = tempfile.mkdtemp()
+        try:
+            imagePath = os.path.join(tmp, 'test.bmp')
+            xmlPath = os.path.join(tmp, 'test.xml')
+            shutil.copy(os.path.join(dir_name, 'test.bmp'), imagePath)
+            self.app.processEvents()
+            self.win.journal = EditJournal(os.path.join(tmp, 'journal'))
+            self.win.defaultSaveDir = tmp
+            self.win.loadFile(imagePath)
+
+            shape = Shape(label='face')
+            for x, y in ((10, 20), (110, 20), (110, 120), (10, 120)):
+                shape.addPoint(QPointF(x, y))
+            shape.close()
+            self.win.canvas.loadShapes([shape])
+            self.win.setDirty()
+            shape.moveBy(QPointF(5, 5))
+            self.win.setDirty()
+            self.win.flushJournal()
+            self.assertEqual([r['op'] for r in readJournal(self.win.journal.path)],
+                             ['open', 'create', 'move'])
+            self.assertFalse(os.path.exists(xmlPath))
+
+            # Leave the journal behind as a crashed session would
+            crashed = os.path.join(tmp, 'crashed')
+            os.mkdir(crashed)
+            journals = [os.path.join(crashed, name + JOURNAL_EXT) for name in ('1', '2')]
+            shutil.copy(self.win.journal.path, journals[0])
+            self.win.journal.discard()
+            self.win.setClean()
+            self.win.journal.close()
+            # and another whose XML was written by something else after the crash
+            otherImage, otherXml = os.path.join(tmp, 'other.bmp'), os.path.join(tmp, 'other.xml')
+            shutil.copy(imagePath, otherImage)
+            shutil.copy(os.path.join(dir_name, 'test.xml'), otherXml)
+            other = EditJournal(os.path.join(tmp, 'other'))
+            other.open(otherImage, otherXml, [shape], False)
+            shape.label = 'edited'
+            other.record([shape], False)
+            other.flush()
+            shutil.copy(other.path, journals[1])
+            other.close()
+            with open(otherXml, 'a') as f:
+                f.write('\n')
+            edited = open(otherXml).read()
+
+            self.win.journal = EditJournal(crashed)
+            with mock.patch.object(QMessageBox, 'question', return_value=QMessageBox.Cancel) as question:
+                self.win.recoverJournals()
+            # Nothing is written without asking
+            self.assertEqual(question.call_count, 1)
+            self.assertFalse(os.path.exists(xmlPath))
+            self.assertTrue(all(os.path.exists(path) for path in journals))
+
+            with mock.patch.object(QMessageBox, 'question', return_value=QMessageBox.Yes):
+                self.win.recoverJournals()
+            self.win.saveQueue.flush()
+            self.app.processEvents()
+            shapes = PascalVocReader(xmlPath).getShapes()
+            self.assertEqual(len(shapes), 1)
+            self.assertEqual(shapes[0][1], [(15, 25), (115, 25), (115, 125), (15, 125)])
+            # The image on screen is reloaded with its recovered edits
+            self.assertEqual(self.win.canvas.shapes[0].points[0], QPointF(15, 25))
+            self.assertFalse(os.path.exists(journals[0]))
+            # The changed XML is left alone and its edits kept
+            self.assertEqual(open(otherXml).read(), edited)
+            self.assertEqual(readJournal(journals[1])[0]['shapes'][0][1], 'edited')
+            with mock.patch.object(QMessageBox, 'question') as question:
+                self.win.recoverJournals()
+            self.assertEqual(question.call_count, 0)
+            self.assertTrue(os.path.exists(journals[1]))
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_undo_redo(self):
+        import shutil
+        import tempfile
+        from PyQt5.QtCore import QPointF
+        from libs.editJournal import EditJournal
+        from libs.pascal_voc_io import PascalVocWriter
+
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        tmp = tempfile.mkdtemp()
+        try:
+            imagePath = os.path.join(tmp, 'test.bmp')
+            shutil.copy(os.path.join(dir_name, 'test.bmp'), imagePath)
+            writer = PascalVocWriter('tmp', 'test.bmp', (512, 512, 3))
+            for i in range(3):
+                writer.addBndBox(10 + 100 * i, 20, 60 + 100 * i, 70, 'face',
+                                 [1, 1, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0])
+            writer.save(os.path.join(tmp, 'test.xml'))
+            self.app.processEvents()
+            self.win.journal = EditJournal(os.path.join(tmp, 'journal'))
+            self.win.defaultSaveDir = tmp
+            self.win.loadFile(imagePath)
+            canvas = self.win.canvas
+
+            def state():
+                return [(s.label, [(p.x(), p.y()) for p in s.points], list(s.attributes))
+                        for s in canvas.shapes]
+
+            states = [state()]
+            canvas.shapes[0].moveBy(QPointF(5, 5))
+            self.win.setDirty()
+            canvas.shapes[0].moveBy(QPointF(1, 0))
+            self.win.setDirty()
+            states.append(state())
+            canvas.shapes[1].attributes[0] = 0
+            self.win.setDirty()
+            states.append(state())
+            canvas.selectShape(canvas.shapes[1])
+            self.win.deleteSelectedShape()
+            states.append(state())
+
+            for expected in reversed(states[:-1]):
+                self.win.undoEdit()
+                self.assertEqual(state(), expected)
+            self.assertFalse(self.win.actions.undo.isEnabled())
+            # The journal followed, the restored face back in its place
+            self.assertEqual([(label, [tuple(p) for p in points], attributes)
+                              for label, points, attributes in self.win.journal.current.faces()],
+                             states[0])
+            for expected in states[1:]:
+                self.win.redoEdit()
+                self.assertEqual(state(), expected)
+            self.assertEqual(self.win.labelList.count(), 2)
+
+            # A drag journals the dragged face alone
+            canvas.shapes[1].label = 'not journaled'
+            canvas.selectShape(canvas.shapes[0])
+            canvas.shapes[0].moveBy(QPointF(2, 0))
+            canvas.shapeMoved.emit()
+            faces = self.win.journal.current.faces()
+            self.assertEqual(faces[0][1][0], [canvas.shapes[0].points[0].x(), canvas.shapes[0].points[0].y()])
+            self.assertEqual(faces[1][0], 'face')
+            canvas.shapes[1].label = 'face'
+            self.win.saveFile()
+            self.win.saveQueue.flush()
+        finally:
+            shutil.rmtree(tmp)
+
+    def test_auto_annotate(self):
+        import shutil
+        import tempfile
+        import time
+        from libs.pascal_voc_io import PascalVocWriter
+
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        tmp = tempfile.mkdtemp()
+        try:
+            images = [os.path.join(tmp, name) for name in ('a.bmp', 'b.bmp')]
+            for imagePath in images:
+                shutil.copy(os.path.join(dir_name, 'test.bmp'), imagePath)
+            # b.bmp is annotated already and gets no proposals
+            PascalVocWriter('tmp', 'b.bmp', (512, 512, 3)).save(os.path.join(tmp, 'b.xml'))
+            self.app.processEvents()
+            self.win.defaultSaveDir = tmp
+            self.win.faceDetector = 'stub'
+            self.win.autoAnnotate.setChecked(True)
+            self.assertIsNotNone(self.win.preAnnotator)
+
+            self.win.loadFile(images[0])
+            deadline = time.time() + 60
+            while self.win.preAnnotator.isBusy() and time.time() < deadline:
+                self.app.processEvents()
+                time.sleep(0.01)
+            self.app.processEvents()
+            # Arrived after loadFile(), shown on the untouched canvas
+            self.assertEqual([shape.points[0].x() for shape in self.win.canvas.shapes], [171])
+            self.assertFalse(self.win.canvas.verified)
+            self.assertFalse(self.win.dirty)
+
+            self.win.loadFile(images[1])
+            self.assertEqual(self.win.canvas.shapes, [])
+            # Cached: shown as the image opens
+            self.win.loadFile(images[0])
+            shape = self.win.canvas.shapes[0]
+            self.assertEqual([(p.x(), p.y()) for p in shape.points], [(171, 171), (341, 171), (341, 341), (171, 341)])
+            self.assertFalse(os.path.exists(os.path.join(tmp, 'a.xml')))
+        finally:
+            self.win.autoAnnotate.setChecked(False)
+            shutil.rmtree(tmp)
+
+    def test_propagate_frames(self):
+        import shutil
+        import tempfile
+        from PyQt5.QtGui import QImage, QPainter
+        from libs.pascal_voc_io import PascalVocWriter
+
+        dir_name = os.path.abspath(os.path.dirname(__file__))
+        tmp = tempfile.mkdtemp()
+        try:
+            first, second = os.path.join(tmp, 'frame1.bmp'), os.path.join(tmp, 'frame2.bmp')
+            shutil.copy(os.path.join(dir_name, 'test.bmp'), first)
+            # The next frame: the same picture moved right and up
+            image = QImage(first)
+            shifted = QImage(image.size(), QImage.Format_RGB32)
+            shifted.fill(0)
+            painter = QPainter(shifted)
+            painter.drawImage(12, -8, image)
+            painter.end()
+            shifted.save(second)
+            writer = PascalVocWriter('tmp', 'frame1.bmp', (512, 512, 3))
+            attributes = [1] + [0] * 12
+            writer.addBndBox(150, 160, 300, 330, 'face', attributes)
+            writer.save(os.path.join(tmp, 'frame1.xml'))
+
+            self.app.processEvents()
+            self.win.defaultSaveDir = tmp
+            self.win.propagateFrames.setChecked(True)
+            self.win.importDirImages(tmp)
+            while self.win.scanner is not None:
+                self.app.processEvents()
+            self.assertEqual(self.win.filePath, first)
+
+            # Faces other than the prepared ones are tracked on the worker,
+            # and propagate() does not wait for it
+            propagator = self.win.propagator
+            moved = [('face', (150, 160, 300, 340), attributes)]
+            self.assertIsNone(propagator.propagate(first, second, moved))
+            tracked = []
+            propagator.tracked.connect(lambda *paths: tracked.append(paths))
+            propagator.waitForDone()
+            self.app.processEvents()
+            self.assertIn((first, second), tracked)
+            self.assertEqual(len(propagator.propagate(first, second, moved)), 1)
+
+            # Lost the prepared result: the frame opens first, the faces
+            # come when the tracker is done
+            propagator.clear()
+            self.win.openNextImg()
+            self.assertEqual(self.win.filePath, second)
+            self.assertEqual(self.win.canvas.shapes, [])
+            propagator.waitForDone()
+            self.app.processEvents()
+            shape, = self.win.canvas.shapes
+            (xmin, ymin), (xmax, ymax) = [(p.x(), p.y()) for p in shape.points[::2]]
+            for value, expected in zip((xmin, ymin, xmax, ymax), (162, 152, 312, 322)):
+                self.assertAlmostEqual(value, expected, delta=1)
+            self.assertEqual(shape.attributes, attributes)
+            # An edit like any other: saved with the frame
+            self.assertTrue(self.win.dirty)
+            self.win.saveFile()
+            self.win.saveQueue.flush()
+            self.assertTrue(os.path.isfile(os.path.join(tmp, 'frame2.xml')))
+        finally:
+            self.win.propagateFrames.setChecked(False)
+            shutil.rmtree(tmp)
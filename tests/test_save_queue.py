@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+import threading
+from functools import partial
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+libs_path = os.path.join(dir_name, '..', 'libs')
+sys.path.insert(0, libs_path)
+from PyQt5.QtCore import Qt
+from saveQueue import SaveQueue
+
+
+class TestSaveQueue(TestCase):
+
+    def setUp(self):
+        self.queue = SaveQueue()
+        self.saved = []
+        self.failed = []
+        # Record from the worker thread itself, no event loop runs here
+        self.queue.saved.connect(lambda target, image: self.saved.append((target, image)),
+                                 Qt.DirectConnection)
+        self.queue.failed.connect(lambda target, image, message: self.failed.append((target, message)),
+                                  Qt.DirectConnection)
+        self.queue.start()
+
+    def tearDown(self):
+        self.queue.stop()
+
+    def test_coalesce_in_order(self):
+        gate = threading.Event()
+        written = []
+        self.queue.submit('a.xml', 'a.jpg', gate.wait)
+        self.queue.submit('b.xml', 'b.jpg', partial(written.append, 1))
+        self.queue.submit('c.xml', 'c.jpg', partial(written.append, 'c'))
+        # Still queued behind a.xml: replaced, keeping its place
+        self.queue.submit('b.xml', 'b.jpg', partial(written.append, 2))
+        self.assertTrue(self.queue.isPending('b.xml'))
+        gate.set()
+        self.queue.flush()
+        self.assertFalse(self.queue.isPending())
+        self.assertEqual(written, [2, 'c'])
+        self.assertEqual([target for target, _ in self.saved], ['a.xml', 'b.xml', 'c.xml'])
+
+    def test_failure_reported(self):
+        def fail():
+            raise IOError('disk full')
+        self.queue.submit('a.xml', 'a.jpg', fail)
+        self.queue.submit('b.xml', 'b.jpg', lambda: None)
+        self.queue.flush('a.xml')
+        self.assertEqual(self.failed, [('a.xml', 'disk full')])
+        self.queue.flush()
+        self.assertEqual(self.saved, [('b.xml', 'b.jpg')])
+
+
+if __name__ == '__main__':
+    unittest.main()
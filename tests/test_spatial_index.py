@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+libs_path = os.path.join(dir_name, '..', 'libs')
+sys.path.insert(0, libs_path)
+from spatialIndex import ShapeIndex
+
+
+class TestShapeIndex(TestCase):
+
+    def test_query(self):
+        index = ShapeIndex(cellSize=10)
+        index.insert('a', (0, 0, 30, 30))
+        index.insert('b', (20, 20, 50, 50))
+        index.insert('huge', (0, 0, 10000, 10000))
+        self.assertEqual(index.query(25, 25), ['huge', 'b', 'a'])
+        self.assertEqual(index.query(45, 45), ['huge', 'b'])
+        self.assertEqual(index.query(5, 5), ['huge', 'a'])
+        # The radius reaches into neighbouring cells
+        self.assertEqual(index.query(55, 55, radius=6), ['huge', 'b'])
+
+    def test_update(self):
+        index = ShapeIndex(cellSize=10)
+        index.insert('a', (0, 0, 5, 5))
+        index.insert('b', (0, 0, 5, 5))
+        # Moving keeps the paint order
+        index.insert('a', (100, 100, 105, 105))
+        self.assertEqual(index.query(2, 2), ['b'])
+        self.assertEqual(index.query(102, 102), ['a'])
+        index.insert('b', (100, 100, 105, 105))
+        self.assertEqual(index.query(102, 102), ['b', 'a'])
+        index.remove('b')
+        self.assertNotIn('b', index)
+        self.assertEqual(index.query(102, 102), ['a'])
+        index.rebuild([('c', (0, 0, 1, 1))])
+        self.assertEqual(len(index), 1)
+        self.assertEqual(index.query(102, 102), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+import unittest
+from unittest import TestCase
+import sys
+import os
+
+dir_name = os.path.abspath(os.path.dirname(__file__))
+libs_path = os.path.join(dir_name, '..', 'libs')
+sys.path.insert(0, libs_path)
+from undoStack import UndoStack
+
+
+def move(sid, dx, dy):
+    return [({'op': 'move', 'id': sid, 'dx': dx, 'dy': dy, 'seq': 0}, None)]
+
+
+class TestUndoStack(TestCase):
+
+    def test_merge_until_sealed(self):
+        stack = UndoStack()
+        stack.push(move(1, 1, 0))
+        stack.push(move(1, 2, 1))
+        self.assertEqual(len(stack), 1)
+        # Another shape, or a new drag of the same one, is a new step
+        stack.push(move(2, 1, 1))
+        stack.seal()
+        stack.push(move(2, 1, 1))
+        self.assertEqual(len(stack), 3)
+        stack.undo()
+        stack.undo()
+        self.assertEqual(stack.undo(), [('move', 1, (3, 1), None)])
+        self.assertFalse(stack.canUndo())
+
+    def test_redo_and_limit(self):
+        stack = UndoStack(limit=3)
+        for i in range(10):
+            stack.seal()
+            stack.push([({'op': 'attributes', 'id': i, 'attributes': [1], 'seq': i}, [0])])
+        self.assertEqual(len(stack), 3)
+        step = stack.undo()
+        self.assertEqual(step, [('attributes', 9, [1], [0])])
+        self.assertEqual(stack.redo(), step)
+        stack.undo()
+        # A new edit drops what was undone
+        stack.push(move(1, 1, 1))
+        self.assertFalse(stack.canRedo())
+
+
+if __name__ == '__main__':
+    unittest.main()